@@ -1,20 +1,45 @@
 from django.contrib import admin
+from django.db.models import Count, Q
+from yanglao.exports import streaming_export
+from .exports import REGISTRATION_EXPORT_HEADER, registration_rows
 from .models import Activity, ActivityRegistration
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
-    list_display = ('title', 'start_time', 'end_time', 'registration_count')
+    list_display = ('title', 'start_time', 'end_time', 'capacity', 'remaining_seats', 'registration_count')
     list_filter = ('start_time', 'end_time')
     search_fields = ('title', 'content')
     date_hierarchy = 'start_time'
+    actions = ['export_registrations_csv', 'export_registrations_xlsx']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            registration_total=Count('registrations', filter=Q(registrations__status=ActivityRegistration.STATUS_CONFIRMED))
+        )
     
     def registration_count(self, obj):
-        return obj.registrations.count()
+        return obj.registration_total
     registration_count.short_description = '报名人数'
+    registration_count.admin_order_field = 'registration_total'
+
+    def export_registrations(self, queryset, file_type):
+        activity_ids = list(queryset.values_list('pk', flat=True))
+        return streaming_export(
+            REGISTRATION_EXPORT_HEADER, registration_rows(activity_ids), filename='活动报名名单', file_type=file_type
+        )
+
+    @admin.action(description='导出报名名单（CSV）')
+    def export_registrations_csv(self, request, queryset):
+        return self.export_registrations(queryset, 'csv')
+
+    @admin.action(description='导出报名名单（Excel）')
+    def export_registrations_xlsx(self, request, queryset):
+        return self.export_registrations(queryset, 'xlsx')
 
 @admin.register(ActivityRegistration)
 class ActivityRegistrationAdmin(admin.ModelAdmin):
-    list_display = ('activity', 'user', 'registered_at')
-    list_filter = ('registered_at',)
+    list_display = ('activity', 'user', 'status', 'registered_at')
+    list_filter = ('status', 'registered_at')
     search_fields = ('activity__title', 'user__username')
-    date_hierarchy = 'registered_at' 
\ No newline at end of file
+    date_hierarchy = 'registered_at'
+    list_select_related = ('activity', 'user') 
\ No newline at end of file
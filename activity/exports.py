@@ -0,0 +1,30 @@
+from django.utils import timezone
+
+from .models import ActivityRegistration
+
+REGISTRATION_EXPORT_HEADER = ['活动', '用户名', '昵称', '手机号', '报名状态', '报名时间']
+
+
+def registration_rows(activity_ids, chunk_size=2000):
+    """
+    按活动和报名顺序逐行生成报名名单
+    用户与用户资料在同一查询中关联，values_list 配合 iterator 分块读取，不会一次性加载全部记录
+    """
+    statuses = dict(ActivityRegistration.STATUS_CHOICES)
+    rows = (
+        ActivityRegistration.objects.filter(activity_id__in=activity_ids)
+        .order_by('activity_id', 'registered_at', 'id')
+        .values_list(
+            'activity__title', 'user__username', 'user__profile__nickname', 'user__profile__phone',
+            'status', 'registered_at',
+        )
+    )
+    for title, username, nickname, phone, status, registered_at in rows.iterator(chunk_size=chunk_size):
+        yield [
+            title,
+            username,
+            nickname or '',
+            phone or '',
+            statuses.get(status, status),
+            timezone.localtime(registered_at).strftime('%Y-%m-%d %H:%M:%S'),
+        ]
@@ -0,0 +1,109 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from activity.models import Activity, ActivityRegistration
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = '模拟活动发布后的集中报名，检查名额分配是否正确并统计报名延迟（测试数据在结束后删除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300, help='报名用户数')
+        parser.add_argument('--capacity', type=int, default=50, help='活动名额')
+        parser.add_argument('--threads', type=int, default=16, help='并发线程数')
+        parser.add_argument('--cancel', type=int, default=10, help='报名结束后取消报名的已确认用户数')
+
+    def handle(self, *args, **options):
+        users, capacity, cancels = options['users'], options['capacity'], options['cancel']
+        prefix = f'bench-{int(time.time())}'
+        start = timezone.now() + timedelta(days=7)
+        activity = Activity.objects.create(
+            title=prefix, cover='activity_covers/bench.jpg', content=prefix,
+            start_time=start, end_time=start + timedelta(hours=2), capacity=capacity,
+        )
+        accounts = User.objects.bulk_create(
+            [User(username=f'{prefix}-{i}') for i in range(users)], batch_size=500
+        )
+        if accounts[0].pk is None:
+            accounts = list(User.objects.filter(username__startswith=f'{prefix}-').order_by('pk'))
+
+        latencies, failures = [], []
+        lock = threading.Lock()
+
+        def register(user):
+            try:
+                began = time.perf_counter()
+                Activity.objects.get(pk=activity.pk).register(user)
+                elapsed = time.perf_counter() - began
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    failures.append(repr(e))
+            finally:
+                close_old_connections()
+
+        try:
+            began = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(register, accounts))
+            wall = time.perf_counter() - began
+
+            activity.refresh_from_db()
+            confirmed = activity.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED).count()
+            waitlisted = activity.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED).count()
+            self.report(latencies, failures, wall)
+            self.stdout.write(
+                f'名额 {capacity}：已确认 {confirmed}，候补 {waitlisted}，剩余名额 {activity.remaining_seats}'
+            )
+            expected = min(capacity, users - len(failures))
+            if confirmed != expected or activity.remaining_seats != capacity - expected:
+                raise CommandError('名额分配不正确')
+
+            # 取消部分已确认报名，名额应按报名顺序递补
+            queue = list(
+                activity.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED)
+                .order_by('registered_at', 'id').values_list('user_id', flat=True)[:cancels]
+            )
+            leaving = list(
+                activity.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED)
+                .select_related('user')[:cancels]
+            )
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(lambda r: (activity.cancel_registration(r.user), close_old_connections()), leaving))
+            promoted = set(
+                activity.registrations.filter(user_id__in=queue, status=ActivityRegistration.STATUS_CONFIRMED)
+                .values_list('user_id', flat=True)
+            )
+            confirmed = activity.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED).count()
+            self.stdout.write(f'取消 {len(leaving)} 个报名后：递补 {len(promoted)}，已确认 {confirmed}')
+            if promoted != set(queue) or confirmed != expected:
+                raise CommandError('候补递补不正确')
+            self.stdout.write(self.style.SUCCESS('名额分配与候补递补正确'))
+        finally:
+            activity.delete()
+            User.objects.filter(username__startswith=f'{prefix}-').delete()
+
+    def report(self, latencies, failures, wall):
+        if failures:
+            self.stdout.write(self.style.WARNING(f'{len(failures)} 次报名失败，例如 {failures[0]}'))
+        if not latencies:
+            return
+        latencies.sort()
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        self.stdout.write(
+            f'{len(latencies)} 次报名，耗时 {wall:.2f}s（{len(latencies) / wall:.0f} 次/秒），'
+            f'延迟 p50 {percentile(0.5):.1f}ms p95 {percentile(0.95):.1f}ms p99 {percentile(0.99):.1f}ms '
+            f'最大 {latencies[-1] * 1000:.1f}ms 平均 {statistics.mean(latencies) * 1000:.1f}ms'
+        )
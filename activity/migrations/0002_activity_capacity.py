@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='留空表示不限名额', null=True, verbose_name='名额'),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='remaining_seats',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='剩余名额'),
+        ),
+        migrations.AddField(
+            model_name='activityregistration',
+            name='status',
+            field=models.CharField(choices=[('CONFIRMED', '已确认'), ('WAITLISTED', '候补')], default='CONFIRMED', max_length=20, verbose_name='报名状态'),
+        ),
+        migrations.AddIndex(
+            model_name='activityregistration',
+            index=models.Index(fields=['activity', 'status', 'registered_at', 'id'], name='activity_reg_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0002_activity_capacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['start_time', 'id'], name='activity_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['end_time', 'start_time'], name='activity_end_start_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -9,6 +10,8 @@ class Activity(models.Model):
     start_time = models.DateTimeField(verbose_name='开始时间')
     end_time = models.DateTimeField(verbose_name='结束时间')
     content = models.TextField(verbose_name='活动详情')
+    capacity = models.PositiveIntegerField(null=True, blank=True, verbose_name='名额', help_text='留空表示不限名额')
+    remaining_seats = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='剩余名额')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     
@@ -16,19 +19,139 @@ class Activity(models.Model):
         verbose_name = '活动'
         verbose_name_plural = '活动'
         ordering = ['-created_at']
+        indexes = [
+            # 列表按开始时间翻页，未开始、已结束的筛选走开始时间范围
+            models.Index(fields=['start_time', 'id'], name='activity_start_id_idx'),
+            # 进行中的筛选和按结束时间的范围筛选
+            models.Index(fields=['end_time', 'start_time'], name='activity_end_start_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """名额变化时重新计算剩余名额；更新时不覆盖由报名流程维护的剩余名额"""
+        update_fields = kwargs.get('update_fields')
+        if self.pk is None or self._state.adding:
+            self.remaining_seats = self.capacity
+            return super().save(*args, **kwargs)
+
+        previous = Activity.objects.filter(pk=self.pk).values_list('capacity', flat=True).first()
+        if update_fields is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'remaining_seats'
+            ]
+        else:
+            kwargs['update_fields'] = [name for name in update_fields if name != 'remaining_seats']
+        super().save(*args, **kwargs)
+        if previous != self.capacity:
+            self.sync_seats()
+
+    def sync_seats(self):
+        """按名额和已确认报名数重新计算剩余名额，名额增加时依次递补候补用户"""
+        with transaction.atomic():
+            if self.capacity is None:
+                self.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED).update(
+                    status=ActivityRegistration.STATUS_CONFIRMED
+                )
+                remaining = None
+            else:
+                confirmed = self.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED).count()
+                free = max(self.capacity - confirmed, 0)
+                promoted = list(
+                    self.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED)
+                    .order_by('registered_at', 'id')
+                    .values_list('id', flat=True)[:free]
+                )
+                ActivityRegistration.objects.filter(id__in=promoted).update(
+                    status=ActivityRegistration.STATUS_CONFIRMED
+                )
+                remaining = free - len(promoted)
+            Activity.objects.filter(pk=self.pk).update(remaining_seats=remaining)
+        self.remaining_seats = remaining
+
+    def register(self, user):
+        """
+        报名活动，返回报名记录
+        有剩余名额时用一次带条件的 UPDATE 扣减名额（remaining_seats > 0），并发报名不会超卖；
+        名额已满时进入候补名单。用户已报名时抛出 AlreadyRegistered。
+        """
+        try:
+            with transaction.atomic():
+                if self.capacity is None:
+                    seated = True
+                else:
+                    seated = Activity.objects.filter(pk=self.pk, remaining_seats__gt=0).update(
+                        remaining_seats=F('remaining_seats') - 1
+                    ) == 1
+                return ActivityRegistration.objects.create(
+                    activity=self,
+                    user=user,
+                    status=ActivityRegistration.STATUS_CONFIRMED if seated else ActivityRegistration.STATUS_WAITLISTED,
+                )
+        except IntegrityError:
+            # 唯一约束冲突，事务回滚后扣减的名额一并恢复
+            raise AlreadyRegistered
+
+    def cancel_registration(self, user):
+        """
+        取消报名，返回被删除的报名记录，未报名时返回 None
+        取消已确认的报名时，名额直接转给候补名单中最早的用户；没有候补时归还名额
+        """
+        with transaction.atomic():
+            registration = ActivityRegistration.objects.filter(activity=self, user=user).first()
+            if registration is None:
+                return None
+            if not ActivityRegistration.objects.filter(pk=registration.pk).delete()[0]:
+                return None
+            if registration.status == ActivityRegistration.STATUS_CONFIRMED and self.capacity is not None:
+                if self.promote_next() is None:
+                    Activity.objects.filter(pk=self.pk).update(remaining_seats=F('remaining_seats') + 1)
+            return registration
+
+    def promote_next(self):
+        """把候补名单中最早的用户转为已确认，返回其报名记录；没有候补时返回 None"""
+        while True:
+            candidate = (
+                self.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED)
+                .order_by('registered_at', 'id')
+                .first()
+            )
+            if candidate is None:
+                return None
+            # 带状态条件更新，并发取消时同一候补用户只会被递补一次
+            if ActivityRegistration.objects.filter(
+                pk=candidate.pk, status=ActivityRegistration.STATUS_WAITLISTED
+            ).update(status=ActivityRegistration.STATUS_CONFIRMED):
+                candidate.status = ActivityRegistration.STATUS_CONFIRMED
+                return candidate
+
+
+class AlreadyRegistered(Exception):
+    """用户已报名该活动"""
+
 class ActivityRegistration(models.Model):
+    STATUS_CONFIRMED = 'CONFIRMED'
+    STATUS_WAITLISTED = 'WAITLISTED'
+    STATUS_CHOICES = [
+        (STATUS_CONFIRMED, '已确认'),
+        (STATUS_WAITLISTED, '候补'),
+    ]
+
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='registrations', verbose_name='活动')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_registrations', verbose_name='用户')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_CONFIRMED, verbose_name='报名状态')
     registered_at = models.DateTimeField(auto_now_add=True, verbose_name='报名时间')
     
     class Meta:
         verbose_name = '活动报名'
         verbose_name_plural = '活动报名'
         unique_together = ('activity', 'user')  # 确保用户不能重复报名同一活动
+        indexes = [
+            # 候补名单按报名顺序递补
+            models.Index(fields=['activity', 'status', 'registered_at', 'id'], name='activity_reg_queue_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.activity.title}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.activity.title}"
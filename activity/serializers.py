@@ -1,41 +1,96 @@
 from rest_framework import serializers
+from yanglao.images import srcset
 from .models import Activity, ActivityRegistration
 
 class ActivityListSerializer(serializers.ModelSerializer):
     registration_count = serializers.SerializerMethodField()
     cover = serializers.CharField(source='cover.url')
+    cover_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Activity
-        fields = ['id', 'title', 'cover', 'start_time', 'end_time', 'registration_count']
+        fields = ['id', 'title', 'cover', 'cover_srcset', 'start_time', 'end_time', 'capacity', 'remaining_seats',
+                 'registration_count']
     
     def get_registration_count(self, obj):
-        return obj.registrations.count()
+        # 优先使用视图集查询时附带的报名人数（只统计已确认的报名）
+        if hasattr(obj, 'registration_count'):
+            return obj.registration_count
+        return obj.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED).count()
+
+    def get_cover_srcset(self, obj):
+        return srcset(obj.cover)
 
 class ActivityDetailSerializer(serializers.ModelSerializer):
     registration_count = serializers.SerializerMethodField()
+    waitlist_count = serializers.SerializerMethodField()
     is_registered = serializers.SerializerMethodField()
+    is_waitlisted = serializers.SerializerMethodField()
     cover = serializers.CharField(source='cover.url')
+    cover_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Activity
-        fields = ['id', 'title', 'cover', 'start_time', 'end_time', 'content', 
-                 'registration_count', 'is_registered', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'cover', 'cover_srcset', 'start_time', 'end_time', 'content', 'capacity',
+                 'remaining_seats', 'registration_count', 'waitlist_count', 'is_registered', 'is_waitlisted',
+                 'created_at', 'updated_at']
+        read_only_fields = ['remaining_seats']
     
     def get_registration_count(self, obj):
-        return obj.registrations.count()
+        # 优先使用视图集查询时附带的报名人数（只统计已确认的报名）
+        if hasattr(obj, 'registration_count'):
+            return obj.registration_count
+        return obj.registrations.filter(status=ActivityRegistration.STATUS_CONFIRMED).count()
+
+    def get_waitlist_count(self, obj):
+        if hasattr(obj, 'waitlist_count'):
+            return obj.waitlist_count
+        return obj.registrations.filter(status=ActivityRegistration.STATUS_WAITLISTED).count()
+
+    def get_cover_srcset(self, obj):
+        return srcset(obj.cover)
     
     def get_is_registered(self, obj):
+        if hasattr(obj, 'is_registered'):
+            return obj.is_registered
+        return self._has_registration(obj, ActivityRegistration.STATUS_CONFIRMED)
+
+    def get_is_waitlisted(self, obj):
+        if hasattr(obj, 'is_waitlisted'):
+            return obj.is_waitlisted
+        return self._has_registration(obj, ActivityRegistration.STATUS_WAITLISTED)
+
+    def _has_registration(self, obj, registration_status):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ActivityRegistration.objects.filter(
                 activity=obj, 
-                user=request.user
+                user=request.user,
+                status=registration_status,
             ).exists()
         return False
 
 class ActivityRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = ActivityRegistration
-        fields = ['id', 'activity', 'user', 'registered_at']
-        read_only_fields = ['user', 'registered_at'] 
\ No newline at end of file
+        fields = ['id', 'activity', 'user', 'status', 'registered_at']
+        read_only_fields = ['user', 'status', 'registered_at']
+
+class ActivitySummarySerializer(serializers.ModelSerializer):
+    """报名记录中嵌入的活动摘要，不含需要额外查询的报名人数"""
+    cover = serializers.CharField(source='cover.url')
+    cover_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Activity
+        fields = ['id', 'title', 'cover', 'cover_srcset', 'start_time', 'end_time']
+
+    def get_cover_srcset(self, obj):
+        return srcset(obj.cover)
+
+class MyRegistrationSerializer(serializers.ModelSerializer):
+    activity = ActivitySummarySerializer(read_only=True)
+
+    class Meta:
+        model = ActivityRegistration
+        fields = ['id', 'activity', 'status', 'registered_at']
@@ -0,0 +1,369 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, time, timedelta
+
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from .exports import REGISTRATION_EXPORT_HEADER
+from .models import Activity, ActivityRegistration, AlreadyRegistered
+from .views import ActivityViewSet
+
+
+class ActivityListQueryCountTests(APITestCase):
+    """活动列表的查询次数不随活动数量增长"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('resident', 'resident@example.com', 'password')
+        self.others = [
+            User.objects.create_user(f'user{i}', f'user{i}@example.com', 'password') for i in range(3)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def create_activities(self, count):
+        now = timezone.now()
+        for i in range(count):
+            activity = Activity.objects.create(
+                title=f'活动{i}',
+                cover='activity_covers/cover.jpg',
+                start_time=now + timedelta(days=i),
+                end_time=now + timedelta(days=i, hours=2),
+                content='活动详情',
+            )
+            for user in self.others[: i % 4]:
+                ActivityRegistration.objects.create(activity=activity, user=user)
+            if i % 2:
+                ActivityRegistration.objects.create(activity=activity, user=self.user)
+
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/activity/activities/', {'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['data']
+
+    def test_query_count_is_constant(self):
+        self.create_activities(2)
+        small, _ = self.list_query_count()
+        self.create_activities(20)
+        large, data = self.list_query_count()
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 22)
+
+    def test_annotated_values(self):
+        self.create_activities(4)
+        _, data = self.list_query_count()
+        for item in data:
+            activity = Activity.objects.get(pk=item['id'])
+            self.assertEqual(item['registration_count'], activity.registrations.count())
+
+        response = self.client.get(f'/api/activity/activities/{data[0]["id"]}/')
+        activity = Activity.objects.get(pk=data[0]['id'])
+        self.assertEqual(response.data['data']['registration_count'], activity.registrations.count())
+        self.assertEqual(
+            response.data['data']['is_registered'],
+            activity.registrations.filter(user=self.user).exists(),
+        )
+
+
+class ActivityTimeFilterTests(APITestCase):
+    """活动状态、时间范围筛选和按开始时间的游标分页"""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('resident', 'resident@example.com', 'password'))
+        now = timezone.now()
+        windows = {
+            'past': (-10, -8),
+            'ongoing': (-1, 1),
+            'upcoming': (2, 4),
+        }
+        self.expected = {}
+        for name, (start, end) in windows.items():
+            self.expected[name] = []
+            for i in range(3):
+                activity = Activity.objects.create(
+                    title=f'{name}{i}',
+                    cover='activity_covers/cover.jpg',
+                    start_time=now + timedelta(hours=start, minutes=i),
+                    end_time=now + timedelta(hours=end, minutes=i),
+                    content='活动详情',
+                )
+                self.expected[name].append(activity.pk)
+
+    def fetch_all(self, params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, page_size=2)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/activity/activities/', query)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['data'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_status_filters_and_cursor_pagination(self):
+        self.assertEqual(self.fetch_all({'status': 'upcoming'}), self.expected['upcoming'])
+        self.assertEqual(self.fetch_all({'status': 'ongoing'}), self.expected['ongoing'])
+        self.assertEqual(self.fetch_all({'status': 'past'}), self.expected['past'][::-1])
+        self.assertEqual(self.fetch_all({'status': 'current'}), self.expected['ongoing'] + self.expected['upcoming'])
+        everything = self.expected['past'] + self.expected['ongoing'] + self.expected['upcoming']
+        self.assertEqual(self.fetch_all({'status': 'all'}), everything)
+
+        boundary = (timezone.now() + timedelta(hours=1, minutes=30)).isoformat()
+        self.assertEqual(self.fetch_all({'start_after': boundary}), self.expected['upcoming'])
+        self.assertEqual(self.fetch_all({'end_before': boundary}), self.expected['past'] + self.expected['ongoing'])
+
+        self.assertEqual(self.client.get('/api/activity/activities/', {'status': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/activity/activities/', {'start_after': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/activity/activities/', {'cursor': 'x'}).status_code, 400)
+
+    def test_unfiltered_list_starts_with_current_activities(self):
+        # 默认不返回已结束的活动，第一页是正在进行和即将开始的活动
+        response = self.client.get('/api/activity/activities/', {'page_size': 2})
+        self.assertEqual([item['id'] for item in response.data['data']], self.expected['ongoing'][:2])
+        self.assertEqual(self.fetch_all({}), self.expected['ongoing'] + self.expected['upcoming'])
+
+    def test_date_only_upper_bound_includes_the_whole_day(self):
+        day = timezone.localdate() + timedelta(days=30)
+        activity = Activity.objects.create(
+            title='全天活动',
+            cover='activity_covers/cover.jpg',
+            start_time=timezone.make_aware(datetime.combine(day, time(10))),
+            end_time=timezone.make_aware(datetime.combine(day, time(12))),
+            content='活动详情',
+        )
+        self.assertEqual(self.fetch_all({'start_after': day.isoformat(), 'end_before': day.isoformat()}), [activity.pk])
+        self.assertEqual(self.fetch_all({'start_before': day.isoformat(), 'start_after': day.isoformat()}), [activity.pk])
+        previous_day = (day - timedelta(days=1)).isoformat()
+        self.assertEqual(self.fetch_all({'start_after': day.isoformat(), 'end_before': previous_day}), [])
+
+    @skipUnless(connection.vendor == 'sqlite', '查询计划格式与数据库相关')
+    def test_filters_use_indexes(self):
+        factory = APIRequestFactory()
+        queries = [
+            {'status': 'upcoming'},
+            {'status': 'ongoing'},
+            {'status': 'current'},
+            {'status': 'past'},
+            {'start_after': '2025-01-01', 'start_before': '2025-02-01'},
+            {'end_after': '2025-01-01', 'end_before': '2025-02-01'},
+        ]
+        for params in queries:
+            view = ActivityViewSet(action='list', format_kwarg=None)
+            view.request = Request(factory.get('/api/activity/activities/', params))
+            queryset = view.filter_by_time(view.get_queryset(), view.request.query_params)
+            paginator = view.past_cursor_paginator if params.get('status') == 'past' else view.cursor_paginator
+            plan = queryset.order_by(*paginator.ordering)[:paginator.page_size].explain()
+            with self.subTest(params=params):
+                activity_lines = [line for line in plan.splitlines() if 'activity_activity ' in line]
+                self.assertTrue(activity_lines, plan)
+                for line in activity_lines:
+                    self.assertRegex(line, r'USING (COVERING )?INDEX activity_(start_id|end_start)_idx', plan)
+
+
+class MyRegistrationsTests(APITestCase):
+    """我的报名：一次查询取出报名记录和活动摘要"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('resident', 'resident@example.com', 'password')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.upcoming, self.past = [], []
+        for i in range(-5, 6):
+            activity = Activity.objects.create(
+                title=f'活动{i}',
+                cover='activity_covers/cover.jpg',
+                start_time=now + timedelta(days=i),
+                end_time=now + timedelta(days=i, hours=2),
+                content='活动详情',
+            )
+            ActivityRegistration.objects.create(activity=activity, user=other)
+            if i:
+                ActivityRegistration.objects.create(activity=activity, user=self.user)
+                (self.upcoming if i > 0 else self.past).append(activity.pk)
+
+    def fetch(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/activity/activities/my_registrations/', params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_filters_pagination_and_query_count(self):
+        count, data = self.fetch({'status': 'upcoming', 'page_size': 3})
+        self.assertEqual(count, 1)
+        ids = [item['activity']['id'] for item in data['data']]
+        count, data = self.fetch({'status': 'upcoming', 'page_size': 3, 'cursor': data['next_cursor']})
+        self.assertEqual(count, 1)
+        ids += [item['activity']['id'] for item in data['data']]
+        self.assertEqual(ids, self.upcoming)
+        self.assertIsNone(data['next_cursor'])
+
+        _, data = self.fetch({'status': 'past'})
+        self.assertEqual([item['activity']['id'] for item in data['data']], self.past[::-1])
+
+
+class ActivityCapacityTests(TestCase):
+    """名额扣减、候补名单、取消递补和修改名额后的同步"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}', f'user{i}@example.com', 'password') for i in range(4)]
+
+    def create_activity(self, capacity):
+        now = timezone.now()
+        return Activity.objects.create(
+            title='活动',
+            cover='activity_covers/cover.jpg',
+            start_time=now + timedelta(days=1),
+            end_time=now + timedelta(days=1, hours=2),
+            content='活动详情',
+            capacity=capacity,
+        )
+
+    def statuses(self, activity):
+        return dict(activity.registrations.values_list('user__username', 'status'))
+
+    def remaining(self, activity):
+        return Activity.objects.get(pk=activity.pk).remaining_seats
+
+    def test_full_activity_waitlists_new_registrations(self):
+        activity = self.create_activity(2)
+        statuses = [activity.register(user).status for user in self.users[:3]]
+        self.assertEqual(statuses, [
+            ActivityRegistration.STATUS_CONFIRMED,
+            ActivityRegistration.STATUS_CONFIRMED,
+            ActivityRegistration.STATUS_WAITLISTED,
+        ])
+        self.assertEqual(self.remaining(activity), 0)
+
+        # 重复报名回滚，不占用名额
+        with self.assertRaises(AlreadyRegistered):
+            activity.register(self.users[0])
+        self.assertEqual(self.remaining(activity), 0)
+        self.assertEqual(activity.registrations.count(), 3)
+
+    def test_cancel_promotes_waitlist_in_order(self):
+        activity = self.create_activity(1)
+        for user in self.users[:4]:
+            activity.register(user)
+
+        # 取消候补报名不影响名额
+        activity.cancel_registration(self.users[2])
+        self.assertEqual(self.remaining(activity), 0)
+
+        activity.cancel_registration(self.users[0])
+        self.assertEqual(self.statuses(activity), {
+            'user1': ActivityRegistration.STATUS_CONFIRMED,
+            'user3': ActivityRegistration.STATUS_WAITLISTED,
+        })
+        self.assertEqual(self.remaining(activity), 0)
+
+        activity.cancel_registration(self.users[1])
+        self.assertEqual(self.statuses(activity), {'user3': ActivityRegistration.STATUS_CONFIRMED})
+        activity.cancel_registration(self.users[3])
+        self.assertEqual(self.remaining(activity), 1)
+        self.assertIsNone(activity.cancel_registration(self.users[3]))
+        self.assertIsNone(activity.promote_next())
+
+    def test_capacity_increase_promotes_waitlist(self):
+        activity = self.create_activity(1)
+        for user in self.users[:3]:
+            activity.register(user)
+
+        activity.capacity = 2
+        activity.save()
+        self.assertEqual(activity.remaining_seats, 0)
+        self.assertEqual(self.statuses(activity), {
+            'user0': ActivityRegistration.STATUS_CONFIRMED,
+            'user1': ActivityRegistration.STATUS_CONFIRMED,
+            'user2': ActivityRegistration.STATUS_WAITLISTED,
+        })
+
+        activity.capacity = 5
+        activity.save()
+        self.assertEqual(self.remaining(activity), 2)
+        self.assertEqual(
+            set(self.statuses(activity).values()), {ActivityRegistration.STATUS_CONFIRMED}
+        )
+
+    def test_capacity_decrease_keeps_confirmed_registrations(self):
+        activity = self.create_activity(3)
+        for user in self.users[:2]:
+            activity.register(user)
+        self.assertEqual(self.remaining(activity), 1)
+
+        activity.capacity = 1
+        activity.save()
+        self.assertEqual(self.remaining(activity), 0)
+        self.assertEqual(
+            set(self.statuses(activity).values()), {ActivityRegistration.STATUS_CONFIRMED}
+        )
+        self.assertEqual(activity.register(self.users[2]).status, ActivityRegistration.STATUS_WAITLISTED)
+
+        # 编辑其他字段不会覆盖报名流程维护的剩余名额
+        activity = Activity.objects.get(pk=activity.pk)
+        activity.title = '新标题'
+        activity.save()
+        self.assertEqual(self.remaining(activity), 0)
+
+        activity.capacity = None
+        activity.save()
+        self.assertIsNone(self.remaining(activity))
+        self.assertEqual(
+            set(self.statuses(activity).values()), {ActivityRegistration.STATUS_CONFIRMED}
+        )
+
+
+class RegistrationExportTests(APITestCase):
+    """报名名单流式导出：表头、行数和公式字符转义"""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True))
+        now = timezone.now()
+        self.activity = Activity.objects.create(
+            title='=HYPERLINK("http://example.com")',
+            cover='activity_covers/cover.jpg',
+            start_time=now + timedelta(days=1),
+            end_time=now + timedelta(days=1, hours=2),
+            content='活动详情',
+        )
+        for i in range(3):
+            user = User.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            user.profile.nickname = ['=1+2', '@SUM(A1)', '张三'][i]
+            user.profile.phone = '-13800000000' if i == 0 else '13800000000'
+            user.profile.save()
+            self.activity.register(user)
+
+    def export(self, file_type):
+        response = self.client.get(
+            f'/api/activity/activities/{self.activity.pk}/export_registrations/', {'file_type': file_type}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.export('csv').decode('utf-8-sig'))))
+        self.assertEqual(rows[0], REGISTRATION_EXPORT_HEADER)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:4], ["'" + self.activity.title, 'user0', "'=1+2", "'-13800000000"])
+        self.assertEqual(rows[2][2:4], ["'@SUM(A1)", '13800000000'])
+        self.assertEqual(rows[3][2], '张三')
+
+    def test_xlsx_export(self):
+        with zipfile.ZipFile(io.BytesIO(self.export('xlsx'))) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row '), 4)
+        self.assertIn(f'<t xml:space="preserve">{REGISTRATION_EXPORT_HEADER[0]}</t>', sheet)
+        self.assertIn('<t xml:space="preserve">\'=1+2</t>', sheet)
+        self.assertIn('<t xml:space="preserve">\'@SUM(A1)</t>', sheet)
+        self.assertNotIn('<t xml:space="preserve">=', sheet)
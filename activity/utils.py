@@ -2,12 +2,13 @@ from rest_framework.response import Response
 from rest_framework import status
 
 class APIResponse(Response):
-    def __init__(self, code=200, message='success', data=None, status=status.HTTP_200_OK, **kwargs):
+    def __init__(self, code=200, message='success', data=None, status=status.HTTP_200_OK, extra=None, **kwargs):
         response_data = {
             'code': code,
             'message': message,
             'data': data
         }
+        response_data.update(extra or {})  # 附加的顶层字段，如分页游标
         super().__init__(data=response_data, status=status, **kwargs)
 
 class APIError(Exception):
@@ -1,13 +1,73 @@
+from datetime import datetime, time
+
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value, BooleanField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
-from .models import Activity, ActivityRegistration
-from .serializers import ActivityListSerializer, ActivityDetailSerializer, ActivityRegistrationSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .exports import REGISTRATION_EXPORT_HEADER, registration_rows
+from .models import Activity, ActivityRegistration, AlreadyRegistered
+from .serializers import (
+    ActivityListSerializer, ActivityDetailSerializer, ActivityRegistrationSerializer, MyRegistrationSerializer
+)
 from .utils import APIResponse, APIError
+from yanglao.exports import CONTENT_TYPES, streaming_export
+from yanglao.pagination import CursorPaginator, InvalidCursor
+
+# 时间范围筛选参数：查询参数 -> (字段查询, 只给日期时取当天的开始还是结束)
+TIME_RANGE_FILTERS = {
+    'start_after': ('start_time__gte', time.min),
+    'start_before': ('start_time__lte', time.max),
+    'end_after': ('end_time__gte', time.min),
+    'end_before': ('end_time__lte', time.max),
+}
+
+
+def registration_count(registration_status):
+    """指定状态报名人数的关联子查询，避免 JOIN + GROUP BY 妨碍按开始时间索引排序"""
+    counts = (
+        ActivityRegistration.objects.filter(activity=OuterRef('pk'), status=registration_status)
+        .order_by()
+        .values('activity')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
 
 class ActivityViewSet(viewsets.ModelViewSet):
     """活动视图集，处理所有活动相关的API请求"""
     queryset = Activity.objects.all()  # 查询所有活动数据
+    # 列表按开始时间翻页；已结束的活动按开始时间倒序
+    cursor_paginator = CursorPaginator(ordering=('start_time', 'id'), page_size=20, max_page_size=50)
+    past_cursor_paginator = CursorPaginator(ordering=('-start_time', '-id'), page_size=20, max_page_size=50)
+    # 我的报名按活动开始时间翻页
+    registration_cursor_paginator = CursorPaginator(
+        ordering=('activity__start_time', 'id'), page_size=20, max_page_size=50
+    )
+    past_registration_cursor_paginator = CursorPaginator(
+        ordering=('-activity__start_time', '-id'), page_size=20, max_page_size=50
+    )
+    
+    def get_queryset(self):
+        """在一次查询中附带报名人数、候补人数和当前用户的报名状态"""
+        queryset = Activity.objects.annotate(
+            registration_count=registration_count(ActivityRegistration.STATUS_CONFIRMED),
+            waitlist_count=registration_count(ActivityRegistration.STATUS_WAITLISTED),
+        )
+        user = self.request.user
+        if user.is_authenticated:
+            registered = ActivityRegistration.objects.filter(activity=OuterRef('pk'), user=user)
+            return queryset.annotate(
+                is_registered=Exists(registered.filter(status=ActivityRegistration.STATUS_CONFIRMED)),
+                is_waitlisted=Exists(registered.filter(status=ActivityRegistration.STATUS_WAITLISTED)),
+            )
+        return queryset.annotate(
+            is_registered=Value(False, output_field=BooleanField()),
+            is_waitlisted=Value(False, output_field=BooleanField()),
+        )
     
     def get_serializer_class(self):
         """根据不同的操作类型返回不同的序列化器类"""
@@ -15,12 +75,59 @@ class ActivityViewSet(viewsets.ModelViewSet):
             return ActivityListSerializer  # 列表视图使用列表序列化器
         return ActivityDetailSerializer  # 其他视图使用详情序列化器
     
+    def filter_by_time(self, queryset, params, prefix='', default_status=None):
+        """
+        按活动状态和时间范围筛选
+        status: upcoming 未开始 / ongoing 进行中 / current 未开始或进行中 / past 已结束 / all 全部
+        start_after、start_before、end_after、end_before: ISO 格式的日期或时间
+        prefix 为活动字段的路径前缀，筛选报名记录时为 'activity__'
+        没有任何筛选参数时按 default_status 筛选
+        """
+        now = timezone.now()
+        start, end = f'{prefix}start_time', f'{prefix}end_time'
+        activity_status = params.get('status')
+        if not activity_status and not any(params.get(param) for param in TIME_RANGE_FILTERS):
+            activity_status = default_status
+        if activity_status == 'upcoming':
+            queryset = queryset.filter(**{f'{start}__gt': now})
+        elif activity_status == 'ongoing':
+            queryset = queryset.filter(**{f'{start}__lte': now, f'{end}__gt': now})
+        elif activity_status == 'current':
+            queryset = queryset.filter(**{f'{end}__gt': now})
+        elif activity_status == 'past':
+            # 结束时间不早于开始时间，附加开始时间条件以便使用开始时间索引
+            queryset = queryset.filter(**{f'{start}__lte': now, f'{end}__lte': now})
+        elif activity_status and activity_status != 'all':
+            raise APIError(code=400, message='status 参数只能是 upcoming、ongoing、current、past 或 all')
+
+        for param, (lookup, default_time) in TIME_RANGE_FILTERS.items():
+            value = params.get(param)
+            if not value:
+                continue
+            # parse_datetime 也接受纯日期（按零点），因此先按日期解析，只给日期时取当天的开始或结束
+            day = parse_date(value)
+            moment = datetime.combine(day, default_time) if day else parse_datetime(value)
+            if moment is None:
+                raise APIError(code=400, message=f'{param} 参数格式错误')
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            queryset = queryset.filter(**{prefix + lookup: moment})
+        return queryset
+
     def list(self, request, *args, **kwargs):
-        """获取活动列表"""
+        """获取活动列表，支持按状态、时间范围筛选，使用 cursor 参数翻页；不带筛选参数时只返回未结束的活动"""
         try:
-            queryset = self.filter_queryset(self.get_queryset())  # 获取并过滤查询集
-            serializer = self.get_serializer(queryset, many=True, context={'request': request})  # 序列化多个活动对象，并传入请求上下文
-            return APIResponse(data=serializer.data)  # 返回活动列表数据
+            params = request.query_params
+            queryset = self.filter_by_time(
+                self.filter_queryset(self.get_queryset()), params, default_status='current'
+            )  # 获取并过滤查询集
+            paginator = self.past_cursor_paginator if params.get('status') == 'past' else self.cursor_paginator
+            activities, next_cursor = paginator.paginate(queryset, request)
+            serializer = self.get_serializer(activities, many=True, context={'request': request})  # 序列化多个活动对象，并传入请求上下文
+            return APIResponse(data=serializer.data, extra={'next_cursor': next_cursor})  # 返回活动列表数据
+        except (APIError, InvalidCursor) as e:
+            message = e.message if isinstance(e, APIError) else str(e)
+            return APIResponse(code=400, message=message, status=status.HTTP_400_BAD_REQUEST)  # 处理请求参数错误
         except Exception as e:
             return APIResponse(code=500, message=str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 处理服务器内部错误
     
@@ -71,17 +178,15 @@ class ActivityViewSet(viewsets.ModelViewSet):
         try:
             activity = self.get_object()  # 获取要报名的活动对象
             
-            # 检查用户是否已经报名该活动
-            if ActivityRegistration.objects.filter(activity=activity, user=request.user).exists():
+            # 扣减名额并创建报名记录，名额已满时进入候补名单
+            try:
+                registration = activity.register(request.user)
+            except AlreadyRegistered:
                 raise APIError(code=400, message='您已经报名过该活动')
             
-            # 创建新的报名记录
-            registration = ActivityRegistration.objects.create(
-                activity=activity,
-                user=request.user
-            )
-            
             serializer = ActivityRegistrationSerializer(registration)  # 序列化报名记录
+            if registration.status == ActivityRegistration.STATUS_WAITLISTED:
+                return APIResponse(message='名额已满，已加入候补名单', data=serializer.data, status=status.HTTP_201_CREATED)
             return APIResponse(data=serializer.data, status=status.HTTP_201_CREATED)  # 返回报名成功的数据
         except APIError as e:
             return APIResponse(code=e.code, message=e.message, status=status.HTTP_400_BAD_REQUEST)  # 处理业务逻辑错误
@@ -94,16 +199,56 @@ class ActivityViewSet(viewsets.ModelViewSet):
         try:
             activity = self.get_object()  # 获取要取消报名的活动对象
             
-            # 检查用户是否已经报名该活动
-            registration = ActivityRegistration.objects.filter(activity=activity, user=request.user).first()
+            # 删除报名记录，释放的名额由候补名单中最早的用户递补
+            registration = activity.cancel_registration(request.user)
             if not registration:
                 raise APIError(code=400, message='您尚未报名该活动，无法取消')
             
-            # 删除报名记录
-            registration.delete()
-            
             return APIResponse(message='取消报名成功', status=status.HTTP_200_OK)  # 返回取消成功的消息
         except APIError as e:
             return APIResponse(code=e.code, message=e.message, status=status.HTTP_400_BAD_REQUEST)  # 处理业务逻辑错误
         except Exception as e:
-            return APIResponse(code=500, message=str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 处理服务器内部错误 
\ No newline at end of file
+            return APIResponse(code=500, message=str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 处理服务器内部错误
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def my_registrations(self, request):
+        """
+        获取当前用户的报名记录（含候补），附带活动摘要
+        支持与活动列表相同的 status 和时间范围筛选，使用 cursor 参数翻页
+        """
+        try:
+            params = request.query_params
+            queryset = ActivityRegistration.objects.filter(user=request.user).select_related('activity')
+            queryset = self.filter_by_time(queryset, params, prefix='activity__')
+            if params.get('status') == 'past':
+                paginator = self.past_registration_cursor_paginator
+            else:
+                paginator = self.registration_cursor_paginator
+            registrations, next_cursor = paginator.paginate(queryset, request)
+            serializer = MyRegistrationSerializer(registrations, many=True)  # 序列化报名记录和活动摘要
+            return APIResponse(data=serializer.data, extra={'next_cursor': next_cursor})  # 返回报名记录列表
+        except (APIError, InvalidCursor) as e:
+            message = e.message if isinstance(e, APIError) else str(e)
+            return APIResponse(code=400, message=message, status=status.HTTP_400_BAD_REQUEST)  # 处理请求参数错误
+        except Exception as e:
+            return APIResponse(code=500, message=str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 处理服务器内部错误
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def export_registrations(self, request, pk=None):
+        """流式导出活动报名名单，file_type 为 csv（默认）或 xlsx"""
+        try:
+            activity = self.get_object()  # 获取要导出名单的活动对象
+            file_type = request.query_params.get('file_type', 'csv')
+            if file_type not in CONTENT_TYPES:
+                raise APIError(code=400, message='file_type 参数只能是 csv 或 xlsx')
+            return streaming_export(
+                REGISTRATION_EXPORT_HEADER,
+                registration_rows([activity.pk]),
+                filename=f'{activity.title}-报名名单',
+                file_type=file_type,
+                sheet_name=activity.title,
+            )
+        except APIError as e:
+            return APIResponse(code=e.code, message=e.message, status=status.HTTP_400_BAD_REQUEST)  # 处理业务逻辑错误
+        except Exception as e:
+            return APIResponse(code=500, message=str(e), status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 处理服务器内部错误
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Category, Article
+from .search import filter_matches, fts_available
 
 
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,23 +9,18 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     list_filter = ("created_at",)
 
-    def article_count(self, obj):
-        return obj.article_count()
-
-    article_count.short_description = "文章数量"
-
 
 class ArticleAdmin(admin.ModelAdmin):
-    list_display = ("title", "description", "category", "cover_preview", "views", "likes_count", "created_at")
+    list_display = ("title", "description", "category", "cover_preview", "views", "unique_readers", "likes_count", "created_at")
     search_fields = ("title", "content")
     list_filter = ("category", "created_at")
-    readonly_fields = ("views", "likes_count", "cover_preview")
+    readonly_fields = ("views", "unique_readers", "likes_count", "cover_preview")
     filter_horizontal = ()
     list_per_page = 20
 
     fieldsets = (
         ("基本信息", {"fields": ("title", "description", "category", "cover", "content")}),
-        ("统计信息", {"fields": ("views", "likes_count")}),
+        ("统计信息", {"fields": ("views", "unique_readers", "likes_count")}),
     )
 
     def cover_preview(self, obj):
@@ -33,6 +29,12 @@ class ArticleAdmin(admin.ModelAdmin):
         return "-"
     cover_preview.short_description = "封面预览"
 
+    def get_search_results(self, request, queryset, search_term):
+        """使用全文索引检索标题、摘要和正文"""
+        if not search_term or not fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return filter_matches(queryset, search_term), False
+
 
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Article, ArticleAdmin)
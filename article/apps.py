@@ -1,6 +1,16 @@
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 class ArticleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'article'
-    verbose_name = '文章管理'
\ No newline at end of file
+    verbose_name = '文章管理'
+
+    def ready(self):
+        # 阅读量写缓冲的后台刷新线程只在服务进程中启动，运行测试时由测试直接调用 flush()
+        if getattr(settings, 'ARTICLE_VIEW_FLUSHER_ENABLED', True) and sys.argv[1:2] != ['test']:
+            from .counters import view_counter
+
+            view_counter.start()
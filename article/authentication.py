@@ -0,0 +1,16 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+
+class OptionalJWTAuthentication(JWTAuthentication):
+    """
+    可选 JWT 认证
+    用于公开接口：携带有效 token 时识别当前用户，token 缺失或无效时按匿名用户处理
+    """
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except (InvalidToken, AuthenticationFailed):
+            return None
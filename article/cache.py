@@ -0,0 +1,139 @@
+"""
+文章公开接口的响应缓存
+缓存键由接口名、规范化后的查询参数和版本号组成。文章或分类变更时由信号更新对应的版本号，
+旧的缓存条目随之失效，无需逐个删除。文章详情只依赖该文章的版本号：修改一篇文章只使它本身、
+把它列为相关文章的文章和列表失效；分类信息（名称、文章数量）变化时才使该分类下的文章详情失效。
+条目过了新鲜期后在过期前仍可返回（stale-while-revalidate），同时由一个线程在后台重新计算；
+同一个键同时只允许一个请求重新计算（single-flight），避免热点键失效时大量请求同时访问数据库。
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from rest_framework.response import Response
+
+LIST_VERSION_KEY = "article:version:list"
+CATEGORY_VERSION_KEY = "article:version:category"
+
+
+def fresh_seconds():
+    return getattr(settings, "ARTICLE_CACHE_FRESH_SECONDS", 60)
+
+
+def stale_seconds():
+    return getattr(settings, "ARTICLE_CACHE_STALE_SECONDS", 300)
+
+
+def article_version_key(article_id):
+    return f"article:version:article:{article_id}"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*keys):
+    """更新版本号，使依赖这些版本号的缓存条目全部失效"""
+    version = time.time_ns()
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def category_article_keys(category_ids):
+    """分类下全部文章的详情版本号键"""
+    from .models import Article
+
+    return [
+        article_version_key(pk)
+        for pk in Article.objects.filter(category_id__in=category_ids).values_list("pk", flat=True)
+    ]
+
+
+def invalidate_article(article_id, category_ids=(), referenced_by=None):
+    """
+    文章变更：该文章详情、把它列为相关文章的文章详情和文章列表失效
+    category_ids 为文章数量发生变化的分类（新建、删除或更换分类），这些分类下的文章详情和分类列表一并失效；
+    referenced_by 为引用该文章的文章 ID，文章已删除、相关记录已级联删除时由调用方提前取得
+    """
+    from .models import RelatedArticle
+
+    if referenced_by is None:
+        referenced_by = RelatedArticle.objects.filter(related_id=article_id).values_list("article_id", flat=True)
+    keys = {article_version_key(article_id), LIST_VERSION_KEY}
+    keys.update(article_version_key(pk) for pk in referenced_by)
+    if category_ids:
+        keys.add(CATEGORY_VERSION_KEY)
+        keys.update(category_article_keys(category_ids))
+    bump_version(*keys)
+
+
+def invalidate_category(category_id):
+    """分类变更：分类列表、文章列表（分类名称）和该分类下文章详情中的分类信息失效"""
+    bump_version(LIST_VERSION_KEY, CATEGORY_VERSION_KEY, *category_article_keys([category_id]))
+
+
+def make_key(name, params, *version_keys):
+    """根据规范化的参数和版本号生成缓存键"""
+    normalized = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] not in (None, ""))
+    versions = ":".join(str(get_version(key)) for key in version_keys)
+    digest = hashlib.md5(f"{normalized}|{versions}".encode("utf-8")).hexdigest()
+    return f"article:response:{name}:{digest}"
+
+
+def _recompute(key, compute):
+    """调用 compute 生成响应，成功的响应写入缓存"""
+    response = compute()
+    if response.status_code == 200:
+        entry = {"data": response.data, "fresh_until": time.time() + fresh_seconds()}
+        cache.set(key, entry, timeout=fresh_seconds() + stale_seconds())
+    return response
+
+
+def _revalidate_in_background(key, compute, lock_key):
+    def run():
+        try:
+            _recompute(key, compute)
+        except Exception:
+            pass
+        finally:
+            cache.delete(lock_key)
+            close_old_connections()
+
+    threading.Thread(target=run, name="article-cache-revalidate", daemon=True).start()
+
+
+def cached_response(key, compute, wait=2.0):
+    """
+    读取缓存的响应，必要时调用 compute 重新生成
+    compute 返回 Response，只有状态码为 200 的响应会被缓存
+    """
+    lock_key = f"{key}:lock"
+    entry = cache.get(key)
+    if entry is not None:
+        if entry["fresh_until"] < time.time() and cache.add(lock_key, 1, timeout=30):
+            _revalidate_in_background(key, compute, lock_key)
+        return Response(entry["data"])
+
+    deadline = time.time() + wait
+    while not cache.add(lock_key, 1, timeout=30):
+        # 其他请求正在生成同一个键的响应，等待其结果
+        if time.time() >= deadline:
+            return compute()
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return Response(entry["data"])
+    try:
+        entry = cache.get(key)
+        if entry is not None:
+            return Response(entry["data"])
+        return _recompute(key, compute)
+    finally:
+        cache.delete(lock_key)
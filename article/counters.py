@@ -0,0 +1,223 @@
+import atexit
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .hot import add_score, refresh_leaderboard, view_weight
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterBuffer:
+    """
+    文章阅读量写缓冲
+    在进程内累积阅读量增量，由后台线程定期以 F("views") + n 的批量 UPDATE 写回数据库，
+    详情接口因此不再对文章行加写锁。后台线程由 start() 启动（见 ArticleConfig.ready），
+    启动后进程正常退出时会再刷新一次，保证增量不丢失。
+    独立读者以每篇文章每天一个 HyperLogLog 草图在内存中累积，刷新时合并进每日草图和累计草图。
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._pending = defaultdict(int)
+        self._readers = {}
+        self._hot = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stopped = threading.Event()
+
+    def incr(self, article_id, n=1):
+        """累加阅读量，返回该文章尚未写回的增量"""
+        with self._lock:
+            self._pending[article_id] += n
+            pending = self._pending[article_id]
+        return pending
+
+    def add_reader(self, article_id, reader):
+        """记录一次读者访问，reader 为用户 ID 或客户端指纹"""
+        key = (article_id, timezone.localdate())
+        with self._lock:
+            sketch = self._readers.get(key)
+            if sketch is None:
+                sketch = self._readers[key] = HyperLogLog()
+            sketch.add(reader)
+
+    def mark_hot(self, article_id):
+        """标记文章热度已变化，下次刷新时重新物化其分类的热门排行"""
+        with self._lock:
+            self._hot.add(article_id)
+
+    def pending(self, article_id):
+        """获取文章尚未写回的阅读量增量"""
+        with self._lock:
+            return self._pending.get(article_id, 0)
+
+    def flush(self):
+        """将缓冲的增量写回数据库，返回写回的阅读量总数"""
+        from .models import Article
+
+        # 读者草图与阅读量相互独立，草图合并失败不影响阅读量和热度写回
+        try:
+            self.flush_readers()
+        except Exception:
+            logger.exception("合并文章读者草图失败，将在下次刷新时重试")
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            hot, self._hot = self._hot, set()
+
+        # 相同增量的文章合并为一条 UPDATE ... WHERE id IN (...)，同时累加热度分
+        batches = defaultdict(list)
+        for article_id, n in pending.items():
+            batches[n].append(article_id)
+
+        try:
+            # 所有批次在同一事务中写回，任一批次失败时整体回滚，放回缓冲的增量不会被重复计入
+            with transaction.atomic():
+                for n, ids in batches.items():
+                    Article.objects.filter(pk__in=ids).update(
+                        views=F("views") + n, hot_score=add_score(n * view_weight())
+                    )
+        except Exception:
+            # 写回失败时将增量放回缓冲，等待下一次刷新
+            with self._lock:
+                for article_id, n in pending.items():
+                    self._pending[article_id] += n
+                self._hot |= hot
+            raise
+
+        hot |= set(pending)
+        if hot:
+            refresh_leaderboard(
+                Article.objects.filter(pk__in=hot).values_list("category_id", flat=True).distinct()
+            )
+        return sum(pending.values())
+
+    def flush_readers(self):
+        """将内存中的读者草图合并进每日草图和累计草图，并刷新文章的独立读者数"""
+        from .models import Article, ArticleReaderSketch, ArticleReaderTotal
+
+        with self._lock:
+            readers, self._readers = self._readers, {}
+        if not readers:
+            return
+
+        try:
+            with transaction.atomic():
+                # 忽略缓冲期间已被删除的文章
+                live = set(Article.objects.filter(
+                    pk__in={article_id for article_id, _ in readers}
+                ).values_list("pk", flat=True))
+                readers = {key: sketch for key, sketch in readers.items() if key[0] in live}
+                existing = ArticleReaderSketch.objects.select_for_update().filter(
+                    article_id__in={article_id for article_id, _ in readers},
+                    day__in={day for _, day in readers},
+                )
+                existing = {(s.article_id, s.day): s for s in existing}
+                created, updated = [], []
+                for (article_id, day), sketch in readers.items():
+                    row = existing.get((article_id, day))
+                    if row is None:
+                        created.append(ArticleReaderSketch(
+                            article_id=article_id, day=day, registers=sketch.to_bytes()
+                        ))
+                    else:
+                        row.registers = sketch.merge(bytes(row.registers)).to_bytes()
+                        updated.append(row)
+                ArticleReaderSketch.objects.bulk_create(created)
+                ArticleReaderSketch.objects.bulk_update(updated, ["registers"])
+
+                # 新增读者合并进累计草图，代价与统计的天数无关
+                added = {}
+                for (article_id, _), sketch in readers.items():
+                    added.setdefault(article_id, HyperLogLog()).merge(sketch)
+                totals = {
+                    row.article_id: row
+                    for row in ArticleReaderTotal.objects.select_for_update().filter(article_id__in=added)
+                }
+                created, updated, articles = [], [], []
+                for article_id, sketch in added.items():
+                    row = totals.get(article_id)
+                    if row is None:
+                        row = ArticleReaderTotal(article_id=article_id, registers=sketch.to_bytes())
+                        created.append(row)
+                    else:
+                        row.registers = sketch.merge(bytes(row.registers)).to_bytes()
+                        updated.append(row)
+                    articles.append(Article(pk=article_id, unique_readers=sketch.count()))
+                ArticleReaderTotal.objects.bulk_create(created)
+                ArticleReaderTotal.objects.bulk_update(updated, ["registers"])
+                Article.objects.bulk_update(articles, ["unique_readers"])
+        except Exception:
+            with self._lock:
+                for key, sketch in readers.items():
+                    current = self._readers.get(key)
+                    self._readers[key] = sketch if current is None else current.merge(sketch)
+            raise
+
+    def start(self):
+        """启动后台刷新线程，并在进程退出时写回剩余增量；重复调用无效"""
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._stopped.clear()
+            self._flusher = threading.Thread(
+                target=self._run, name="article-view-flusher", daemon=True
+            )
+            self._flusher.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        interval = self.interval or getattr(settings, "ARTICLE_VIEW_FLUSH_INTERVAL", 5)
+        while not self._stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("写回文章阅读量失败，将在下次刷新时重试")
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        """停止后台线程并写回剩余增量"""
+        self._stopped.set()
+        with self._lock:
+            flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.join()
+        atexit.unregister(self.shutdown)
+        self.flush()
+
+
+def client_ip(request):
+    """
+    获取客户端 IP
+    X-Forwarded-For 可由客户端任意伪造，只有配置了可信代理层数（ARTICLE_TRUSTED_PROXY_COUNT）时，
+    才取由最外层可信代理写入的那一项，否则使用 REMOTE_ADDR
+    """
+    proxies = getattr(settings, "ARTICLE_TRUSTED_PROXY_COUNT", 0)
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def reader_key(request):
+    """
+    获取读者标识
+    已登录用户使用用户 ID，匿名访问使用 IP 与 User-Agent 的哈希指纹
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    agent = request.META.get("HTTP_USER_AGENT", "")
+    return "anon:" + hashlib.sha1(f"{client_ip(request)}|{agent}".encode("utf-8")).hexdigest()
+
+
+view_counter = ViewCounterBuffer()
@@ -0,0 +1,52 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 基数估计
+    以固定大小的寄存器数组估计去重后的读者数，内存占用与访问量无关，
+    多个草图按寄存器取最大值即可合并（例如把多天的草图合并成总数）。
+    """
+
+    precision = 10
+    size = 1 << precision
+
+    def __init__(self, registers=None):
+        if registers is None:
+            self.registers = bytearray(self.size)
+        else:
+            if len(registers) != self.size:
+                raise ValueError("寄存器长度不正确")
+            self.registers = bytearray(registers)
+
+    def add(self, value):
+        """记录一个读者标识"""
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """合并另一个草图（逐个寄存器取最大值）"""
+        if isinstance(other, HyperLogLog):
+            other = other.registers
+        self.registers = bytearray(map(max, self.registers, other))
+        return self
+
+    def count(self):
+        """估计去重后的读者数"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # 小基数时改用线性计数，误差更小
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes(self.registers)
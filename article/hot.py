@@ -0,0 +1,122 @@
+"""
+热门文章排行
+每篇文章维护一个按半衰期指数衰减的热度分（阅读和点赞加权）。为避免定期衰减所有文章，
+分数以固定纪元 HOT_EPOCH 为基准记录：t 时刻的一次事件贡献 w * 2^((t - HOT_EPOCH) / 半衰期)，
+各文章分数之比与真实衰减后的分数之比相同，因此可直接按该值排序。
+纪元基准下的分数随时间指数增长，很快会超出浮点数范围，因此 hot_score 存储其以 2 为底的对数，
+累加在对数空间中用 F() 表达式完成：log2(2^s + 2^g) = max(s, g) + log2(1 + 2^-|s - g|)，
+对数单调，排序结果不变。hot_score 为 0 表示没有热度。
+每个分类的前 N 名物化到 HotArticle 表中，热门查询只需一次索引查找。
+"""
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def half_life_seconds():
+    return getattr(settings, "ARTICLE_HOT_HALF_LIFE_HOURS", 72) * 3600
+
+
+def view_weight():
+    return getattr(settings, "ARTICLE_HOT_VIEW_WEIGHT", 1.0)
+
+
+def like_weight():
+    return getattr(settings, "ARTICLE_HOT_LIKE_WEIGHT", 5.0)
+
+
+def top_n():
+    return getattr(settings, "ARTICLE_HOT_TOP_N", 20)
+
+
+def growth(at=None):
+    """t 时刻单位事件在纪元基准下分值的对数（以 2 为底）"""
+    at = at or timezone.now()
+    return (at - HOT_EPOCH).total_seconds() / half_life_seconds()
+
+
+def event_score(weight, at=None):
+    """t 时刻权重为 weight 的事件在纪元基准下分值的对数，权重不为正时返回 None"""
+    if weight <= 0:
+        return None
+    return growth(at) + math.log2(weight)
+
+
+def add_score(weight, at=None):
+    """在对数空间中把一次事件累加到 hot_score 的 F() 表达式"""
+    score = event_score(weight, at)
+    if score is None:
+        return F("hot_score")
+    score = Value(score, output_field=FloatField())
+    return Case(
+        When(hot_score__lte=0, then=score),
+        default=Greatest(F("hot_score"), score) + Log(2, 1 + Power(2, -Abs(F("hot_score") - score))),
+        output_field=FloatField(),
+    )
+
+
+def subtract_score(weight, at=None):
+    """在对数空间中从 hot_score 扣除一次事件的 F() 表达式，扣除后不为正时归零"""
+    score = event_score(weight, at)
+    if score is None:
+        return F("hot_score")
+    return Case(
+        When(
+            hot_score__gt=score,
+            then=F("hot_score") + Log(2, 1 - Power(2, Value(score, output_field=FloatField()) - F("hot_score"))),
+        ),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def current_score(score, at=None):
+    """把对数形式的纪元基准分数换算为 at 时刻的实际热度"""
+    if score <= 0:
+        return 0.0
+    exponent = score - growth(at)
+    return 2.0 ** exponent if exponent < 1000 else math.inf
+
+
+def refresh_leaderboard(category_ids):
+    """重新物化指定分类的前 N 名热门文章"""
+    from .models import Article, HotArticle
+
+    category_ids = set(category_ids)
+    if not category_ids:
+        return
+    limit = top_n()
+    with transaction.atomic():
+        entries = []
+        for category_id in category_ids:
+            top = (
+                Article.objects.filter(category_id=category_id, hot_score__gt=0)
+                .order_by("-hot_score")
+                .values_list("pk", "hot_score")[:limit]
+            )
+            entries.extend(
+                HotArticle(article_id=pk, category_id=category_id, score=score)
+                for pk, score in top
+            )
+        HotArticle.objects.filter(category_id__in=category_ids).delete()
+        # 文章可能已换分类，按文章删除旧记录
+        HotArticle.objects.filter(article_id__in=[entry.article_id for entry in entries]).delete()
+        HotArticle.objects.bulk_create(entries)
+
+
+def hot_articles(category_name=None, limit=5):
+    """获取热门文章，按当前热度降序排列"""
+    from .models import HotArticle
+
+    entries = HotArticle.objects.select_related("article__category").order_by("-score")
+    if category_name:
+        entries = entries.filter(category__name=category_name)
+    return [entry.article for entry in entries[:limit]]
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from article.cache import article_version_key, bump_version
+
+
+class Command(BaseCommand):
+    help = "根据 TF-IDF 相似度计算相关文章，默认只处理新增文章"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="重新计算全部文章的相关文章")
+        parser.add_argument("--top-k", type=int, default=5, help="每篇文章保存的相关文章数")
+        parser.add_argument("--block-size", type=int, default=256, help="每块计算相似度的文章数")
+
+    def handle(self, *args, **options):
+        try:
+            from article.related import build_related
+        except ImportError as e:
+            raise CommandError(f"缺少依赖：{e}")
+
+        try:
+            changed = build_related(
+                k=options["top_k"], block_size=options["block_size"], full=options["full"]
+            )
+        except ImportError as e:
+            raise CommandError(f"缺少依赖：{e}")
+
+        if changed:
+            bump_version(*[article_version_key(pk) for pk in changed])
+        self.stdout.write(self.style.SUCCESS(f"相关文章计算完成，更新了 {len(changed)} 篇文章"))
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from yanglao.images import SOURCE_FIELDS, missing_derivatives, render_derivative
+
+
+class Command(BaseCommand):
+    help = "为文章封面、活动封面和用户头像生成缺失的衍生图（建议定时执行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2), help="生成衍生图的进程数"
+        )
+
+    def handle(self, *args, **options):
+        tasks = []
+        for app_label, model_name, field in SOURCE_FIELDS:
+            names = (
+                apps.get_model(app_label, model_name).objects.exclude(**{f"{field}__isnull": True})
+                .exclude(**{field: ""}).values_list(field, flat=True).distinct()
+            )
+            for name in names.iterator():
+                tasks.extend(missing_derivatives(name))
+
+        generated, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [(task[0], executor.submit(render_derivative, *task)) for task in tasks]
+            for source, future in futures:
+                try:
+                    future.result()
+                    generated += 1
+                except (Image.DecompressionBombError, OSError, ValueError) as e:
+                    # 无法识别的文件、超过像素上限的图片（DecompressionBombError）等跳过，不影响其他图片
+                    failed += 1
+                    self.stderr.write(f"生成衍生图失败 {source}：{e}")
+        self.stdout.write(self.style.SUCCESS(f"衍生图生成完成，成功 {generated} 张，失败 {failed} 张"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from article.models import Article
+from article.search import clear_index, create_index, fts_available, index_articles
+
+
+class Command(BaseCommand):
+    help = "重建文章全文索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200, help="每批写入的文章数")
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError("当前数据库不支持 FTS5 全文索引")
+
+        batch_size = options["batch_size"]
+        articles = Article.objects.only("id", "title", "description", "content").order_by("pk")
+        total = 0
+        with transaction.atomic():
+            create_index()
+            clear_index()
+            batch = []
+            for article in articles.iterator(chunk_size=batch_size):
+                batch.append(article)
+                if len(batch) >= batch_size:
+                    index_articles(batch)
+                    total += len(batch)
+                    batch = []
+            index_articles(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"全文索引重建完成，共 {total} 篇文章"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from article.hot import event_score, like_weight, refresh_leaderboard, view_weight
+from article.models import Article, Category
+
+
+class Command(BaseCommand):
+    help = "根据累计阅读量和点赞数重建文章热度分及各分类热门排行"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批处理的文章数")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        weights = (view_weight(), like_weight())
+
+        # 历史数据没有事件时间，按文章发布时间近似计入衰减
+        last_id, total = 0, 0
+        while True:
+            batch = list(
+                Article.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .only("id", "created_at", "views", "likes_count")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            for article in batch:
+                article.hot_score = event_score(
+                    article.views * weights[0] + article.likes_count * weights[1], article.created_at
+                ) or 0
+            Article.objects.bulk_update(batch, ["hot_score"])
+            total += len(batch)
+
+        refresh_leaderboard(Category.objects.values_list("pk", flat=True))
+        self.stdout.write(self.style.SUCCESS(f"热度分重建完成，共 {total} 篇文章"))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from article.models import Article
+
+
+class Command(BaseCommand):
+    help = "根据点赞关系表分批重新计算文章点赞数，修复计数偏差"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批处理的文章数")
+        parser.add_argument("--dry-run", action="store_true", help="只报告偏差，不写入数据库")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        through = Article.liked_users.through
+
+        last_id = 0
+        checked = fixed = 0
+        while True:
+            batch = list(
+                Article.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", "likes_count")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            checked += len(batch)
+
+            actual = dict(
+                through.objects.filter(article_id__in=[pk for pk, _ in batch])
+                .values("article_id")
+                .annotate(n=Count("id"))
+                .values_list("article_id", "n")
+            )
+            drifted = [
+                Article(pk=pk, likes_count=actual.get(pk, 0))
+                for pk, likes_count in batch
+                if actual.get(pk, 0) != likes_count
+            ]
+            current = dict(batch)
+            for article in drifted:
+                if dry_run:
+                    self.stdout.write(
+                        f"文章 {article.pk}: 点赞数 {current[article.pk]}，将修正为 {article.likes_count}"
+                    )
+                else:
+                    self.stdout.write(f"文章 {article.pk}: 点赞数修正为 {article.likes_count}")
+            if drifted and not dry_run:
+                # 在同一条 UPDATE 中重新统计，避免覆盖统计期间新增的点赞
+                counts = (
+                    through.objects.filter(article_id=OuterRef("pk"))
+                    .order_by()
+                    .values("article_id")
+                    .annotate(n=Count("id"))
+                    .values("n")
+                )
+                Article.objects.filter(pk__in=[article.pk for article in drifted]).update(
+                    likes_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+                )
+            fixed += len(drifted)
+
+        action = "发现" if dry_run else "修复"
+        self.stdout.write(self.style.SUCCESS(f"共检查 {checked} 篇文章，{action} {fixed} 篇点赞数偏差"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from article.models import Article, Category
+
+
+class Command(BaseCommand):
+    help = "核对分类的文章数量与实际文章数是否一致，可选择修复"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="修复不一致的分类文章数量")
+
+    def handle(self, *args, **options):
+        counts = (
+            Article.objects.filter(category_id=OuterRef("pk"))
+            .order_by()
+            .values("category_id")
+            .annotate(n=Count("id"))
+            .values("n")
+        )
+        actual = Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+        drifted = list(
+            Category.objects.annotate(actual=actual)
+            .exclude(article_count=actual)
+            .values_list("pk", "name", "article_count", "actual")
+        )
+        for pk, name, stored, real in drifted:
+            self.stdout.write(f"分类 {name}({pk}): 记录 {stored}，实际 {real}")
+
+        if drifted and options["fix"]:
+            Category.objects.filter(pk__in=[row[0] for row in drifted]).update(article_count=actual)
+            self.stdout.write(self.style.SUCCESS(f"已修复 {len(drifted)} 个分类的文章数量"))
+        elif drifted:
+            self.stdout.write(self.style.WARNING(f"发现 {len(drifted)} 个分类的文章数量不一致"))
+        else:
+            self.stdout.write(self.style.SUCCESS("所有分类的文章数量一致"))
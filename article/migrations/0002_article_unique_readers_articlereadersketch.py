@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='unique_readers',
+            field=models.PositiveIntegerField(default=0, verbose_name='独立读者数'),
+        ),
+        migrations.CreateModel(
+            name='ArticleReaderSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('registers', models.BinaryField(verbose_name='寄存器')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reader_sketches', to='article.article', verbose_name='文章')),
+            ],
+            options={
+                'verbose_name': '读者草图',
+                'verbose_name_plural': '读者草图',
+                'unique_together': {('article', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    from article.search import create_index
+
+    create_index(schema_editor)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS article_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0003_article_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
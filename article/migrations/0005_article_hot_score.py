@@ -0,0 +1,54 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0004_article_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='热度分')),
+            ],
+            options={
+                'verbose_name': '热门文章',
+                'verbose_name_plural': '热门文章',
+            },
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='热度分'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', '-hot_score'], name='article_cat_hot_idx'),
+        ),
+        migrations.AddField(
+            model_name='hotarticle',
+            name='article',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hot_entry', to='article.article', verbose_name='文章'),
+        ),
+        migrations.AddField(
+            model_name='hotarticle',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='article.category', verbose_name='分类'),
+        ),
+        migrations.AddIndex(
+            model_name='hotarticle',
+            index=models.Index(fields=['-score'], name='hot_article_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotarticle',
+            index=models.Index(fields=['category', '-score'], name='hot_article_cat_score_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_article_count(apps, schema_editor):
+    Category = apps.get_model('article', 'Category')
+    Article = apps.get_model('article', 'Article')
+    counts = (
+        Article.objects.filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    Category.objects.update(
+        article_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0005_article_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='文章数量'),
+        ),
+        migrations.RunPython(populate_article_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0006_category_article_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='相似度')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='排名')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='article.article', verbose_name='文章')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='article.article', verbose_name='相关文章')),
+            ],
+            options={
+                'verbose_name': '相关文章',
+                'verbose_name_plural': '相关文章',
+                'indexes': [models.Index(fields=['article', 'rank'], name='related_article_rank_idx')],
+                'unique_together': {('article', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_reader_totals(apps, schema_editor):
+    from article.hll import HyperLogLog
+
+    ArticleReaderSketch = apps.get_model('article', 'ArticleReaderSketch')
+    ArticleReaderTotal = apps.get_model('article', 'ArticleReaderTotal')
+    totals = {}
+    for article_id, registers in ArticleReaderSketch.objects.values_list('article_id', 'registers').iterator():
+        totals.setdefault(article_id, HyperLogLog()).merge(bytes(registers))
+    ArticleReaderTotal.objects.bulk_create(
+        [ArticleReaderTotal(article_id=article_id, registers=total.to_bytes()) for article_id, total in totals.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0007_related_article'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleReaderTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registers', models.BinaryField(verbose_name='寄存器')),
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reader_total', to='article.article', verbose_name='文章')),
+            ],
+            options={
+                'verbose_name': '累计读者草图',
+                'verbose_name_plural': '累计读者草图',
+            },
+        ),
+        migrations.RunPython(populate_reader_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:12
+
+import math
+
+from django.db import migrations
+
+
+def to_log_scale(apps, schema_editor):
+    # 热度分改为存储纪元基准分数的 log2，旧数据按同样方式换算，排序保持不变
+    Article = apps.get_model('article', 'Article')
+    HotArticle = apps.get_model('article', 'HotArticle')
+    for model in (Article, HotArticle):
+        field = 'hot_score' if model is Article else 'score'
+        batch = []
+        for obj in model.objects.filter(**{f'{field}__gt': 0}).only('id', field).iterator():
+            setattr(obj, field, max(math.log2(getattr(obj, field)), 0.0))
+            batch.append(obj)
+        model.objects.bulk_update(batch, [field], batch_size=500)
+
+
+def to_linear_scale(apps, schema_editor):
+    Article = apps.get_model('article', 'Article')
+    HotArticle = apps.get_model('article', 'HotArticle')
+    for model in (Article, HotArticle):
+        field = 'hot_score' if model is Article else 'score'
+        batch = []
+        for obj in model.objects.filter(**{f'{field}__gt': 0}).only('id', field).iterator():
+            setattr(obj, field, 2.0 ** min(getattr(obj, field), 1000))
+            batch.append(obj)
+        model.objects.bulk_update(batch, [field], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0008_article_reader_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_log_scale, to_linear_scale),
+    ]
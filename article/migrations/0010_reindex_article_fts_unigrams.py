@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def reindex_fts(apps, schema_editor):
+    # 全文索引新增中文单字词，按新的分词方式重建已有文章的索引
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    from article.search import index_articles
+
+    Article = apps.get_model("article", "Article")
+    batch = []
+    for article in Article.objects.only("id", "title", "description", "content").order_by("pk").iterator():
+        batch.append(article)
+        if len(batch) >= 200:
+            index_articles(batch)
+            batch = []
+    index_articles(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('article', '0009_hot_score_log_scale'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex_fts, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.html import format_html
 from ckeditor.fields import RichTextField
@@ -10,17 +13,18 @@ class Category(models.Model):
     """
 
     name = models.CharField("分类名称", max_length=100)
+    article_count = models.PositiveIntegerField("文章数量", default=0, editable=False)
     created_at = models.DateTimeField("创建时间", auto_now_add=True)
     updated_at = models.DateTimeField("更新时间", auto_now=True)
 
     def __str__(self):
         return self.name
 
-    def article_count(self):
-        """获取分类下的文章数量"""
-        return self.article_set.count()
-
-    article_count.short_description = "文章数量"
+    def save(self, *args, **kwargs):
+        # 文章数量由文章的信号以 F() 增量维护，普通保存时不写回
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = ["name", "updated_at"]
+        super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = "分类"
@@ -42,6 +46,8 @@ class Article(models.Model):
     description = models.CharField("摘要", max_length=200, blank=True)
     views = models.PositiveIntegerField("阅读量", default=0)
     likes_count = models.PositiveIntegerField("点赞数", default=0)
+    unique_readers = models.PositiveIntegerField("独立读者数", default=0)
+    hot_score = models.FloatField("热度分", default=0, editable=False)
     liked_users = models.ManyToManyField(
         'auth.User', 
         verbose_name="点赞用户",
@@ -51,15 +57,283 @@ class Article(models.Model):
     created_at = models.DateTimeField("创建时间", default=timezone.now)
     updated_at = models.DateTimeField("更新时间", auto_now=True)
 
+    # 计数字段只通过 F() 增量更新，普通保存时不写回，避免用过期的值覆盖
+    COUNTER_FIELDS = ("views", "likes_count", "unique_readers", "hot_score")
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def increase_views(self):
-        """增加阅读量"""
-        self.views += 1
-        self.save(update_fields=["views"])
+        """增加阅读量，增量先进入写缓冲，由后台线程批量写回"""
+        from .counters import view_counter
+
+        self.views += view_counter.incr(self.pk)
+
+    @staticmethod
+    def liked_ids(user, article_ids):
+        """
+        批量获取用户点赞过的文章 ID
+        对当前页的文章只查询一次点赞关系表，未登录用户返回空集合
+        """
+        if user is None or not user.is_authenticated:
+            return set()
+        through = Article.liked_users.through
+        return set(
+            through.objects.filter(user_id=user.pk, article_id__in=article_ids)
+            .values_list("article_id", flat=True)
+        )
+
+    def like(self, user):
+        """
+        点赞文章
+        依赖点赞关系表的唯一约束保证幂等，只有真正插入了点赞记录时才以单条
+        UPDATE 增加点赞数，返回是否点赞成功
+        """
+        from .counters import view_counter
+        from .hot import add_score, like_weight
+
+        through = Article.liked_users.through
+        try:
+            with transaction.atomic():
+                through.objects.create(article_id=self.pk, user_id=user.pk)
+                Article.objects.filter(pk=self.pk).update(
+                    likes_count=F("likes_count") + 1,
+                    hot_score=add_score(like_weight()),
+                )
+        except IntegrityError:
+            return False
+        view_counter.mark_hot(self.pk)
+        self.refresh_from_db(fields=["likes_count"])
+        return True
+
+    def unlike(self, user):
+        """取消点赞，只有真正删除了点赞记录时才减少点赞数，返回是否取消成功"""
+        from .counters import view_counter
+        from .hot import like_weight, subtract_score
+
+        through = Article.liked_users.through
+        with transaction.atomic():
+            deleted, _ = through.objects.filter(article_id=self.pk, user_id=user.pk).delete()
+            if deleted:
+                Article.objects.filter(pk=self.pk, likes_count__gt=0).update(
+                    likes_count=F("likes_count") - 1,
+                    hot_score=subtract_score(like_weight()),
+                )
+        if deleted:
+            view_counter.mark_hot(self.pk)
+        self.refresh_from_db(fields=["likes_count"])
+        return bool(deleted)
 
     class Meta:
         verbose_name = "文章"
         verbose_name_plural = "文章"
         ordering = ["-created_at"]
+        indexes = [
+            # 支持按 (created_at, id) 的游标分页，以及分类内的游标分页
+            models.Index(fields=["-created_at", "-id"], name="article_created_id_idx"),
+            models.Index(fields=["category", "-created_at", "-id"], name="article_cat_created_id_idx"),
+            models.Index(fields=["category", "-hot_score"], name="article_cat_hot_idx"),
+        ]
+
+
+class HotArticle(models.Model):
+    """
+    热门文章排行
+    物化每个分类热度分前 N 名的文章，由阅读量刷新和点赞增量维护
+    """
+
+    article = models.OneToOneField(
+        Article, on_delete=models.CASCADE, related_name="hot_entry", verbose_name="文章"
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="分类")
+    score = models.FloatField("热度分")
+
+    def __str__(self):
+        return str(self.article_id)
+
+    class Meta:
+        verbose_name = "热门文章"
+        verbose_name_plural = "热门文章"
+        indexes = [
+            models.Index(fields=["-score"], name="hot_article_score_idx"),
+            models.Index(fields=["category", "-score"], name="hot_article_cat_score_idx"),
+        ]
+
+
+class RelatedArticle(models.Model):
+    """
+    相关文章
+    由离线任务根据 TF-IDF 余弦相似度计算，每篇文章保存前 k 个近邻
+    """
+
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="related_entries", verbose_name="文章"
+    )
+    related = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="+", verbose_name="相关文章"
+    )
+    score = models.FloatField("相似度")
+    rank = models.PositiveSmallIntegerField("排名")
+
+    def __str__(self):
+        return f"{self.article_id} -> {self.related_id}"
+
+    class Meta:
+        verbose_name = "相关文章"
+        verbose_name_plural = "相关文章"
+        unique_together = ("article", "related")
+        indexes = [
+            models.Index(fields=["article", "rank"], name="related_article_rank_idx"),
+        ]
+
+
+class ArticleReaderSketch(models.Model):
+    """
+    文章每日读者草图
+    以 HyperLogLog 寄存器记录每篇文章每天的独立读者，大小固定，与访问量无关
+    """
+
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="reader_sketches", verbose_name="文章"
+    )
+    day = models.DateField("日期")
+    registers = models.BinaryField("寄存器")
+
+    def __str__(self):
+        return f"{self.article_id} - {self.day}"
+
+    class Meta:
+        verbose_name = "读者草图"
+        verbose_name_plural = "读者草图"
+        unique_together = ("article", "day")
+
+
+class ArticleReaderTotal(models.Model):
+    """
+    文章累计读者草图
+    每次刷新只把新增的读者草图合并进来，无需重新合并全部每日草图
+    """
+
+    article = models.OneToOneField(
+        Article, on_delete=models.CASCADE, related_name="reader_total", verbose_name="文章"
+    )
+    registers = models.BinaryField("寄存器")
+
+    def __str__(self):
+        return str(self.article_id)
+
+    class Meta:
+        verbose_name = "累计读者草图"
+        verbose_name_plural = "累计读者草图"
+
+
+@receiver(post_save, sender=Article)
+def index_article(sender, instance, **kwargs):
+    """文章保存后更新全文索引"""
+    from .search import index_articles
+
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not {"title", "description", "content"} & set(update_fields):
+        return
+    index_articles([instance])
+
+
+@receiver(post_save, sender=Article)
+def mark_article_hot(sender, instance, created, **kwargs):
+    """文章新建或修改（可能更换分类）后刷新热门排行"""
+    from .counters import view_counter
+
+    update_fields = kwargs.get("update_fields")
+    if created or not update_fields or "category" in update_fields:
+        view_counter.mark_hot(instance.pk)
+
+
+@receiver(post_delete, sender=Article)
+def unindex_article(sender, instance, **kwargs):
+    """文章删除后移除全文索引"""
+    from .search import remove_article
+
+    remove_article(instance.pk)
+
+
+@receiver(pre_save, sender=Article)
+def remember_article_category(sender, instance, **kwargs):
+    """记录文章保存前的分类，用于维护分类文章数量"""
+    if instance._state.adding:
+        instance._previous_category_id = None
+    else:
+        instance._previous_category_id = (
+            Article.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Article)
+def update_category_count_on_save(sender, instance, created, **kwargs):
+    """文章新建或更换分类后更新分类文章数量"""
+    previous = getattr(instance, "_previous_category_id", None)
+    if created:
+        Category.objects.filter(pk=instance.category_id).update(article_count=F("article_count") + 1)
+    elif previous is not None and previous != instance.category_id:
+        Category.objects.filter(pk=previous, article_count__gt=0).update(
+            article_count=F("article_count") - 1
+        )
+        Category.objects.filter(pk=instance.category_id).update(article_count=F("article_count") + 1)
+
+
+@receiver(post_delete, sender=Article)
+def update_category_count_on_delete(sender, instance, **kwargs):
+    """文章删除后减少分类文章数量"""
+    Category.objects.filter(pk=instance.category_id, article_count__gt=0).update(
+        article_count=F("article_count") - 1
+    )
+
+
+@receiver(pre_delete, sender=Article)
+def remember_article_references(sender, instance, **kwargs):
+    """记录引用该文章的文章，相关记录会在删除文章时级联删除"""
+    instance._referenced_by = list(
+        RelatedArticle.objects.filter(related_id=instance.pk).values_list("article_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Article)
+def invalidate_article_cache(sender, instance, created, **kwargs):
+    """文章变更后使相关的接口缓存失效，文章数量变化时包括所在分类"""
+    from .cache import invalidate_article
+
+    previous = getattr(instance, "_previous_category_id", None)
+    if created:
+        category_ids = [instance.category_id]
+    elif previous is not None and previous != instance.category_id:
+        category_ids = [previous, instance.category_id]
+    else:
+        category_ids = []
+    invalidate_article(instance.pk, category_ids)
+
+
+@receiver(post_delete, sender=Article)
+def invalidate_deleted_article_cache(sender, instance, **kwargs):
+    """文章删除后使相关的接口缓存失效"""
+    from .cache import invalidate_article
+
+    invalidate_article(
+        instance.pk, [instance.category_id], referenced_by=getattr(instance, "_referenced_by", None)
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """分类变更后使相关的接口缓存失效"""
+    from .cache import invalidate_category
+
+    invalidate_category(instance.pk)
@@ -0,0 +1,168 @@
+"""
+相关文章推荐
+对标题、摘要和去除 HTML 标签后的正文构建 TF-IDF 向量（稀疏矩阵，行向量 L2 归一化），
+按块计算余弦相似度并取每篇文章的前 k 个近邻写入 RelatedArticle 表。
+依赖 NumPy 和 SciPy，仅在离线构建任务中导入。
+"""
+
+import math
+from collections import Counter
+
+from django.db import transaction
+
+from .search import CJK_RE, TERM_RE, strip_html
+
+# 标题在文档中重复的次数，用于提高标题词的权重
+TITLE_BOOST = 3
+
+
+def terms(text):
+    """把文本切分为词项：中文为二字词，其余为小写单词"""
+    result = []
+    for term in TERM_RE.findall(text or ""):
+        if CJK_RE.fullmatch(term):
+            if len(term) == 1:
+                result.append(term)
+            else:
+                result.extend(term[i:i + 2] for i in range(len(term) - 1))
+        else:
+            result.append(term.lower())
+    return result
+
+
+def document_terms(article):
+    return (
+        terms(article.title) * TITLE_BOOST
+        + terms(article.description)
+        + terms(strip_html(article.content))
+    )
+
+
+def build_matrix(documents):
+    """
+    构建 TF-IDF 稀疏矩阵
+    documents 为每篇文章的词项列表，返回行归一化的 CSR 矩阵
+    词频取 1 + log(tf)，逆文档频率取平滑的 log((1 + N) / (1 + df)) + 1
+    """
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary = {}
+    indptr, indices, values = [0], [], []
+    for words in documents:
+        for word, count in Counter(words).items():
+            indices.append(vocabulary.setdefault(word, len(vocabulary)))
+            values.append(1.0 + math.log(count))
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), np.asarray(indices), np.asarray(indptr)),
+        shape=(len(documents), max(len(vocabulary), 1)),
+    )
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + matrix.shape[0]) / (1.0 + df)) + 1.0
+    matrix = matrix @ sparse.diags(idf.astype(np.float32))
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def nearest(rows, matrix, k, exclude=None, block_size=256):
+    """
+    分块计算 rows 与 matrix 各行的余弦相似度，返回每行的前 k 个 (列号, 相似度)
+    exclude[i] 为第 i 行需要排除的列号（通常是文章自身）
+    """
+    import numpy as np
+
+    results = []
+    for start in range(0, rows.shape[0], block_size):
+        block = (rows[start:start + block_size] @ matrix.T).toarray()
+        if exclude is not None:
+            for offset, column in enumerate(exclude[start:start + block_size]):
+                if column is not None:
+                    block[offset, column] = 0.0
+        width = min(k, block.shape[1])
+        if width == 0:
+            results.extend([] for _ in range(block.shape[0]))
+            continue
+        top = np.argpartition(-block, width - 1, axis=1)[:, :width]
+        for offset, columns in enumerate(top):
+            scores = block[offset, columns]
+            order = np.argsort(-scores)
+            results.append(
+                [(int(columns[i]), float(scores[i])) for i in order if scores[i] > 0]
+            )
+    return results
+
+
+def build_related(k=5, block_size=256, full=False):
+    """
+    计算相关文章并写入 RelatedArticle 表，返回相关文章发生变化的文章 ID 列表
+    full 为 False 时只为尚无相关文章记录的新文章计算近邻，同时检查新文章是否进入旧文章的前 k 名；
+    IDF 按当前全部文章重新计算，但旧文章之间的相似度不会重算，需要定期执行全量构建
+    """
+    from .models import Article, RelatedArticle
+
+    ids, documents = [], []
+    articles = Article.objects.only("id", "title", "description", "content").order_by("pk")
+    for article in articles.iterator(chunk_size=500):
+        ids.append(article.pk)
+        documents.append(document_terms(article))
+    if not ids:
+        return []
+    position = {pk: i for i, pk in enumerate(ids)}
+    matrix = build_matrix(documents)
+    del documents
+
+    if full:
+        targets = ids
+    else:
+        done = set(RelatedArticle.objects.values_list("article_id", flat=True).distinct())
+        targets = [pk for pk in ids if pk not in done]
+    if not targets:
+        return []
+
+    rows = matrix[[position[pk] for pk in targets]]
+    neighbours = {
+        pk: [(ids[column], score) for column, score in found]
+        for pk, found in zip(
+            targets,
+            nearest(rows, matrix, k, exclude=[position[pk] for pk in targets], block_size=block_size),
+        )
+    }
+
+    if not full:
+        # 新文章可能成为旧文章的近邻：用新文章列与旧文章的现有前 k 名合并
+        target_set = set(targets)
+        old = [pk for pk in ids if pk not in target_set]
+        if old:
+            existing = {}
+            for article_id, related_id, score in RelatedArticle.objects.filter(
+                article_id__in=old
+            ).values_list("article_id", "related_id", "score"):
+                existing.setdefault(article_id, []).append((related_id, score))
+            candidates = nearest(
+                matrix[[position[pk] for pk in old]], rows, k, block_size=block_size
+            )
+            for pk, found in zip(old, candidates):
+                if not found:
+                    continue
+                current = existing.get(pk, [])
+                floor = min((score for _, score in current), default=0.0) if len(current) >= k else 0.0
+                if any(score > floor for _, score in found):
+                    merged = dict(current)
+                    merged.update((targets[column], score) for column, score in found)
+                    neighbours[pk] = sorted(merged.items(), key=lambda item: -item[1])[:k]
+
+    with transaction.atomic():
+        RelatedArticle.objects.filter(article_id__in=neighbours).delete()
+        RelatedArticle.objects.bulk_create(
+            [
+                RelatedArticle(article_id=pk, related_id=related_id, score=score, rank=rank)
+                for pk, found in neighbours.items()
+                for rank, (related_id, score) in enumerate(found)
+            ],
+            batch_size=1000,
+        )
+    return list(neighbours)
@@ -0,0 +1,209 @@
+"""
+文章全文检索
+基于 SQLite FTS5 虚拟表 article_fts（rowid 即文章 ID），索引标题、摘要和去除 HTML 标签后的正文。
+FTS5 内置分词器不能切分中文，这里在写入和查询前把连续的中文切成二字词（bigram），
+查询时把中文片段转成短语查询，从而保证匹配的连续性。写入时另外索引每个单字，
+单字查询匹配单字词，中文片段末尾的字也能被检索到。
+"""
+
+import base64
+import html
+import json
+import math
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape, strip_tags
+
+from yanglao.pagination import InvalidCursor
+
+FTS_TABLE = "article_fts"
+# 标题、摘要、正文在 bm25 排序中的权重
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+CJK_RE = re.compile(f"[{CJK}]+")
+TERM_RE = re.compile(f"[{CJK}]+|[^\\W{CJK}]+")
+
+
+def fts_available():
+    """当前数据库是否支持全文检索"""
+    return connection.vendor == "sqlite"
+
+
+def strip_html(content):
+    """去除富文本中的 HTML 标签和实体"""
+    return re.sub(r"\s+", " ", html.unescape(strip_tags(content or ""))).strip()
+
+
+def bigrams(run):
+    if len(run) == 1:
+        return run
+    return " ".join(run[i:i + 2] for i in range(len(run) - 1))
+
+
+def tokenize(text):
+    """把文本中的连续中文切分成以空格分隔的二字词，其余文本保持不变"""
+    return CJK_RE.sub(lambda m: f" {bigrams(m.group())} ", text or "")
+
+
+def index_terms(run):
+    """写入索引的中文词：二字词之后附加各个单字，单字不会与二字词组成短语"""
+    if len(run) == 1:
+        return run
+    return f"{bigrams(run)} {' '.join(run)}"
+
+
+def tokenize_for_index(text):
+    """写入索引前的分词，在 tokenize 的基础上附加单字"""
+    return CJK_RE.sub(lambda m: f" {index_terms(m.group())} ", text or "")
+
+
+def build_match(query):
+    """
+    把用户输入转换为 FTS5 MATCH 表达式
+    中文片段转为二字词短语，中文单字匹配单字词，其他词使用前缀匹配，各片段之间为 AND 关系
+    """
+    parts = []
+    for term in TERM_RE.findall(query or ""):
+        quoted = '"' + tokenize(term).strip().replace('"', '""') + '"'
+        if CJK_RE.fullmatch(term):
+            parts.append(quoted)
+        else:
+            parts.append(quoted + "*")
+    return " AND ".join(parts)
+
+
+def create_index(schema_editor=None):
+    cursor_owner = schema_editor.connection if schema_editor else connection
+    with cursor_owner.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(title, description, body, tokenize='unicode61')"
+        )
+
+
+def index_articles(articles):
+    """写入或更新文章的全文索引"""
+    if not fts_available():
+        return
+    rows = [
+        (
+            article.pk,
+            tokenize_for_index(article.title),
+            tokenize_for_index(article.description),
+            tokenize_for_index(strip_html(article.content)),
+        )
+        for article in articles
+    ]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, body) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def remove_article(article_id):
+    """从全文索引中删除文章"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [article_id])
+
+
+def clear_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+
+def search(query, category_name=None, limit=20, after=None):
+    """
+    全文检索文章
+    返回按相关度（bm25，越小越相关）排序的 [(文章 ID, 相关度)]，
+    after 为上一页最后一条的 (相关度, 文章 ID)，按 (相关度, ID) 做 keyset 翻页
+    """
+    match = build_match(query)
+    if not match:
+        return []
+    sql = (
+        f"SELECT f.rowid, bm25({FTS_TABLE}, %s, %s, %s) AS score FROM {FTS_TABLE} f "
+        "JOIN article_article a ON a.id = f.rowid "
+        "JOIN article_category c ON c.id = a.category_id "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [*FTS_WEIGHTS, match]
+    if category_name:
+        sql += " AND c.name = %s"
+        params.append(category_name)
+    sql = f"SELECT rowid, score FROM ({sql})"
+    if after:
+        sql += " WHERE score > %s OR (score = %s AND rowid > %s)"
+        params.extend([after[0], after[0], after[1]])
+    sql += " ORDER BY score, rowid LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def encode_cursor(row):
+    """把 (文章 ID, 相关度) 编码为翻页游标"""
+    article_id, score = row
+    raw = json.dumps([score, article_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """解析翻页游标，返回 (相关度, 文章 ID)"""
+    try:
+        score, article_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        score = float(score)
+        if not math.isfinite(score) or not isinstance(article_id, int):
+            raise ValueError
+        return score, article_id
+    except Exception:
+        raise InvalidCursor("无效的分页游标")
+
+
+def filter_matches(queryset, query):
+    """把查询限定为全文检索命中的文章，命中集合以子查询形式并入同一条 SQL"""
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    )
+
+
+def snippet(article, query, width=40):
+    """
+    生成带高亮的摘要片段
+    在去除标签的正文（正文无匹配时使用摘要）中找到第一个命中的关键词，截取前后若干字符，
+    命中的关键词用 <mark> 包裹，其余内容经过转义
+    """
+    terms = sorted({term for term in TERM_RE.findall(query or "")}, key=len, reverse=True)
+    if not terms:
+        return ""
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+
+    for text in (strip_html(article.content), article.description or ""):
+        first = pattern.search(text)
+        if first is None:
+            continue
+        start = max(first.start() - width, 0)
+        end = min(first.end() + width, len(text))
+        window = text[start:end]
+        pieces, last = [], 0
+        for m in pattern.finditer(window):
+            pieces.append(escape(window[last:m.start()]))
+            pieces.append(f"<mark>{escape(m.group())}</mark>")
+            last = m.end()
+        pieces.append(escape(window[last:]))
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        return prefix + "".join(pieces) + suffix
+    return escape((article.description or "")[: width * 2])
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from yanglao.images import srcset
 from .models import Article, Category
 
 
@@ -11,15 +12,37 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ArticleListSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField()
+    is_liked = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Article
-        fields = ["id", "title", "description", "category", "cover", "views", "likes_count", "created_at"]
-        read_only_fields = ["views", "likes_count"]
+        fields = ["id", "title", "description", "category", "cover", "cover_srcset", "views", "likes_count", "unique_readers", "is_liked", "snippet", "created_at"]
+        read_only_fields = ["views", "likes_count", "unique_readers"]
+
+    def get_is_liked(self, obj):
+        # 列表响应会被缓存，点赞状态由视图按当前用户批量查询后覆盖
+        return obj.pk in self.context.get("liked_ids", ())
+
+    def get_cover_srcset(self, obj):
+        return srcset(obj.cover)
+
+    def get_snippet(self, obj):
+        # 全文检索时返回带 <mark> 高亮的命中片段
+        return self.context.get("snippets", {}).get(obj.pk)
+
+
+class RelatedArticleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Article
+        fields = ["id", "title", "cover"]
 
 
 class ArticleDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    related = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source="category", write_only=True
     )
@@ -33,8 +56,23 @@ class ArticleDetailSerializer(serializers.ModelSerializer):
             "category",
             "category_id",
             "cover",
+            "cover_srcset",
             "views",
             "likes_count",
+            "unique_readers",
+            "related",
             "created_at",
         ]
-        read_only_fields = ["views", "likes_count", "category"]
+        read_only_fields = ["views", "likes_count", "unique_readers", "category"]
+
+    def get_cover_srcset(self, obj):
+        return srcset(obj.cover)
+
+    def get_related(self, obj):
+        # 相关文章由离线任务预先计算，这里只按 (article, rank) 索引读取
+        entries = (
+            obj.related_entries.select_related("related")
+            .only("related__id", "related__title", "related__cover", "article_id", "rank")
+            .order_by("rank")
+        )
+        return RelatedArticleSerializer([entry.related for entry in entries], many=True).data
@@ -0,0 +1,724 @@
+import base64
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import AccessToken
+
+from yanglao.images import content_hash, derivative_path, render_derivative
+
+from . import cache as article_cache
+from .cache import (
+    CATEGORY_VERSION_KEY,
+    LIST_VERSION_KEY,
+    article_version_key,
+    cached_response,
+    make_key,
+)
+from .counters import ViewCounterBuffer, reader_key, view_counter
+from .hot import current_score, hot_articles
+from .models import Article, ArticleReaderSketch, ArticleReaderTotal, Category, RelatedArticle
+from .related import build_related
+from .search import filter_matches, fts_available
+
+
+class ArticleTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="健康")
+        self.article = Article.objects.create(title="文章", content="内容", category=self.category)
+
+    def tearDown(self):
+        # 保存文章会标记全局缓冲中的热度，在测试数据库中写回，避免影响其他测试
+        view_counter.flush()
+
+
+class ViewCounterBufferTests(ArticleTestCase):
+    """阅读量写缓冲与独立读者草图"""
+
+    def add_readers(self, buffer, day, readers):
+        with mock.patch("article.counters.timezone.localdate", return_value=day):
+            for reader in readers:
+                buffer.add_reader(self.article.pk, reader)
+
+    def article_updates(self, queries):
+        return [
+            query["sql"] for query in queries
+            if query["sql"].startswith("UPDATE") and '"views"' in query["sql"]
+        ]
+
+    def test_flush_batches_equal_increments(self):
+        others = [Article.objects.create(title=f"文章{i}", content="内容", category=self.category) for i in range(2)]
+        buffer = ViewCounterBuffer()
+        buffer.incr(self.article.pk, 2)
+        buffer.incr(others[0].pk)
+        buffer.incr(others[0].pk)
+        buffer.incr(others[1].pk, 5)
+        self.assertEqual(buffer.pending(others[0].pk), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 9)
+        # 增量为 2 的两篇文章合并为一条 UPDATE
+        self.assertEqual(len(self.article_updates(queries)), 2)
+        self.assertEqual(
+            dict(Article.objects.filter(pk__in=[self.article.pk, *[a.pk for a in others]]).values_list("pk", "views")),
+            {self.article.pk: 2, others[0].pk: 2, others[1].pk: 5},
+        )
+        self.assertEqual(buffer.pending(self.article.pk), 0)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_requeues_increments(self):
+        buffer = ViewCounterBuffer()
+        buffer.incr(self.article.pk, 3)
+        with mock.patch("article.counters.add_score", side_effect=RuntimeError("database is locked")):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+        self.assertEqual(buffer.pending(self.article.pk), 3)
+
+        buffer.incr(self.article.pk)
+        self.assertEqual(buffer.flush(), 4)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 4)
+
+    def test_shutdown_stops_flusher_and_flushes(self):
+        buffer = ViewCounterBuffer(interval=3600)
+        buffer.start()
+        flusher = buffer._flusher
+        self.assertTrue(flusher.is_alive())
+        buffer.start()
+        self.assertIs(buffer._flusher, flusher)
+
+        buffer.incr(self.article.pk, 2)
+        buffer.shutdown()
+        self.assertFalse(flusher.is_alive())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 2)
+
+    def test_saving_articles_does_not_start_flusher(self):
+        Article.objects.create(title="新文章", content="内容", category=self.category)
+        self.assertIsNone(view_counter._flusher)
+
+    def test_views_are_written_when_reader_merge_fails(self):
+        buffer = ViewCounterBuffer()
+        buffer.incr(self.article.pk, 3)
+        with mock.patch.object(buffer, "flush_readers", side_effect=RuntimeError("sketch")):
+            with self.assertLogs("article.counters", "ERROR"):
+                self.assertEqual(buffer.flush(), 3)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 3)
+
+    def test_reader_total_is_merged_incrementally(self):
+        buffer = ViewCounterBuffer()
+        self.add_readers(buffer, date(2025, 1, 1), ["user:1", "user:2"])
+        buffer.flush()
+        self.add_readers(buffer, date(2025, 1, 2), ["user:2", "user:3"])
+        # 只读取当天的草图和累计草图，不再合并各天的草图
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+        sketch_reads = [
+            query["sql"] for query in queries
+            if query["sql"].startswith("SELECT") and "article_articlereadersketch" in query["sql"]
+        ]
+        self.assertTrue(sketch_reads)
+        for sql in sketch_reads:
+            self.assertIn('"day" IN', sql)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.unique_readers, 3)
+        self.assertEqual(ArticleReaderSketch.objects.filter(article=self.article).count(), 2)
+        self.assertEqual(ArticleReaderTotal.objects.filter(article=self.article).count(), 1)
+
+
+@override_settings(ARTICLE_HOT_HALF_LIFE_HOURS=1)
+class HotScoreTests(ArticleTestCase):
+    """热度分在对数空间累加，半衰期很短、时间很久之后也不会溢出"""
+
+    def at(self, moment):
+        return mock.patch("article.hot.timezone.now", return_value=moment)
+
+    def test_far_future_scores_do_not_overflow(self):
+        user = User.objects.create_user(username="reader", password="password")
+        other = Article.objects.create(title="新文章", content="内容", category=self.category)
+        now = datetime(2125, 1, 1, tzinfo=dt_timezone.utc)
+        buffer = ViewCounterBuffer()
+
+        with self.at(now):
+            buffer.incr(self.article.pk, 8)
+            buffer.flush()
+        # 十个半衰期后，一次阅读的热度超过之前的八次
+        with self.at(now + timedelta(hours=10)):
+            buffer.incr(other.pk, 1)
+            buffer.flush()
+            self.assertEqual([article.pk for article in hot_articles(limit=2)], [other.pk, self.article.pk])
+
+            self.assertTrue(self.article.like(user))
+            self.article.refresh_from_db()
+            self.assertAlmostEqual(current_score(self.article.hot_score), 8 / 1024 + 5)
+            self.assertTrue(self.article.unlike(user))
+            self.article.refresh_from_db()
+            self.assertAlmostEqual(current_score(self.article.hot_score), 8 / 1024)
+
+
+class ArticleLikeTests(ArticleTestCase):
+    """点赞与取消点赞只在点赞关系真正变化时修改计数，reconcile_likes 修复计数偏差"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.client.force_login(self.user)
+        self.url = f"/api/article/articles/{self.article.pk}/like"
+
+    def likes_count(self):
+        return Article.objects.values_list("likes_count", flat=True).get(pk=self.article.pk)
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command("reconcile_likes", *args, stdout=out)
+        return out.getvalue()
+
+    def test_duplicate_like_is_counted_once(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["likes_count"], 1)
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.likes_count(), 1)
+        self.assertEqual(self.article.liked_users.count(), 1)
+
+    def test_unlike(self):
+        self.client.post(self.url)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["likes_count"], 0)
+        self.assertFalse(self.article.liked_users.exists())
+
+    def test_unlike_without_like_does_not_change_count(self):
+        Article.objects.filter(pk=self.article.pk).update(likes_count=3)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.likes_count(), 3)
+
+    def test_reconcile_reports_drift_in_dry_run(self):
+        self.article.like(self.user)
+        Article.objects.filter(pk=self.article.pk).update(likes_count=5)
+
+        output = self.reconcile("--dry-run")
+        self.assertIn(f"文章 {self.article.pk}: 点赞数 5，将修正为 1", output)
+        self.assertNotIn("点赞数修正为", output)
+        self.assertIn("发现 1 篇点赞数偏差", output)
+        self.assertEqual(self.likes_count(), 5)
+
+    def test_reconcile_fixes_drift(self):
+        self.article.like(self.user)
+        other = Article.objects.create(title="新文章", content="内容", category=self.category, likes_count=2)
+        Article.objects.filter(pk=self.article.pk).update(likes_count=5)
+
+        output = self.reconcile("--batch-size", "1")
+        self.assertIn(f"文章 {self.article.pk}: 点赞数修正为 1", output)
+        self.assertIn(f"文章 {other.pk}: 点赞数修正为 0", output)
+        self.assertIn("共检查 2 篇文章，修复 2 篇点赞数偏差", output)
+        self.assertEqual(self.likes_count(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.likes_count, 0)
+        self.assertIn("修复 0 篇", self.reconcile())
+
+
+class ArticleListTests(ArticleTestCase):
+    """文章列表：点赞状态按当前用户批量查询"""
+
+    url = "/api/article/articles"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username="reader", password="password")
+        self.other = Article.objects.create(title="另一篇", content="内容", category=self.category)
+        self.article.like(self.user)
+
+    def fetch(self, user=None, **params):
+        headers = {"authorization": f"Bearer {AccessToken.for_user(user)}"} if user else {}
+        response = self.client.get(self.url, params, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def liked(self, body):
+        return {row["id"]: row["is_liked"] for row in body["data"]}
+
+    def test_is_liked_follows_the_current_user(self):
+        expected = {self.article.pk: True, self.other.pk: False}
+        self.assertEqual(self.liked(self.fetch(self.user)), expected)
+        # 匿名用户与其他用户读取同一份缓存列表，不会看到该用户的点赞状态
+        self.assertEqual(self.liked(self.fetch()), {self.article.pk: False, self.other.pk: False})
+        stranger = User.objects.create_user(username="stranger", password="password")
+        self.assertEqual(self.liked(self.fetch(stranger)), {self.article.pk: False, self.other.pk: False})
+        self.assertEqual(self.liked(self.fetch(self.user)), expected)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # 认证用户、文章列表、点赞关系各一条查询
+        with self.assertNumQueries(3):
+            self.fetch(self.user)
+
+        for i in range(10):
+            article = Article.objects.create(title=f"文章{i}", content="内容", category=self.category)
+            article.like(self.user)
+        cache.clear()
+        with self.assertNumQueries(3):
+            body = self.fetch(self.user)
+        self.assertEqual(len(body["data"]), 12)
+        self.assertEqual(sum(self.liked(body).values()), 11)
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.fetch()
+
+
+class ArticlePaginationTests(ArticleTestCase):
+    """文章列表按 (created_at, id) 游标翻页，可与分类筛选、搜索组合"""
+
+    url = "/api/article/articles"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.other_category = Category.objects.create(name="饮食")
+        base = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        for i in range(6):
+            for category in (self.category, self.other_category):
+                article = Article.objects.create(title=f"居家养老{i}", content="内容", category=category)
+                Article.objects.filter(pk=article.pk).update(created_at=base + timedelta(hours=i))
+        Article.objects.filter(pk=self.article.pk).update(created_at=base - timedelta(days=1))
+
+    def walk(self, **params):
+        """沿 next_cursor 取完所有页，返回按顺序排列的文章 ID 与页数"""
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = {**params, "page_size": 4}
+            if cursor:
+                query["cursor"] = cursor
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(item["id"] for item in response.data["data"])
+            pages += 1
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                return ids, pages
+
+    def expected(self, queryset):
+        return list(queryset.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def test_category_pages(self):
+        ids, pages = self.walk(category="健康")
+        self.assertEqual(ids, self.expected(Article.objects.filter(category=self.category)))
+        self.assertEqual(pages, 2)
+
+    def test_search_pages_within_category(self):
+        ids, pages = self.walk(category="饮食", search="养老")
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(pages, 2)
+        self.assertEqual(
+            set(ids), set(Article.objects.filter(category=self.other_category).values_list("pk", flat=True))
+        )
+
+    def test_tied_created_at_keeps_a_stable_order(self):
+        moment = datetime(2025, 6, 1, 8, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        Article.objects.update(created_at=moment)
+        ids, pages = self.walk()
+        # 同一时刻的文章按 ID 倒序排列，翻页既不重复也不遗漏
+        self.assertEqual(ids, sorted(Article.objects.values_list("pk", flat=True), reverse=True))
+        self.assertEqual(pages, 4)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.client.get(self.url, {"page_size": 4}).data["next_cursor"]
+        tampered = [
+            cursor[:-4],
+            "!" + cursor[1:],
+            base64.urlsafe_b64encode(b'["not a date", 1]').decode("ascii"),
+            base64.urlsafe_b64encode(b'["2025-01-01T00:00:00+00:00"]').decode("ascii"),
+            base64.urlsafe_b64encode(b'{"id": 1}').decode("ascii"),
+        ]
+        for value in tampered:
+            with self.subTest(cursor=value):
+                response = self.client.get(self.url, {"page_size": 4, "cursor": value})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["message"], "无效的分页游标")
+
+
+class CategoryCountTests(ArticleTestCase):
+    """分类文章数量随文章新建、删除、更换分类同步，verify_category_counts 报告并修复偏差"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(name="饮食")
+
+    def counts(self):
+        return dict(Category.objects.values_list("name", "article_count"))
+
+    def verify(self, *args):
+        out = StringIO()
+        call_command("verify_category_counts", *args, stdout=out)
+        return out.getvalue()
+
+    def test_count_follows_create_delete_and_category_change(self):
+        self.assertEqual(self.counts(), {"健康": 1, "饮食": 0})
+        article = Article.objects.create(title="新文章", content="内容", category=self.category)
+        self.assertEqual(self.counts(), {"健康": 2, "饮食": 0})
+
+        article.category = self.other_category
+        article.save()
+        self.assertEqual(self.counts(), {"健康": 1, "饮食": 1})
+        # 不涉及分类的保存不改变数量
+        article.title = "改名"
+        article.save()
+        self.assertEqual(self.counts(), {"健康": 1, "饮食": 1})
+
+        article.delete()
+        self.assertEqual(self.counts(), {"健康": 1, "饮食": 0})
+        self.article.delete()
+        self.assertEqual(self.counts(), {"健康": 0, "饮食": 0})
+
+    def test_verify_reports_and_fixes_drift(self):
+        self.assertIn("所有分类的文章数量一致", self.verify())
+
+        Category.objects.filter(pk=self.category.pk).update(article_count=4)
+        Category.objects.filter(pk=self.other_category.pk).update(article_count=2)
+        output = self.verify()
+        self.assertIn(f"分类 健康({self.category.pk}): 记录 4，实际 1", output)
+        self.assertIn(f"分类 饮食({self.other_category.pk}): 记录 2，实际 0", output)
+        self.assertIn("发现 2 个分类的文章数量不一致", output)
+        self.assertEqual(self.counts(), {"健康": 4, "饮食": 2})
+
+        self.assertIn("已修复 2 个分类的文章数量", self.verify("--fix"))
+        self.assertEqual(self.counts(), {"健康": 1, "饮食": 0})
+        self.assertIn("所有分类的文章数量一致", self.verify())
+
+
+class RelatedArticleTests(ArticleTestCase):
+    """相关文章按 TF-IDF 相似度计算，增量模式只处理新文章及近邻发生变化的旧文章"""
+
+    def setUp(self):
+        super().setUp()
+        Article.objects.filter(pk=self.article.pk).update(title="健康饮食", content="少油少盐")
+        self.diet = self.create("高血压饮食指南", "高血压患者饮食要清淡")
+        self.medicine = self.create("高血压用药注意", "高血压患者按时服药")
+        self.taichi = self.create("太极拳入门", "太极拳动作舒缓")
+        self.exercise = self.create("太极拳与健身", "每天练习太极拳")
+
+    def create(self, title, content):
+        return Article.objects.create(title=title, content=content, category=self.category)
+
+    def related(self, article):
+        return list(
+            RelatedArticle.objects.filter(article=article).order_by("rank").values_list("related_id", flat=True)
+        )
+
+    def test_full_build(self):
+        out = StringIO()
+        call_command("build_related_articles", "--full", "--top-k", "2", stdout=out)
+        self.assertIn("更新了 5 篇文章", out.getvalue())
+
+        self.assertEqual(self.related(self.taichi), [self.exercise.pk])
+        self.assertEqual(self.related(self.exercise), [self.taichi.pk])
+        self.assertEqual(self.related(self.medicine)[0], self.diet.pk)
+        self.assertEqual(set(self.related(self.diet)), {self.medicine.pk, self.article.pk})
+        self.assertFalse(RelatedArticle.objects.filter(article_id=F("related_id")).exists())
+
+    def test_incremental_build_only_touches_changed_articles(self):
+        self.assertEqual(len(build_related(k=2, full=True)), 5)
+        untouched = set(
+            RelatedArticle.objects.filter(article__in=[self.taichi, self.exercise]).values_list("pk", flat=True)
+        )
+
+        added = self.create("高血压饮食禁忌", "高血压患者饮食少盐")
+        changed = build_related(k=2)
+        self.assertIn(added.pk, changed)
+        self.assertIn(self.diet.pk, changed)
+        self.assertNotIn(self.taichi.pk, changed)
+        self.assertNotIn(self.exercise.pk, changed)
+
+        self.assertEqual(self.related(added)[0], self.diet.pk)
+        self.assertEqual(self.related(self.diet)[0], added.pk)
+        # 无关的旧文章的记录没有被删除重建
+        self.assertEqual(
+            set(RelatedArticle.objects.filter(article__in=[self.taichi, self.exercise]).values_list("pk", flat=True)),
+            untouched,
+        )
+        self.assertEqual(build_related(k=2), [])
+
+
+class ReaderKeyTests(TestCase):
+    """匿名读者标识不信任客户端提供的 X-Forwarded-For"""
+
+    def key(self, **meta):
+        request = RequestFactory().get("/", HTTP_USER_AGENT="browser", **meta)
+        return reader_key(request)
+
+    def test_forwarded_for_is_ignored_by_default(self):
+        self.assertEqual(
+            self.key(REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4"),
+            self.key(REMOTE_ADDR="10.0.0.1"),
+        )
+
+    @override_settings(ARTICLE_TRUSTED_PROXY_COUNT=1)
+    def test_trusted_proxy_address(self):
+        self.assertEqual(
+            self.key(REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4"),
+            self.key(REMOTE_ADDR="1.2.3.4"),
+        )
+
+
+@skipUnless(fts_available(), "全文检索依赖 SQLite FTS5")
+class ArticleSearchTests(ArticleTestCase):
+    """全文检索结果按 (相关度, ID) 游标翻页"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.matches = [
+            Article.objects.create(title=f"养老服务指南{i}", content="居家养老" * (i + 1), category=self.category).pk
+            for i in range(5)
+        ]
+        Article.objects.create(title="健康饮食", content="少油少盐", category=self.category)
+
+    def test_search_results_are_paged(self):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {"search": "养老", "page_size": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/api/article/articles", params)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(item["id"] for item in response.data["data"])
+            pages += 1
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(ids), sorted(self.matches))
+        self.assertEqual(len(ids), len(set(ids)))
+
+        response = self.client.get("/api/article/articles", {"search": "养老", "cursor": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_character_matches_end_of_cjk_run(self):
+        health = Article.objects.create(title="保持健康", content="多喝水", category=self.category)
+        for query in ("康", "健", "水"):
+            response = self.client.get("/api/article/articles", {"search": query})
+            self.assertEqual(response.status_code, 200, response.data)
+            ids = [item["id"] for item in response.data["data"]]
+            with self.subTest(query=query):
+                self.assertIn(health.pk, ids)
+        # 单字不会与二字词组成短语，多字查询仍要求连续出现
+        self.assertEqual(list(filter_matches(Article.objects.all(), "康多").values_list("pk", flat=True)), [])
+        self.assertEqual(list(filter_matches(Article.objects.all(), "持健康").values_list("pk", flat=True)), [health.pk])
+
+    def test_admin_search_is_not_truncated(self):
+        self.assertEqual(
+            sorted(filter_matches(Article.objects.all(), "养老").values_list("pk", flat=True)), sorted(self.matches)
+        )
+
+
+class ImageDerivativeTests(ArticleTestCase):
+    """封面衍生图的生成命令与访问接口"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        super().setUp()
+        self.article.cover.save("cover.png", ContentFile(self.image_bytes((400, 200))))
+
+    def image_bytes(self, size, mode="RGBA"):
+        output = BytesIO()
+        Image.new(mode, size, (200, 100, 50, 128) if mode == "RGBA" else (200, 100, 50)).save(output, "PNG")
+        return output.getvalue()
+
+    def url(self, size="thumbnail", fmt="webp", name=None):
+        return f"/api/images/{size}/{fmt}/{name or self.article.cover.name}"
+
+    def test_render_derivative(self):
+        source = self.article.cover.path
+        target = os.path.join(self.media_root, "out", "thumbnail.jpeg")
+        render_derivative(source, target, 160, "JPEG")
+        with Image.open(target) as image:
+            self.assertEqual((image.format, image.mode, image.size), ("JPEG", "RGB", (160, 80)))
+
+        # 不放大小图
+        render_derivative(source, target, 1080, "WEBP")
+        with Image.open(target) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (400, 200)))
+
+    def test_render_rejects_decompression_bomb(self):
+        target = os.path.join(self.media_root, "out", "bomb.webp")
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 100):
+            with self.assertRaises(Image.DecompressionBombError):
+                render_derivative(self.article.cover.path, target, 160, "WEBP")
+        self.assertFalse(os.path.exists(target))
+
+    def test_view_rejects_unknown_names_and_formats(self):
+        self.assertEqual(self.client.get(self.url(size="huge")).status_code, 404)
+        self.assertEqual(self.client.get(self.url(fmt="gif")).status_code, 404)
+        self.assertEqual(self.client.get(self.url(name="article/covers/missing.png")).status_code, 404)
+        self.assertEqual(self.client.get(self.url(name="article/covers/../../db.sqlite3")).status_code, 404)
+        self.assertEqual(self.client.get(self.url(name="derivatives/ab/abc-thumbnail.webp")).status_code, 404)
+        self.assertEqual(self.client.get(self.url(name="exports/report.csv")).status_code, 404)
+
+    def test_view_redirects_until_generated(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], self.article.cover.url)
+
+        # 衍生图由命令生成，无法解析的图片被跳过
+        broken = Article.objects.create(title="坏图", content="内容", category=self.category)
+        broken.cover.save("broken.png", ContentFile(b"not an image"))
+        out, err = StringIO(), StringIO()
+        call_command("generate_image_derivatives", workers=1, stdout=out, stderr=err)
+        self.assertIn("成功 6 张，失败 6 张", out.getvalue())
+        self.assertIn(broken.cover.path, err.getvalue())
+
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        response.close()
+        self.assertTrue(os.path.exists(derivative_path(content_hash(self.article.cover.name), "large", "jpeg")))
+
+
+class ArticleCacheInvalidationTests(ArticleTestCase):
+    """文章变更只使受影响的详情缓存失效"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.other = Article.objects.create(title="其他文章", content="内容", category=self.category)
+        self.elsewhere_category = Category.objects.create(name="饮食")
+        self.elsewhere = Article.objects.create(title="别处文章", content="内容", category=self.elsewhere_category)
+
+    def keys(self):
+        return {
+            "article": make_key("detail", {"pk": self.article.pk}, article_version_key(self.article.pk)),
+            "other": make_key("detail", {"pk": self.other.pk}, article_version_key(self.other.pk)),
+            "elsewhere": make_key("detail", {"pk": self.elsewhere.pk}, article_version_key(self.elsewhere.pk)),
+            "list": make_key("articles", {}, LIST_VERSION_KEY),
+            "categories": make_key("categories", {}, CATEGORY_VERSION_KEY),
+        }
+
+    def changed(self, action):
+        before = self.keys()
+        action()
+        after = self.keys()
+        return {name for name in before if before[name] != after[name]}
+
+    def test_edit_only_invalidates_the_article(self):
+        response = self.client.get(f"/api/article/articles/{self.other.pk}")
+        self.assertEqual(response.status_code, 200)
+
+        def edit():
+            self.article.title = "新标题"
+            self.article.save()
+
+        self.assertEqual(self.changed(edit), {"article", "list"})
+        # 其他文章的详情仍由缓存返回
+        with self.assertNumQueries(0):
+            self.client.get(f"/api/article/articles/{self.other.pk}")
+        response = self.client.get(f"/api/article/articles/{self.article.pk}")
+        self.assertEqual(response.data["data"]["title"], "新标题")
+
+    def test_edit_invalidates_articles_listing_it_as_related(self):
+        RelatedArticle.objects.create(article=self.other, related=self.article, score=0.5, rank=0)
+
+        def edit():
+            self.article.title = "新标题"
+            self.article.save()
+
+        self.assertEqual(self.changed(edit), {"article", "other", "list"})
+        self.assertEqual(self.changed(self.article.delete), {"article", "other", "list", "categories"})
+
+    def test_article_count_changes_invalidate_the_category(self):
+        def create():
+            Article.objects.create(title="新文章", content="内容", category=self.category)
+
+        self.assertEqual(self.changed(create), {"article", "other", "list", "categories"})
+
+        def move():
+            self.article.category = self.elsewhere_category
+            self.article.save()
+
+        self.assertEqual(self.changed(move), {"article", "other", "elsewhere", "list", "categories"})
+
+        def rename():
+            self.elsewhere_category.name = "膳食"
+            self.elsewhere_category.save()
+
+        self.assertEqual(self.changed(rename), {"article", "elsewhere", "list", "categories"})
+
+
+class CachedResponseTests(TestCase):
+    """过期后仍返回旧数据并在后台重新计算（stale-while-revalidate），同一个键只由一个请求计算"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value="v1"):
+        def build():
+            self.calls.append(value)
+            return Response({"value": value})
+
+        return build
+
+    def test_fresh_entries_are_reused(self):
+        self.assertEqual(cached_response("k", self.compute()).data, {"value": "v1"})
+        self.assertEqual(cached_response("k", self.compute("v2")).data, {"value": "v1"})
+        self.assertEqual(self.calls, ["v1"])
+
+    def test_stale_entry_is_served_while_one_revalidation_runs(self):
+        cached_response("k", self.compute())
+        later = article_cache.time.time() + article_cache.fresh_seconds() + 1
+        with mock.patch("article.cache.time.time", return_value=later), \
+                mock.patch("article.cache._revalidate_in_background") as revalidate:
+            self.assertEqual(cached_response("k", self.compute("v2")).data, {"value": "v1"})
+            self.assertEqual(cached_response("k", self.compute("v3")).data, {"value": "v1"})
+        # 第二个请求看到重新计算的锁，不再启动后台计算
+        self.assertEqual(revalidate.call_count, 1)
+        key, compute, lock_key = revalidate.call_args.args
+        self.assertEqual(self.calls, ["v1"])
+
+        # 后台计算完成后写入新结果并释放锁
+        with mock.patch("article.cache.close_old_connections"), \
+                mock.patch("article.cache.threading.Thread") as thread:
+            article_cache._revalidate_in_background(key, compute, lock_key)
+            thread.call_args.kwargs["target"]()
+        self.assertEqual(cached_response("k", self.compute("v4")).data, {"value": "v2"})
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_concurrent_miss_waits_for_the_computing_request(self):
+        cache.add("k:lock", 1, timeout=30)
+
+        def other_request_finishes(_):
+            cache.set("k", {"data": {"value": "other"}, "fresh_until": article_cache.time.time() + 60})
+
+        with mock.patch("article.cache.time.sleep", side_effect=other_request_finishes):
+            self.assertEqual(cached_response("k", self.compute()).data, {"value": "other"})
+        self.assertEqual(self.calls, [])
+
+        # 等待超时后自行计算，不写入缓存也不释放别人的锁
+        cache.delete("k")
+        self.assertEqual(cached_response("k", self.compute("mine"), wait=0).data, {"value": "mine"})
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.get("k:lock"), 1)
@@ -3,6 +3,24 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .models import Article, Category
+from .counters import view_counter, reader_key
+from .authentication import OptionalJWTAuthentication
+from .search import (
+    decode_cursor as decode_search_cursor,
+    encode_cursor as encode_search_cursor,
+    fts_available,
+    search as search_articles,
+    snippet,
+)
+from .hot import hot_articles
+from .cache import (
+    CATEGORY_VERSION_KEY,
+    LIST_VERSION_KEY,
+    article_version_key,
+    cached_response,
+    make_key,
+)
+from yanglao.pagination import CursorPaginator, InvalidCursor
 from .serializers import (
     CategorySerializer,
     ArticleListSerializer,
@@ -18,60 +36,122 @@ class CategoryListView(APIView):
     def get(self, request):
         """获取所有文章分类"""
         try:
-            categories = Category.objects.all()
-            serializer = CategorySerializer(categories, many=True)
-            return Response(
-                {"code": 200, "message": "获取分类列表成功", "data": serializer.data}
-            )
+            key = make_key("categories", {}, CATEGORY_VERSION_KEY)
+            return cached_response(key, self.build_response)
         except Exception as e:
             return Response(
                 {"code": 500, "message": "服务器内部错误", "data": None},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    def build_response(self):
+        categories = Category.objects.all()
+        serializer = CategorySerializer(categories, many=True)
+        return Response(
+            {"code": 200, "message": "获取分类列表成功", "data": serializer.data}
+        )
+
 
 class ArticleListView(APIView):
     """文章列表视图"""
 
     permission_classes = []
-    authentication_classes = []
+    authentication_classes = [OptionalJWTAuthentication]
+    paginator = CursorPaginator(ordering=("-created_at", "-id"), page_size=20, max_page_size=50)
 
     def get(self, request):
-        """获取文章列表"""
+        """获取文章列表，使用 cursor 参数翻页"""
+        try:
+            params = {
+                "category": request.query_params.get("category"),
+                "is_hot": "1" if request.query_params.get("is_hot") else None,
+                "search": (request.query_params.get("search") or "").strip(),
+                "cursor": request.query_params.get("cursor"),
+                "page_size": self.paginator.get_page_size(request),
+            }
+            key = make_key("articles", params, LIST_VERSION_KEY)
+            response = cached_response(key, lambda: self.build_response(request))
+
+            # 缓存的列表对所有用户相同，点赞状态按当前用户单独批量查询
+            if response.status_code == 200 and request.user.is_authenticated:
+                rows = [dict(row) for row in response.data["data"]]
+                liked_ids = Article.liked_ids(request.user, [row["id"] for row in rows])
+                for row in rows:
+                    row["is_liked"] = row["id"] in liked_ids
+                response = Response({**response.data, "data": rows})
+            return response
+        except Exception as e:
+            return Response(
+                {"code": 500, "message": "服务器内部错误", "data": None},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def build_response(self, request):
         try:
             category_name = request.query_params.get("category")
             is_hot = request.query_params.get("is_hot")
             search_title = request.query_params.get("search")
-            articles = Article.objects.all()
-
-            # 取阅读量前5的文章
-            if is_hot:
-                articles = articles.order_by("-views")[:5]
+            articles = Article.objects.select_related("category")
 
             if category_name:
                 articles = articles.filter(category__name=category_name)
-                if not articles.exists():
+
+            snippets = {}
+            # 取热度前5的文章，热门列表不分页
+            if is_hot:
+                articles = hot_articles(category_name=category_name, limit=self.paginator.max_page_size)
+                if search_title:
+                    articles = [a for a in articles if search_title.lower() in a.title.lower()]
+                articles, next_cursor = articles[:5], None
+            # 全文检索按相关度排序，以 (相关度, ID) 为游标翻页
+            elif search_title and fts_available():
+                cursor = request.query_params.get("cursor")
+                size = self.paginator.get_page_size(request)
+                rows = search_articles(
+                    search_title,
+                    category_name=category_name,
+                    limit=size + 1,
+                    after=decode_search_cursor(cursor) if cursor else None,
+                )
+                next_cursor = encode_search_cursor(rows[size - 1]) if len(rows) > size else None
+                ids = [pk for pk, _ in rows[:size]]
+                found = articles.in_bulk(ids)
+                articles = [found[pk] for pk in ids if pk in found]
+                snippets = {article.pk: snippet(article, search_title) for article in articles}
+            else:
+                if search_title:
+                    articles = articles.filter(title__icontains=search_title)
+                articles, next_cursor = self.paginator.paginate(articles, request)
+
+            if not articles and not request.query_params.get("cursor"):
+                if category_name:
                     return Response(
                         {"code": 404, "message": "该分类下没有文章", "data": None},
                         status=status.HTTP_404_NOT_FOUND,
                     )
-
-            if search_title:
-                articles = articles.filter(title__icontains=search_title)
-                if not articles.exists():
+                if search_title:
                     return Response(
                         {"code": 404, "message": "没有找到相关文章", "data": None},
                         status=status.HTTP_404_NOT_FOUND,
                     )
 
-            serializer = ArticleListSerializer(articles, many=True)
+            serializer = ArticleListSerializer(
+                articles,
+                many=True,
+                context={"snippets": snippets},
+            )
             return Response(
-                {"code": 200, "message": "获取文章列表成功", "data": serializer.data}
+                {
+                    "code": 200,
+                    "message": "获取文章列表成功",
+                    "data": serializer.data,
+                    "next_cursor": next_cursor,
+                }
             )
-        except Exception as e:
+        except InvalidCursor as e:
             return Response(
-                {"code": 500, "message": "服务器内部错误", "data": None},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"code": 400, "message": str(e), "data": None},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
     def post(self, request):
@@ -99,26 +179,34 @@ class ArticleDetailView(APIView):
     """文章详情视图"""
 
     permission_classes = []
-    authentication_classes = []
+    authentication_classes = [OptionalJWTAuthentication]
     def get(self, request, pk):
         """获取文章详情"""
         try:
-            article = Article.objects.get(pk=pk)
-            article.increase_views()  # 增加阅读量
-            serializer = ArticleDetailSerializer(article)
+            key = make_key("detail", {"pk": pk}, article_version_key(pk))
+            response = cached_response(key, lambda: self.build_response(pk))
+            if response.status_code == 200:
+                view_counter.incr(pk)  # 增加阅读量（写入缓冲，不阻塞读取）
+                view_counter.add_reader(pk, reader_key(request))  # 记录独立读者
+            return response
+        except Exception as e:
             return Response(
-                {"code": 200, "message": "获取文章详情成功", "data": serializer.data}
+                {"code": 500, "message": "服务器内部错误", "data": None},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+    def build_response(self, pk):
+        try:
+            article = Article.objects.select_related("category").get(pk=pk)
         except Article.DoesNotExist:
             return Response(
                 {"code": 404, "message": "文章不存在", "data": None},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        except Exception as e:
-            return Response(
-                {"code": 500, "message": "服务器内部错误", "data": None},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        serializer = ArticleDetailSerializer(article)
+        return Response(
+            {"code": 200, "message": "获取文章详情成功", "data": serializer.data}
+        )
 
     def put(self, request, pk):
         """更新文章"""
@@ -176,24 +264,46 @@ class ArticleLikeView(APIView):
     def post(self, request, pk):
         """点赞文章"""
         try:
-            article = Article.objects.get(pk=pk)
-            user = request.user
-            
-            if article.liked_users.filter(id=user.id).exists():
+            article = Article.objects.only("id", "likes_count").get(pk=pk)
+
+            if not article.like(request.user):
                 return Response(
                     {"code": 400, "message": "您已经点赞过该文章", "data": None},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            
-            article.liked_users.add(user)
-            article.likes_count += 1
-            article.save()
-            
+
             return Response(
                 {"code": 200, "message": "点赞成功", "data": {"likes_count": article.likes_count}},
                 status=status.HTTP_200_OK,
             )
-            
+
+        except Article.DoesNotExist:
+            return Response(
+                {"code": 404, "message": "文章不存在", "data": None},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {"code": 500, "message": "服务器内部错误", "data": None},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def delete(self, request, pk):
+        """取消点赞"""
+        try:
+            article = Article.objects.only("id", "likes_count").get(pk=pk)
+
+            if not article.unlike(request.user):
+                return Response(
+                    {"code": 400, "message": "您尚未点赞该文章", "data": None},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            return Response(
+                {"code": 200, "message": "取消点赞成功", "data": {"likes_count": article.likes_count}},
+                status=status.HTTP_200_OK,
+            )
+
         except Article.DoesNotExist:
             return Response(
                 {"code": 404, "message": "文章不存在", "data": None},
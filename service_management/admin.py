@@ -1,12 +1,31 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Service
+from .models import CaregiverShift, Service, ServicePlan
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ('service_type', 'client', 'caregiver', 'status', 'service_time', 'address')
+    list_display = ('service_type', 'client', 'caregiver', 'status', 'service_time', 'duration', 'address')
     list_filter = ('service_type', 'status', 'service_time')
     search_fields = ('client__user__username', 'caregiver__user__username', 'address')
     date_hierarchy = 'service_time'
     raw_id_fields = ('client', 'caregiver')
     list_per_page = 20
+
+
+@admin.register(ServicePlan)
+class ServicePlanAdmin(admin.ModelAdmin):
+    list_display = ('service_type', 'client', 'caregiver', 'frequency', 'interval', 'weekdays', 'start_time', 'end_date')
+    list_filter = ('service_type', 'frequency')
+    search_fields = ('client__user__username', 'caregiver__user__username', 'address')
+    raw_id_fields = ('client', 'caregiver')
+    list_select_related = ('client__user', 'caregiver__user')
+    list_per_page = 20
+
+
+@admin.register(CaregiverShift)
+class CaregiverShiftAdmin(admin.ModelAdmin):
+    list_display = ('caregiver', 'weekday', 'start_time', 'end_time')
+    list_filter = ('weekday',)
+    search_fields = ('caregiver__user__username', 'caregiver__nickname')
+    raw_id_fields = ('caregiver',)
+    list_select_related = ('caregiver__user',)
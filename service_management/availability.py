@@ -0,0 +1,212 @@
+"""
+护工空闲时间位图
+每个护工每天一条记录，一天按 SLOT_MINUTES 分钟划分为 96 个时段，每个时段一位，1 表示空闲。
+空闲位图 = 排班（CaregiverShift）完整覆盖的时段 - 已有服务占用的时段（部分占用也计入）。96 位拆为上午、下午两个 48 位整数
+（free_am、free_pm）存放，查询某个时间段有哪些空闲护工时，用一条 SQL 对全部护工做按位与：
+free_am & mask_am = mask_am AND free_pm & mask_pm = mask_pm。
+位图在第一次查询某天时批量生成；服务新增、修改、取消或删除时只重新计算受影响的（护工，日期）。
+"""
+
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .conflicts import ACTIVE_STATUSES
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+HALF_SLOTS = SLOTS_PER_DAY // 2
+HALF_MASK = (1 << HALF_SLOTS) - 1
+
+
+def slot_range(start_minute, end_minute):
+    """一天内 [start_minute, end_minute) 分钟覆盖的时段位，部分覆盖的时段也计入"""
+    first = max(start_minute, 0) // SLOT_MINUTES
+    last = min(-(-end_minute // SLOT_MINUTES), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def covered_slot_range(start_minute, end_minute):
+    """一天内 [start_minute, end_minute) 分钟完整覆盖的时段位，部分覆盖的时段不计入"""
+    first = max(-(-start_minute // SLOT_MINUTES), 0)
+    last = min(end_minute // SLOT_MINUTES, SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def split(mask):
+    return mask & HALF_MASK, mask >> HALF_SLOTS
+
+
+def join(am, pm):
+    return am | (pm << HALF_SLOTS)
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute + (value.second > 0 or value.microsecond > 0)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def service_span(service_time, duration):
+    """服务占用的时间段，duration 为分钟数"""
+    return service_time, service_time + timedelta(minutes=duration)
+
+
+def day_masks(start, end):
+    """把 [start, end) 拆分为 {本地日期: 时段位}"""
+    masks = {}
+    day = timezone.localtime(start).date()
+    while day_start(day) < end:
+        base = day_start(day)
+        begin = max(start, base)
+        finish = min(end, day_start(day + timedelta(days=1)))
+        mask = slot_range(
+            int((begin - base).total_seconds() // 60), math.ceil((finish - base).total_seconds() / 60)
+        )
+        if mask:
+            masks[day] = mask
+        day += timedelta(days=1)
+    return masks
+
+
+def shift_mask(shifts):
+    """
+    排班完整覆盖的时段位，shifts 为 [(开始时间, 结束时间)]，结束时间早于开始时间表示跨零点（只计当天部分）
+    排班开始时间向后、结束时间向前取整到时段边界，避免把排班外的几分钟报告为空闲
+    """
+    mask = 0
+    for start, end in shifts:
+        end_minute = end.hour * 60 + end.minute if end > start else 24 * 60
+        mask |= covered_slot_range(minutes(start), end_minute)
+    return mask
+
+
+def compute(pairs):
+    """计算 {(护工 ID, 日期): 空闲时段位}，排班和服务各一条查询"""
+    from .models import CaregiverShift, Service
+
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    caregiver_ids = {caregiver for caregiver, _ in pairs}
+    days = sorted({day for _, day in pairs})
+
+    shifts = defaultdict(list)
+    for caregiver, weekday, start, end in CaregiverShift.objects.filter(
+        caregiver_id__in=caregiver_ids
+    ).values_list('caregiver_id', 'weekday', 'start_time', 'end_time'):
+        shifts[caregiver, weekday].append((start, end))
+
+    booked = defaultdict(int)
+    # 服务时长不超过一天，前一天开始的服务可能延续到当天
+    services = Service.objects.filter(
+        caregiver_id__in=caregiver_ids,
+        status__in=ACTIVE_STATUSES,
+        service_time__gte=day_start(days[0] - timedelta(days=1)),
+        service_time__lt=day_start(days[-1] + timedelta(days=1)),
+    ).values_list('caregiver_id', 'service_time', 'duration')
+    for caregiver, service_time, duration in services:
+        for day, mask in day_masks(*service_span(service_time, duration)).items():
+            booked[caregiver, day] |= mask
+
+    return {
+        (caregiver, day): shift_mask(shifts[caregiver, day.weekday()]) & ~booked[caregiver, day]
+        for caregiver, day in pairs
+    }
+
+
+def store(masks):
+    """写入位图，已有记录时覆盖"""
+    from .models import CaregiverAvailability
+
+    if not masks:
+        return
+    now = timezone.now()
+    rows = []
+    for (caregiver, day), mask in masks.items():
+        am, pm = split(mask)
+        rows.append(CaregiverAvailability(caregiver_id=caregiver, date=day, free_am=am, free_pm=pm, updated_at=now))
+    CaregiverAvailability.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['caregiver', 'date'],
+        update_fields=['free_am', 'free_pm', 'updated_at'],
+    )
+
+
+def refresh(pairs):
+    """重新计算已生成位图的（护工，日期），尚未生成的日期在查询时再生成"""
+    from .models import CaregiverAvailability
+
+    pairs = set(pairs)
+    if not pairs:
+        return
+    caregiver_ids = {caregiver for caregiver, _ in pairs}
+    days = {day for _, day in pairs}
+    existing = set(
+        CaregiverAvailability.objects.filter(caregiver_id__in=caregiver_ids, date__in=days)
+        .values_list('caregiver_id', 'date')
+    )
+    store(compute(pairs & existing))
+
+
+def affected_pairs(caregiver_id, service_time, duration):
+    """服务占用的（护工，日期）"""
+    if not caregiver_id or not service_time or not duration:
+        return set()
+    return {(caregiver_id, day) for day in day_masks(*service_span(service_time, duration))}
+
+
+def ensure_days(caregiver_ids, days):
+    """为尚无位图的（护工，日期）批量生成位图"""
+    from .models import CaregiverAvailability
+
+    existing = set(
+        CaregiverAvailability.objects.filter(caregiver_id__in=caregiver_ids, date__in=days)
+        .values_list('caregiver_id', 'date')
+    )
+    missing = {(caregiver, day) for caregiver in caregiver_ids for day in days} - existing
+    store(compute(missing))
+
+
+def free_caregivers(start, end):
+    """
+    返回在 [start, end) 整段时间内空闲的护工（用户资料 ID 集合）
+    每天一条按位与查询，跨天时取各天结果的交集
+    """
+    from .models import CaregiverAvailability
+    from .roles import CAREGIVER_GROUP
+    from user_profile.models import UserProfile
+
+    masks = day_masks(start, end)
+    if not masks:
+        return set()
+    caregiver_ids = set(
+        UserProfile.objects.filter(user__groups__name=CAREGIVER_GROUP).values_list('pk', flat=True)
+    )
+    with transaction.atomic():
+        ensure_days(caregiver_ids, list(masks))
+
+    result = caregiver_ids
+    for day, mask in masks.items():
+        am, pm = split(mask)
+        queryset = CaregiverAvailability.objects.filter(date=day, caregiver_id__in=result)
+        if am:
+            queryset = queryset.annotate(am_hit=F('free_am').bitand(am)).filter(am_hit=am)
+        if pm:
+            queryset = queryset.annotate(pm_hit=F('free_pm').bitand(pm)).filter(pm_hit=pm)
+        result = set(queryset.values_list('caregiver_id', flat=True))
+        if not result:
+            break
+    return result
@@ -0,0 +1,216 @@
+"""
+批量创建服务和批量修改服务状态
+整批在一个事务中完成，按条返回结果，无效的条目不影响其他条目（all_or_nothing 为 True 时任一条目无效则整批不写入）。
+校验按集合进行：被服务人和护工一条查询确认存在及护工角色，时间冲突一条范围查询后排序扫描；
+写入使用 bulk_create 或 UPDATE ... WHERE id IN (...)，不逐条调用 Service.save。
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, roles
+from .conflicts import ACTIVE_STATUSES, find_overlaps, max_duration
+
+MAX_ITEMS = 500
+# 每条 SQL 的 ID 数量
+BATCH_SIZE = 500
+ABORTED = {"non_field_errors": ["其他条目无效，整批未写入"]}
+
+
+def success(index, service_id):
+    return {"index": index, "id": service_id, "success": True, "errors": None}
+
+
+def failure(index, errors, service_id=None):
+    return {"index": index, "id": service_id, "success": False, "errors": errors}
+
+
+def refresh_availability(spans):
+    """spans 为 [(护工 ID, 服务时间, 时长)]"""
+    pairs = set()
+    for caregiver, service_time, duration in spans:
+        pairs |= availability.affected_pairs(caregiver, service_time, duration)
+    availability.refresh(pairs)
+
+
+def lock_caregivers(caregiver_ids):
+    """锁定护工资料，与 Service.save 一致，同一护工的并发预约依次做冲突检查"""
+    from user_profile.models import UserProfile
+
+    caregiver_ids = sorted(caregiver_ids)
+    for offset in range(0, len(caregiver_ids), BATCH_SIZE):
+        list(
+            UserProfile.objects.select_for_update()
+            .filter(pk__in=caregiver_ids[offset:offset + BATCH_SIZE])
+            .values_list('pk')
+        )
+
+
+def find_conflicts(candidates):
+    """
+    candidates 为 {序号: 校验后的数据}，返回 {序号: [冲突的服务 ID 或 "第 n 条"]}
+    与已有服务、本批其他条目的重叠在一次排序扫描中找出；本批条目之间重叠时保留序号较小的条目
+    """
+    from .models import Service
+
+    booked = {
+        index: data for index, data in candidates.items()
+        if data.get('caregiver') and data.get('status', 'PENDING') in ACTIVE_STATUSES
+    }
+    if not booked:
+        return {}
+
+    def span(data):
+        return data['service_time'], data['service_time'] + timedelta(minutes=data['duration'])
+
+    spans = {index: span(data) for index, data in booked.items()}
+    existing = Service.objects.filter(
+        caregiver_id__in={data['caregiver'] for data in booked.values()},
+        status__in=ACTIVE_STATUSES,
+        service_time__gt=min(start for start, _ in spans.values()) - max_duration(),
+        service_time__lt=max(end for _, end in spans.values()),
+    ).values_list('id', 'caregiver_id', 'service_time', 'duration')
+
+    # 本批条目以负数 ID 参与扫描，与已有服务区分
+    rows = [
+        (pk, caregiver, start, start + timedelta(minutes=duration)) for pk, caregiver, start, duration in existing
+    ]
+    rows += [(-index - 1, booked[index]['caregiver'], start, end) for index, (start, end) in spans.items()]
+    rows.sort(key=lambda row: (row[1], row[2], row[0]))
+
+    overlaps = defaultdict(list)
+    for _, first, second in find_overlaps(rows):
+        overlaps[first[0]].append(second[0])
+        overlaps[second[0]].append(first[0])
+
+    conflicts, rejected = {}, set()
+    for index in sorted(booked):
+        others = [
+            pk if pk > 0 else f"第 {-pk} 条"
+            for pk in overlaps[-index - 1]
+            if pk > 0 or (-pk - 1 < index and -pk - 1 not in rejected)
+        ]
+        if others:
+            conflicts[index] = others
+            rejected.add(index)
+    return conflicts
+
+
+def create_services(items, all_or_nothing=False):
+    """批量创建服务，items 为服务数据列表（字段同单条创建），返回按条的结果"""
+    from .models import Service
+    from .serializers import ServiceBulkItemSerializer
+    from user_profile.models import UserProfile
+
+    results = [None] * len(items)
+    candidates = {}
+    for index, item in enumerate(items):
+        serializer = ServiceBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            candidates[index] = dict(serializer.validated_data)
+            candidates[index].setdefault('duration', Service._meta.get_field('duration').default)
+        else:
+            results[index] = failure(index, serializer.errors)
+
+    # 被服务人、护工是否存在以及护工角色：一条查询
+    profile_ids = {data['client'] for data in candidates.values()}
+    profile_ids |= {data['caregiver'] for data in candidates.values() if data.get('caregiver')}
+    profiles = dict(
+        UserProfile.objects.filter(pk__in=profile_ids)
+        .annotate(is_caregiver=roles.caregiver_membership())
+        .values_list('pk', 'is_caregiver')
+    )
+    for index, data in list(candidates.items()):
+        caregiver = data.get('caregiver')
+        if data['client'] not in profiles:
+            results[index] = failure(index, {"client": ["被服务人不存在"]})
+        elif caregiver and caregiver not in profiles:
+            results[index] = failure(index, {"caregiver": ["护工不存在"]})
+        elif caregiver and not profiles[caregiver]:
+            results[index] = failure(index, {"caregiver": ["护工必须是护工用户组"]})
+        else:
+            continue
+        del candidates[index]
+
+    with transaction.atomic():
+        lock_caregivers({data['caregiver'] for data in candidates.values() if data.get('caregiver')})
+        for index, others in find_conflicts(candidates).items():
+            ids = ', '.join(str(other) for other in others)
+            results[index] = failure(index, {"service_time": [f"护工在该时间段已有其他服务（{ids}）"]})
+            del candidates[index]
+
+        if all_or_nothing and len(candidates) < len(items):
+            for index in candidates:
+                results[index] = failure(index, ABORTED)
+            return results, 0
+
+        now = timezone.now()
+        services = [
+            Service(
+                client_id=data.pop('client'),
+                caregiver_id=data.pop('caregiver', None),
+                created_at=now,
+                updated_at=now,
+                **data,
+            )
+            for data in candidates.values()
+        ]
+        Service.objects.bulk_create(services, batch_size=BATCH_SIZE)
+        for index, service in zip(candidates, services):
+            results[index] = success(index, service.pk)
+        refresh_availability(
+            (service.caregiver_id, service.service_time, service.duration) for service in services
+        )
+    return results, len(services)
+
+
+def transition_services(ids, target, all_or_nothing=False):
+    """把 ids 对应服务的状态改为 target，按 Service.STATUS_TRANSITIONS 校验，返回按条的结果"""
+    from .models import Service
+
+    sources = [source for source, targets in Service.STATUS_TRANSITIONS.items() if target in targets]
+    results = []
+    with transaction.atomic():
+        rows = {}
+        unique_ids = list(dict.fromkeys(ids))
+        for offset in range(0, len(unique_ids), BATCH_SIZE):
+            for pk, current, caregiver, service_time, duration in (
+                Service.objects.select_for_update()
+                .filter(pk__in=unique_ids[offset:offset + BATCH_SIZE])
+                .values_list('id', 'status', 'caregiver_id', 'service_time', 'duration')
+            ):
+                rows[pk] = (current, caregiver, service_time, duration)
+
+        valid = []
+        for index, pk in enumerate(ids):
+            if pk not in rows:
+                results.append(failure(index, {"id": ["未找到该服务"]}, pk))
+            elif rows[pk][0] not in sources:
+                labels = dict(Service.STATUS_CHOICES)
+                results.append(failure(
+                    index, {"status": [f"不能从{labels[rows[pk][0]]}改为{labels[target]}"]}, pk
+                ))
+            else:
+                results.append(success(index, pk))
+                valid.append(pk)
+
+        if all_or_nothing and len(valid) < len(ids):
+            results = [
+                failure(result["index"], ABORTED, result["id"]) if result["success"] else result
+                for result in results
+            ]
+            return results, 0
+
+        valid = list(dict.fromkeys(valid))
+        updated = 0
+        now = timezone.now()
+        for offset in range(0, len(valid), BATCH_SIZE):
+            updated += Service.objects.filter(
+                pk__in=valid[offset:offset + BATCH_SIZE], status__in=sources
+            ).update(status=target, updated_at=now)
+        # 批量 UPDATE 不触发信号，统一刷新受影响护工的空闲时间
+        refresh_availability(rows[pk][1:] for pk in valid)
+    return results, updated
@@ -0,0 +1,52 @@
+"""
+护工服务时间冲突
+每个服务占用 [service_time, service_time + duration)。服务时长不超过 MAX_DURATION_MINUTES，
+因此与 [start, end) 重叠的服务一定在 (start - MAX_DURATION_MINUTES, end) 内开始，
+新增、修改服务时只需在 (caregiver, service_time) 索引上做一次范围扫描。
+全表审计按 (护工, 开始时间) 排序后扫描一遍，用按结束时间排序的小顶堆维护仍在进行的服务，
+复杂度为 O(n log n + 冲突数)，不做两两比较。
+"""
+
+import heapq
+from datetime import timedelta
+
+# 占用护工时间的服务状态
+ACTIVE_STATUSES = ('PENDING', 'IN_PROGRESS')
+DEFAULT_DURATION_MINUTES = 60
+MAX_DURATION_MINUTES = 24 * 60
+
+
+def max_duration():
+    return timedelta(minutes=MAX_DURATION_MINUTES)
+
+
+def conflicting_services(caregiver_id, start, end, exclude=None):
+    """护工在 [start, end) 内已有的服务，exclude 为需要排除的服务 ID（修改服务时排除自身）"""
+    from .models import Service
+
+    candidates = Service.objects.filter(
+        caregiver_id=caregiver_id,
+        status__in=ACTIVE_STATUSES,
+        service_time__gt=start - max_duration(),
+        service_time__lt=end,
+    ).only('id', 'service_time', 'duration').order_by('service_time', 'id')
+    if exclude:
+        candidates = candidates.exclude(pk=exclude)
+    return [service for service in candidates if service.end_time > start]
+
+
+def find_overlaps(rows):
+    """
+    扫描按 (护工 ID, 开始时间) 排序的 [(服务 ID, 护工 ID, 开始时间, 结束时间)]
+    逐个生成重叠的服务对 (护工 ID, (服务 ID, 开始, 结束), (服务 ID, 开始, 结束))，前者开始得更早
+    """
+    current, active = None, []
+    for service_id, caregiver, start, end in rows:
+        if caregiver != current:
+            current, active = caregiver, []
+        # 移除已经结束的服务，堆中剩下的都与当前服务重叠
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, other_id, other_start in sorted(active, key=lambda item: (item[2], item[1])):
+            yield caregiver, (other_id, other_start, other_end), (service_id, start, end)
+        heapq.heappush(active, (end, service_id, start))
@@ -0,0 +1,200 @@
+"""
+护工派单
+把时间范围内未指派护工的待处理服务一次性分配给“护工”用户组中的护工：
+- 不与护工已有的服务时间冲突（每个服务占用 [服务时间, 服务时间 + 服务时长)）；
+- 优先分配给当前工作量少的护工，同等条件下优先做过较多同类服务的护工。
+服务按时间先后处理，每种服务类型维护一个按 (工作量 - 类型偏好加分) 排序的小顶堆，
+护工工作量变化后堆中的旧条目在弹出时才更新（惰性删除），单个服务的分配代价为 O(log C)，
+只有护工时间冲突时才需要多弹出几个条目。规划过程不访问数据库，读取和写入都是批量的。
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import availability
+from .conflicts import ACTIVE_STATUSES, max_duration
+
+# 按 ID 批量读写时每条 SQL 的 ID 数量
+BATCH_SIZE = 500
+
+
+def affinity_weight():
+    return getattr(settings, 'SERVICE_DISPATCH_AFFINITY_WEIGHT', 2.0)
+
+
+class Timeline:
+    """护工已占用的时间段，保存为按开始时间排序、互不重叠的区间"""
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def is_free(self, start, end):
+        # 只需检查开始时间早于 end 的最后一个区间
+        index = bisect_left(self.starts, end)
+        return index == 0 or self.ends[index - 1] <= start
+
+    def add(self, start, end):
+        """加入区间，与已有区间重叠时合并"""
+        index = bisect_left(self.starts, start)
+        if index and self.ends[index - 1] >= start:
+            index -= 1
+            start = self.starts[index]
+        while index < len(self.starts) and self.starts[index] <= end:
+            end = max(end, self.ends[index])
+            del self.starts[index], self.ends[index]
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
+def plan(services, caregiver_ids, commitments=None, history=None, weight=None):
+    """
+    规划派单，不访问数据库
+    services: [(服务 ID, 开始时间戳, 结束时间戳, 服务类型)]
+    caregiver_ids: 可派单的护工（用户资料 ID）
+    commitments: {护工 ID: [(开始时间戳, 结束时间戳)]}，护工已有的服务
+    history: {护工 ID: {服务类型: 次数}}，护工完成过的服务
+    返回 ({服务 ID: 护工 ID}, [未能分配的服务 ID])
+    """
+    commitments = commitments or {}
+    history = history or {}
+    weight = affinity_weight() if weight is None else weight
+
+    timelines, load = {}, {}
+    for caregiver in caregiver_ids:
+        timeline = Timeline()
+        for start, end in sorted(commitments.get(caregiver, ())):
+            timeline.add(start, end)
+        timelines[caregiver] = timeline
+        load[caregiver] = len(commitments.get(caregiver, ()))
+
+    # 类型偏好：该类型服务占护工全部历史服务的比例
+    affinity = {}
+    for caregiver, counts in history.items():
+        total = sum(counts.values())
+        if caregiver in timelines and total:
+            affinity[caregiver] = {kind: n / total for kind, n in counts.items()}
+
+    def key(caregiver, kind):
+        return (load[caregiver] - weight * affinity.get(caregiver, {}).get(kind, 0.0), load[caregiver], caregiver)
+
+    heaps = {}
+    assignments, unassigned = {}, []
+    for service_id, start, end, kind in sorted(services, key=lambda item: (item[1], item[0])):
+        if kind not in heaps:
+            heaps[kind] = [key(caregiver, kind) for caregiver in timelines]
+            heapq.heapify(heaps[kind])
+        heap = heaps[kind]
+
+        skipped, chosen = [], None
+        while heap:
+            entry = heapq.heappop(heap)
+            caregiver = entry[2]
+            if entry[1] != load[caregiver]:
+                # 工作量已变化，按当前工作量重新入堆
+                heapq.heappush(heap, key(caregiver, kind))
+                continue
+            if timelines[caregiver].is_free(start, end):
+                chosen = caregiver
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+
+        if chosen is None:
+            unassigned.append(service_id)
+            continue
+        assignments[service_id] = chosen
+        timelines[chosen].add(start, end)
+        load[chosen] += 1
+        heapq.heappush(heap, key(chosen, kind))
+    return assignments, unassigned
+
+
+def dispatch_pending(horizon_hours=24, start=None, dry_run=False):
+    """
+    为 [start, start + horizon_hours] 内未指派护工的待处理服务派单
+    返回 ({服务 ID: 护工 ID}, [未能分配的服务 ID])；dry_run 为 True 时只规划不写入
+    """
+    from .models import Service
+    from .roles import CAREGIVER_GROUP
+    from user_profile.models import UserProfile
+
+    start = start or timezone.now()
+    end = start + timedelta(hours=horizon_hours)
+    margin = max_duration()
+
+    pending = list(Service.objects.filter(
+        status='PENDING', caregiver__isnull=True, service_time__gte=start, service_time__lte=end
+    ).values_list('id', 'service_time', 'duration', 'service_type'))
+    services = [
+        (pk, moment.timestamp(), moment.timestamp() + duration * 60, kind) for pk, moment, duration, kind in pending
+    ]
+    if not services:
+        return {}, []
+
+    caregiver_ids = list(
+        UserProfile.objects.filter(user__groups__name=CAREGIVER_GROUP).values_list('pk', flat=True).distinct()
+    )
+
+    commitments = defaultdict(list)
+    booked = Service.objects.filter(
+        caregiver_id__in=caregiver_ids,
+        status__in=ACTIVE_STATUSES,
+        service_time__gte=start - margin,
+        service_time__lte=end + margin,
+    ).values_list('caregiver_id', 'service_time', 'duration')
+    for caregiver, moment, duration in booked:
+        commitments[caregiver].append((moment.timestamp(), moment.timestamp() + duration * 60))
+
+    history = defaultdict(dict)
+    completed = (
+        Service.objects.filter(caregiver_id__in=caregiver_ids, status='COMPLETED')
+        .values_list('caregiver_id', 'service_type')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for caregiver, kind, n in completed:
+        history[caregiver][kind] = n
+
+    assignments, unassigned = plan(services, caregiver_ids, commitments, history)
+    if dry_run or not assignments:
+        return assignments, unassigned
+
+    now = timezone.now()
+    with transaction.atomic():
+        # 只更新仍未指派的待处理服务，规划期间被人工指派或取消的服务保持不变
+        ids = list(assignments)
+        eligible = set()
+        for offset in range(0, len(ids), BATCH_SIZE):
+            eligible.update(
+                Service.objects.select_for_update()
+                .filter(pk__in=ids[offset:offset + BATCH_SIZE], status='PENDING', caregiver__isnull=True)
+                .values_list('pk', flat=True)
+            )
+        assignments = {pk: caregiver for pk, caregiver in assignments.items() if pk in eligible}
+        by_caregiver = defaultdict(list)
+        for service_id, caregiver in assignments.items():
+            by_caregiver[caregiver].append(service_id)
+        # 每个护工一条 UPDATE ... WHERE id IN (...)
+        for caregiver, service_ids in by_caregiver.items():
+            for offset in range(0, len(service_ids), BATCH_SIZE):
+                Service.objects.filter(pk__in=service_ids[offset:offset + BATCH_SIZE]).update(
+                    caregiver_id=caregiver, updated_at=now
+                )
+        # 批量 UPDATE 不触发信号，统一刷新被派单护工的空闲时间
+        spans = {pk: (moment, duration) for pk, moment, duration, _ in pending}
+        pairs = set()
+        for service_id, caregiver in assignments.items():
+            pairs |= availability.affected_pairs(caregiver, *spans[service_id])
+        availability.refresh(pairs)
+    return assignments, unassigned
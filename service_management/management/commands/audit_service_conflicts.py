@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from service_management.conflicts import ACTIVE_STATUSES, find_overlaps
+from service_management.models import Service
+
+
+class Command(BaseCommand):
+    help = '找出同一护工时间重叠的服务（排序后一次扫描）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='只检查最近多少天以来的服务，默认检查全部')
+        parser.add_argument('--limit', type=int, default=100, help='最多输出多少对冲突')
+
+    def handle(self, *args, **options):
+        services = Service.objects.filter(caregiver__isnull=False, status__in=ACTIVE_STATUSES)
+        if options['days'] is not None:
+            services = services.filter(service_time__gte=timezone.now() - timedelta(days=options['days']))
+        rows = (
+            (pk, caregiver, moment, moment + timedelta(minutes=duration))
+            for pk, caregiver, moment, duration in services.order_by('caregiver_id', 'service_time', 'id')
+            .values_list('id', 'caregiver_id', 'service_time', 'duration')
+            .iterator(chunk_size=2000)
+        )
+
+        total = 0
+        for caregiver, first, second in find_overlaps(rows):
+            total += 1
+            if total <= options['limit']:
+                self.stdout.write(
+                    f'护工 {caregiver}: 服务 {first[0]}（{timezone.localtime(first[1]):%Y-%m-%d %H:%M}'
+                    f'-{timezone.localtime(first[2]):%H:%M}）与服务 {second[0]}'
+                    f'（{timezone.localtime(second[1]):%Y-%m-%d %H:%M}-{timezone.localtime(second[2]):%H:%M}）重叠'
+                )
+        if total:
+            self.stdout.write(self.style.WARNING(f'共发现 {total} 对时间重叠的服务'))
+        else:
+            self.stdout.write(self.style.SUCCESS('没有时间重叠的服务'))
@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service_management.dispatch import plan
+from service_management.models import Service
+
+
+class Command(BaseCommand):
+    help = '用随机生成的数据测试派单算法的耗时与结果（不访问数据库）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--services', type=int, default=10000, help='待派单的服务数')
+        parser.add_argument('--caregivers', type=int, default=500, help='护工数')
+        parser.add_argument('--days', type=int, default=7, help='服务分布的天数')
+        parser.add_argument('--booked', type=int, default=5, help='每个护工已有的服务数')
+        parser.add_argument('--slot', type=int, default=60, help='每个服务占用的分钟数')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        slot = options['slot'] * 60
+        kinds = [kind for kind, _ in Service.SERVICE_TYPES]
+
+        def random_start():
+            # 服务集中在每天 8:00-20:00，按 15 分钟取整
+            day = rng.randrange(options['days'])
+            return day * 86400 + 8 * 3600 + rng.randrange(48) * 900
+
+        services = [
+            (pk, start, start + slot, rng.choice(kinds))
+            for pk, start in ((pk, random_start()) for pk in range(options['services']))
+        ]
+        caregivers = list(range(options['caregivers']))
+        commitments = {
+            caregiver: [(start, start + slot) for start in (random_start() for _ in range(options['booked']))]
+            for caregiver in caregivers
+        }
+        history = {
+            caregiver: Counter(rng.choice(kinds[:3]) if caregiver % 2 else rng.choice(kinds) for _ in range(20))
+            for caregiver in caregivers
+        }
+
+        began = time.perf_counter()
+        assignments, unassigned = plan(services, caregivers, commitments, history)
+        elapsed = time.perf_counter() - began
+
+        # 校验：每个护工的时间段（含已有服务）互不重叠
+        intervals = defaultdict(list)
+        for caregiver, booked in commitments.items():
+            intervals[caregiver].extend(booked)
+        by_id = {service[0]: service for service in services}
+        for service_id, caregiver in assignments.items():
+            intervals[caregiver].append(by_id[service_id][1:3])
+        new_conflicts = 0
+        for caregiver, items in intervals.items():
+            items.sort()
+            existing = set(commitments[caregiver])
+            for (start_a, end_a), (start_b, end_b) in zip(items, items[1:]):
+                if start_b < end_a and not {(start_a, end_a), (start_b, end_b)} <= existing:
+                    new_conflicts += 1
+
+        loads = Counter(assignments.values())
+        per_caregiver = [loads.get(caregiver, 0) for caregiver in caregivers]
+        matched = sum(
+            1 for service_id, caregiver in assignments.items()
+            if history[caregiver].most_common(1)[0][0] == by_id[service_id][3]
+        )
+        self.stdout.write(
+            f'{len(services)} 个服务 × {len(caregivers)} 个护工：规划耗时 {elapsed * 1000:.0f}ms，'
+            f'分配 {len(assignments)}，未分配 {len(unassigned)}'
+        )
+        self.stdout.write(
+            f'每个护工新增服务：最少 {min(per_caregiver)}，最多 {max(per_caregiver)}，'
+            f'平均 {statistics.mean(per_caregiver):.1f}，标准差 {statistics.pstdev(per_caregiver):.2f}'
+        )
+        if assignments:
+            self.stdout.write(f'分配给最常做该类服务的护工的比例：{matched / len(assignments):.1%}')
+        if new_conflicts:
+            raise CommandError(f'发现 {new_conflicts} 处时间冲突')
+        self.stdout.write(self.style.SUCCESS('没有时间冲突'))
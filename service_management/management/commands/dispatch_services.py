@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from service_management.dispatch import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = '为时间范围内未指派护工的待处理服务派单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='派单的时间范围（从现在起的小时数）')
+        parser.add_argument('--dry-run', action='store_true', help='只规划，不写入数据库')
+
+    def handle(self, *args, **options):
+        assignments, unassigned = dispatch_pending(horizon_hours=options['hours'], dry_run=options['dry_run'])
+        action = '可分配' if options['dry_run'] else '已分配'
+        self.stdout.write(f'{action} {len(assignments)} 个服务，{len(unassigned)} 个服务没有空闲护工')
+        if unassigned:
+            self.stdout.write(self.style.WARNING('未分配的服务 ID: ' + ', '.join(map(str, unassigned[:50]))))
+        else:
+            self.stdout.write(self.style.SUCCESS('派单完成'))
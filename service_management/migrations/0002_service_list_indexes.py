@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_management', '0001_initial'),
+        ('user_profile', '0002_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['service_time', 'id'], name='service_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['status', 'service_time'], name='service_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['caregiver', 'service_time'], name='service_caregiver_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['client', 'service_time'], name='service_client_time_idx'),
+        ),
+    ]
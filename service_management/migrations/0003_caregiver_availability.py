@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_management', '0002_service_list_indexes'),
+        ('user_profile', '0002_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaregiverShift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, '周一'), (1, '周二'), (2, '周三'), (3, '周四'), (4, '周五'), (5, '周六'), (6, '周日')], verbose_name='星期')),
+                ('start_time', models.TimeField(verbose_name='开始时间')),
+                ('end_time', models.TimeField(verbose_name='结束时间')),
+                ('caregiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shifts', to='user_profile.userprofile', verbose_name='护工')),
+            ],
+            options={
+                'verbose_name': '护工排班',
+                'verbose_name_plural': '护工排班',
+                'ordering': ['caregiver', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CaregiverAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('free_am', models.BigIntegerField(default=0, verbose_name='上午空闲时段')),
+                ('free_pm', models.BigIntegerField(default=0, verbose_name='下午空闲时段')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('caregiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='user_profile.userprofile', verbose_name='护工')),
+            ],
+            options={
+                'verbose_name': '护工空闲时间',
+                'verbose_name_plural': '护工空闲时间',
+                'indexes': [models.Index(fields=['date', 'caregiver'], name='availability_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('caregiver', 'date'), name='caregiver_availability_unique_day')],
+            },
+        ),
+    ]
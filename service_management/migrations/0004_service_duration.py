@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_management', '0003_caregiver_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='duration',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)], verbose_name='服务时长（分钟）'),
+        ),
+    ]
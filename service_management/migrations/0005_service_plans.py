@@ -0,0 +1,55 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:47
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_management', '0004_service_duration'),
+        ('user_profile', '0002_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='occurrence_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='计划服务时间'),
+        ),
+        migrations.CreateModel(
+            name='ServicePlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_type', models.CharField(choices=[('FOOD', '喂药'), ('MEDICINE', '看护'), ('DIET', '做饭'), ('CLEANING', '打扫'), ('TRANSPORT', '代取'), ('DELIVERYGET', '代送'), ('DELIVERYBUY', '代购'), ('OTHERS', '其他')], max_length=20, verbose_name='服务类型')),
+                ('address', models.TextField(verbose_name='详细地址')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='备注')),
+                ('duration', models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)], verbose_name='服务时长（分钟）')),
+                ('start_time', models.DateTimeField(verbose_name='首次服务时间')),
+                ('frequency', models.CharField(choices=[('DAILY', '每天'), ('WEEKLY', '每周')], default='DAILY', max_length=10, verbose_name='重复频率')),
+                ('interval', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='间隔（天或周）')),
+                ('weekdays', models.CharField(blank=True, default='', help_text='每周重复时的星期几，逗号分隔，0 为周一；为空时取首次服务的星期', max_length=13, verbose_name='星期')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='结束日期')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('caregiver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='service_plans_provided', to='user_profile.userprofile', verbose_name='护工')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_plans_received', to='user_profile.userprofile', verbose_name='被服务人')),
+            ],
+            options={
+                'verbose_name': '周期服务计划',
+                'verbose_name_plural': '周期服务计划',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='plan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='services', to='service_management.serviceplan', verbose_name='周期服务计划'),
+        ),
+        migrations.AddConstraint(
+            model_name='service',
+            constraint=models.UniqueConstraint(fields=('plan', 'occurrence_time'), name='service_plan_occurrence_unique'),
+        ),
+    ]
@@ -1,7 +1,17 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.contrib.auth.models import Group, User
 from user_profile.models import UserProfile
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
+from . import availability, recurrence, roles
+from .conflicts import (
+    ACTIVE_STATUSES, DEFAULT_DURATION_MINUTES, MAX_DURATION_MINUTES, conflicting_services
+)
 
 class Service(models.Model):
     SERVICE_TYPES = (
@@ -21,6 +31,13 @@ class Service(models.Model):
         ('COMPLETED', '已完成'),
         ('CANCELLED', '已取消'),
     )
+    # 允许的状态变化，已完成和已取消的服务不能再改变状态
+    STATUS_TRANSITIONS = {
+        'PENDING': ('IN_PROGRESS', 'COMPLETED', 'CANCELLED'),
+        'IN_PROGRESS': ('COMPLETED', 'CANCELLED'),
+        'COMPLETED': (),
+        'CANCELLED': (),
+    }
 
     client = models.ForeignKey(
         UserProfile,
@@ -48,8 +65,22 @@ class Service(models.Model):
         verbose_name='状态'
     )
     service_time = models.DateTimeField(verbose_name='服务时间')
+    duration = models.PositiveIntegerField(
+        default=DEFAULT_DURATION_MINUTES,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION_MINUTES)],
+        verbose_name='服务时长（分钟）'
+    )
     address = models.TextField(verbose_name='详细地址')
     notes = models.TextField(blank=True, null=True, verbose_name='备注')
+    plan = models.ForeignKey(
+        'ServicePlan',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='services',
+        verbose_name='周期服务计划'
+    )
+    occurrence_time = models.DateTimeField(null=True, blank=True, verbose_name='计划服务时间')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -57,15 +88,259 @@ class Service(models.Model):
         verbose_name = '服务'
         verbose_name_plural = '服务管理'
         ordering = ['-created_at']
+        indexes = [
+            # 服务列表按服务时间翻页，常与状态、护工、被服务人筛选组合
+            models.Index(fields=['service_time', 'id'], name='service_time_id_idx'),
+            models.Index(fields=['status', 'service_time'], name='service_status_time_idx'),
+            models.Index(fields=['caregiver', 'service_time'], name='service_caregiver_time_idx'),
+            models.Index(fields=['client', 'service_time'], name='service_client_time_idx'),
+        ]
+        constraints = [
+            # 计划的每次服务最多写入一条记录
+            models.UniqueConstraint(fields=['plan', 'occurrence_time'], name='service_plan_occurrence_unique'),
+        ]
+
+    @property
+    def end_time(self):
+        return self.service_time + timedelta(minutes=self.duration)
 
     def clean(self):
         # 验证护工用户组
-        if self.caregiver and not self.caregiver.user.groups.filter(name='护工').exists():
+        if self.caregiver and not roles.is_caregiver(self.caregiver):
             raise ValidationError('护工用户组不正确')
+        # 验证护工在服务时间段内没有其他服务
+        if (
+            self.caregiver_id and self.service_time and self.status in ACTIVE_STATUSES
+            and self.duration and self.duration <= MAX_DURATION_MINUTES
+        ):
+            conflicts = conflicting_services(self.caregiver_id, self.service_time, self.end_time, exclude=self.pk)
+            if conflicts:
+                ids = ', '.join(str(service.pk) for service in conflicts)
+                raise ValidationError(f'护工在该时间段已有其他服务（服务 ID: {ids}）')
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.caregiver_id:
+                # 锁定护工资料，同一护工的并发预约依次做冲突检查
+                list(UserProfile.objects.select_for_update().filter(pk=self.caregiver_id).values_list('pk'))
+            self.full_clean()
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_service_type_display()} - {self.client}"
+
+
+class ServicePlan(models.Model):
+    FREQUENCY_DAILY = 'DAILY'
+    FREQUENCY_WEEKLY = 'WEEKLY'
+    FREQUENCY_CHOICES = (
+        (FREQUENCY_DAILY, '每天'),
+        (FREQUENCY_WEEKLY, '每周'),
+    )
+
+    client = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='service_plans_received',
+        verbose_name='被服务人'
+    )
+    caregiver = models.ForeignKey(
+        UserProfile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='service_plans_provided',
+        verbose_name='护工'
+    )
+    service_type = models.CharField(
+        max_length=20,
+        choices=Service.SERVICE_TYPES,
+        verbose_name='服务类型'
+    )
+    address = models.TextField(verbose_name='详细地址')
+    notes = models.TextField(blank=True, null=True, verbose_name='备注')
+    duration = models.PositiveIntegerField(
+        default=DEFAULT_DURATION_MINUTES,
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_DURATION_MINUTES)],
+        verbose_name='服务时长（分钟）'
+    )
+    start_time = models.DateTimeField(verbose_name='首次服务时间')
+    frequency = models.CharField(
+        max_length=10,
+        choices=FREQUENCY_CHOICES,
+        default=FREQUENCY_DAILY,
+        verbose_name='重复频率'
+    )
+    interval = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        verbose_name='间隔（天或周）'
+    )
+    weekdays = models.CharField(
+        max_length=13,
+        blank=True,
+        default='',
+        verbose_name='星期',
+        help_text='每周重复时的星期几，逗号分隔，0 为周一；为空时取首次服务的星期'
+    )
+    end_date = models.DateField(null=True, blank=True, verbose_name='结束日期')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '周期服务计划'
+        verbose_name_plural = '周期服务计划'
+        ordering = ['-created_at']
+
+    def clean(self):
+        if self.caregiver_id and not roles.is_caregiver(self.caregiver):
+            raise ValidationError('护工用户组不正确')
+        try:
+            weekdays = recurrence.parse_weekdays(self.weekdays)
+        except ValueError:
+            raise ValidationError({'weekdays': '星期格式不正确'})
+        if any(day not in range(7) for day in weekdays):
+            raise ValidationError({'weekdays': '星期必须是 0 到 6 之间的整数'})
+        self.weekdays = ','.join(map(str, weekdays))
+        if self.end_date and self.start_time and self.end_date < timezone.localtime(self.start_time).date():
+            raise ValidationError({'end_date': '结束日期不能早于首次服务时间'})
 
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
 
+    def occurrences(self, start=None, end=None):
+        """按时间顺序生成 [start, end) 内的服务时间"""
+        return recurrence.iter_occurrences(self, start, end)
+
+    def build_occurrence(self, moment):
+        """计划在 moment 的一次服务（未保存）"""
+        return Service(
+            plan=self,
+            occurrence_time=moment,
+            client=self.client,
+            caregiver=self.caregiver,
+            service_type=self.service_type,
+            service_time=moment,
+            duration=self.duration,
+            address=self.address,
+            notes=self.notes,
+        )
+
     def __str__(self):
-        return f"{self.get_service_type_display()} - {self.client}"
+        return f"{self.get_service_type_display()} - {self.client}（{self.get_frequency_display()}）"
+
+
+class CaregiverShift(models.Model):
+    WEEKDAY_CHOICES = (
+        (0, '周一'),
+        (1, '周二'),
+        (2, '周三'),
+        (3, '周四'),
+        (4, '周五'),
+        (5, '周六'),
+        (6, '周日'),
+    )
+
+    caregiver = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='shifts',
+        verbose_name='护工'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name='星期')
+    start_time = models.TimeField(verbose_name='开始时间')
+    end_time = models.TimeField(verbose_name='结束时间')
+
+    class Meta:
+        verbose_name = '护工排班'
+        verbose_name_plural = '护工排班'
+        ordering = ['caregiver', 'weekday', 'start_time']
+
+    def clean(self):
+        if self.caregiver_id and not roles.is_caregiver(self.caregiver):
+            raise ValidationError('护工用户组不正确')
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.caregiver} {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class CaregiverAvailability(models.Model):
+    """护工每天的空闲时段位图，由排班和服务计算得出，见 availability 模块"""
+    caregiver = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='availability',
+        verbose_name='护工'
+    )
+    date = models.DateField(verbose_name='日期')
+    free_am = models.BigIntegerField(default=0, verbose_name='上午空闲时段')
+    free_pm = models.BigIntegerField(default=0, verbose_name='下午空闲时段')
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = '护工空闲时间'
+        verbose_name_plural = '护工空闲时间'
+        constraints = [
+            models.UniqueConstraint(fields=['caregiver', 'date'], name='caregiver_availability_unique_day'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'caregiver'], name='availability_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.caregiver} {self.date}"
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_caregiver_role(sender, instance, action, reverse, pk_set, **kwargs):
+    """用户组成员变化时删除相关用户的护工角色缓存"""
+    if not reverse:
+        # user.groups.add/remove/clear：instance 为用户
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            roles.invalidate_users([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        # group.user_set.add/remove：pk_set 为用户 ID
+        roles.invalidate_users(pk_set)
+    elif action == 'pre_clear':
+        # group.user_set.clear() 不提供 pk_set，清空前先取出成员
+        roles.invalidate_users(list(instance.user_set.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_caregiver_roles(sender, instance, **kwargs):
+    """用户组改名或删除时使全部护工角色缓存失效"""
+    roles.invalidate_all()
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_slot(sender, instance, **kwargs):
+    """记录修改前的护工和服务时间，保存后据此刷新原来占用的空闲时间"""
+    instance._previous_slot = None
+    if instance.pk:
+        instance._previous_slot = (
+            Service.objects.filter(pk=instance.pk).values_list('caregiver_id', 'service_time', 'duration').first()
+        )
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def refresh_caregiver_availability(sender, instance, **kwargs):
+    """服务新增、修改、取消或删除后重新计算受影响护工当天的空闲时间"""
+    pairs = availability.affected_pairs(instance.caregiver_id, instance.service_time, instance.duration)
+    previous = getattr(instance, '_previous_slot', None)
+    if previous:
+        pairs |= availability.affected_pairs(*previous)
+    availability.refresh(pairs)
+
+
+@receiver(post_save, sender=CaregiverShift)
+@receiver(post_delete, sender=CaregiverShift)
+def reset_caregiver_availability(sender, instance, **kwargs):
+    """排班变化后删除该护工已生成的位图，下次查询时重新生成"""
+    CaregiverAvailability.objects.filter(caregiver_id=instance.caregiver_id).delete()
@@ -0,0 +1,157 @@
+"""
+周期服务
+ServicePlan 只保存重复规则（每 interval 天，或每 interval 周的指定星期几），服务实例在查询时由生成器按需展开，
+不预先写入数据库。只有被指派、修改或完成的实例才写入 Service 表（plan + occurrence_time 唯一），
+展开时跳过这些已写入的实例。
+服务列表把两种来源按 (服务时间, 类型, ID) 归并：已写入的服务一条范围查询取一页，
+各计划的生成器用 heapq.merge 归并后只取一页所需的条数。
+"""
+
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from yanglao.pagination import InvalidCursor
+
+# 归并排序键中的来源：已写入的服务排在同一时刻的计划实例之前
+CONCRETE, VIRTUAL = 0, 1
+# 每次检查是否已写入的计划实例数
+MATERIALIZED_BATCH = 200
+
+
+def parse_weekdays(value):
+    """'0,2,4' -> [0, 2, 4]（周一为 0）"""
+    return sorted({int(day) for day in value.split(',') if day.strip()}) if value else []
+
+
+def iter_occurrences(plan, start=None, end=None):
+    """
+    按时间顺序生成计划在 [start, end) 内的服务时间，end 为空时不设上限
+    直接跳到 start 所在的周期，不从计划开始逐个推算
+    """
+    first = timezone.localtime(plan.start_time)
+    first_day, moment_of_day = first.date(), first.time()
+    start = max(start, plan.start_time) if start else plan.start_time
+    start_day = timezone.localtime(start).date()
+
+    def occurrence(day):
+        return timezone.make_aware(datetime.combine(day, moment_of_day))
+
+    def finished(day):
+        return (plan.end_date and day > plan.end_date) or (end and occurrence(day) >= end)
+
+    if plan.frequency == plan.FREQUENCY_DAILY:
+        # 不早于 start 所在日期的第一个周期
+        skip = -(-(start_day - first_day).days // plan.interval)
+        day = first_day + timedelta(days=max(skip, 0) * plan.interval)
+        while not finished(day):
+            if occurrence(day) >= start:
+                yield occurrence(day)
+            day += timedelta(days=plan.interval)
+        return
+
+    weekdays = parse_weekdays(plan.weekdays) or [first_day.weekday()]
+    first_week = first_day - timedelta(days=first_day.weekday())
+    weeks = (start_day - first_week).days // 7
+    week = first_week + timedelta(weeks=-(-weeks // plan.interval) * plan.interval if weeks > 0 else 0)
+    while True:
+        for weekday in weekdays:
+            day = week + timedelta(days=weekday)
+            if day < first_day:
+                continue
+            if finished(day):
+                return
+            if occurrence(day) >= start:
+                yield occurrence(day)
+        week += timedelta(weeks=plan.interval)
+
+
+def is_occurrence(plan, moment):
+    """moment 是否为计划的一次服务时间"""
+    return next(iter_occurrences(plan, moment, moment + timedelta(microseconds=1)), None) == moment
+
+
+def encode_cursor(key):
+    moment, source, pk = key
+    raw = json.dumps([moment.isoformat(), source, pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        moment, source, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        moment = parse_datetime(moment)
+        if moment is None or source not in (CONCRETE, VIRTUAL):
+            raise ValueError
+        return moment, source, int(pk)
+    except Exception:
+        raise InvalidCursor('无效的分页游标')
+
+
+def _tagged_occurrences(plan, start, end):
+    """计划的实例流，每个实例附带所属计划（在函数中绑定，避免生成器表达式延迟读取循环变量）"""
+    for moment in iter_occurrences(plan, start, end):
+        yield moment, plan
+
+
+def virtual_services(plans, start=None, end=None, after=None):
+    """
+    按 (服务时间, 计划 ID) 顺序生成各计划尚未写入的服务实例（未保存的 Service 对象）
+    after 为归并游标，只生成排在它之后的实例
+    """
+    from .models import Service
+
+    if after:
+        start = max(start, after[0]) if start else after[0]
+    streams = [_tagged_occurrences(plan, start, end) for plan in plans]
+    merged = heapq.merge(*streams, key=lambda item: (item[0], item[1].pk))
+    if after:
+        merged = (item for item in merged if (item[0], VIRTUAL, item[1].pk) > after)
+
+    while True:
+        batch = list(islice(merged, MATERIALIZED_BATCH))
+        if not batch:
+            return
+        materialized = set(
+            Service.objects.filter(
+                plan_id__in={plan.pk for _, plan in batch},
+                occurrence_time__gte=batch[0][0],
+                occurrence_time__lte=batch[-1][0],
+            ).values_list('plan_id', 'occurrence_time')
+        )
+        for moment, plan in batch:
+            if (plan.pk, moment) not in materialized:
+                yield plan.build_occurrence(moment)
+
+
+def merged_page(services, plans, size, cursor=None, start=None, end=None):
+    """
+    归并已写入的服务和计划实例，按服务时间升序返回 (当前页, 下一页游标)
+    services 为已筛选的 Service 查询，plans 为已筛选的 ServicePlan 列表，[start, end) 为计划实例的时间范围
+    """
+    after = decode_cursor(cursor) if cursor else None
+    services = services.order_by('service_time', 'id')
+    if after:
+        moment, source, pk = after
+        condition = Q(service_time__gt=moment)
+        if source == CONCRETE:
+            condition |= Q(service_time=moment, id__gt=pk)
+        services = services.filter(condition)
+
+    concrete = ((service.service_time, CONCRETE, service.pk, service) for service in services[:size + 1])
+    virtual = (
+        (service.service_time, VIRTUAL, service.plan_id, service)
+        for service in virtual_services(plans, start, end, after)
+    )
+    items = list(islice(heapq.merge(concrete, virtual, key=lambda item: item[:3]), size + 1))
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor(items[-1][:3])
+    return [item[3] for item in items], next_cursor
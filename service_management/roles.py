@@ -0,0 +1,62 @@
+"""
+护工角色判断
+按用户缓存是否属于“护工”用户组，Service.clean 和 ServiceSerializer.validate 共用，同一次写入只查询一次数据库。
+User.groups 变化时由 m2m_changed 信号删除对应用户的缓存；用户组改名或删除时更新版本号，使全部缓存失效。
+缓存在每个进程内存中，其他进程依靠过期时间（SERVICE_CAREGIVER_CACHE_SECONDS）保证最终一致。
+批量创建服务不经过缓存，用 caregiver_membership 在查询用户资料的同一条 SQL 中判断角色。
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+CAREGIVER_GROUP = '护工'
+VERSION_KEY = 'service:caregiver:version'
+
+
+def cache_seconds():
+    return getattr(settings, 'SERVICE_CAREGIVER_CACHE_SECONDS', 300)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _key(user_id, version):
+    return f'service:caregiver:{version}:{user_id}'
+
+
+def caregiver_membership():
+    """用户属于护工用户组的关联子查询条件，OuterRef 指向用户 ID"""
+    return Exists(
+        User.groups.through.objects.filter(user_id=OuterRef('user_id'), group__name=CAREGIVER_GROUP)
+    )
+
+
+def is_caregiver(profile):
+    """判断用户资料对应的用户是否属于护工用户组"""
+    version = _version()
+    key = _key(profile.user_id, version)
+    result = cache.get(key)
+    if result is None:
+        result = User.groups.through.objects.filter(
+            user_id=profile.user_id, group__name=CAREGIVER_GROUP
+        ).exists()
+        cache.set(key, result, timeout=cache_seconds())
+    return result
+
+
+def invalidate_users(user_ids):
+    version = _version()
+    cache.delete_many([_key(user_id, version) for user_id in user_ids])
+
+
+def invalidate_all():
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
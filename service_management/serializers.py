@@ -1,9 +1,30 @@
 from rest_framework import serializers
-from .models import Service
+from .models import Service, ServicePlan
+from . import roles
 from user_profile.models import UserProfile
 from user_profile.serializers import UserProfileSerializer
+from django.db.models import Prefetch
 from django.utils import timezone
 
+# 可以通过 expand 参数展开为完整用户资料的字段
+EXPANDABLE_FIELDS = ('client', 'caregiver')
+
+
+class ParticipantSerializer(serializers.ModelSerializer):
+    """服务中被服务人、护工的精简信息，只需 UserProfile 和 User 两张表"""
+    username = serializers.CharField(source='user.username', read_only=True)
+    avatar = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserProfile
+        fields = ['id', 'username', 'nickname', 'avatar', 'phone']
+
+    def get_avatar(self, obj):
+        if obj.avatar_file:
+            return obj.avatar_file.url
+        return obj.avatar
+
+
 class ServiceSerializer(serializers.ModelSerializer):
     client = serializers.PrimaryKeyRelatedField(
         queryset=UserProfile.objects.all(),
@@ -14,20 +35,53 @@ class ServiceSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    end_time = serializers.DateTimeField(read_only=True)
     
     class Meta:
         model = Service
         fields = '__all__'
         extra_kwargs = {
             'created_at': {'read_only': True},
-            'updated_at': {'read_only': True}
+            'updated_at': {'read_only': True},
+            # 计划实例通过周期服务计划的接口写入
+            'plan': {'read_only': True},
+            'occurrence_time': {'read_only': True}
         }
 
+    @staticmethod
+    def setup_eager_loading(queryset, expand=()):
+        """
+        批量加载序列化所需的关联数据
+        精简信息只需 JOIN 用户资料和用户；展开的字段再预取卡包、卡片和监护关系
+        """
+        from user_profile.models import Guardianship
+
+        queryset = queryset.select_related('client__user', 'caregiver__user')
+        for field in expand:
+            queryset = queryset.select_related(f'{field}__card_package').prefetch_related(
+                f'{field}__card_package__cards',
+                Prefetch(
+                    f'{field}__guardianships_as_ward',
+                    queryset=Guardianship.objects.select_related('guardian__user'),
+                ),
+                Prefetch(
+                    f'{field}__guardianships_as_guardian',
+                    queryset=Guardianship.objects.select_related('ward__user'),
+                ),
+            )
+        return queryset
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['client'] = UserProfileSerializer(instance.client).data
-        if instance.caregiver:
-            representation['caregiver'] = UserProfileSerializer(instance.caregiver).data
+        expand = self.context.get('expand', ())
+        for field in EXPANDABLE_FIELDS:
+            profile = getattr(instance, field)
+            if profile is None:
+                continue
+            if field in expand:
+                representation[field] = UserProfileSerializer(profile).data
+            else:
+                representation[field] = ParticipantSerializer(profile).data
         return representation
 
     def validate(self, data):
@@ -37,7 +91,56 @@ class ServiceSerializer(serializers.ModelSerializer):
         
         # 验证护工角色
         caregiver = data.get('caregiver')
-        if caregiver and not caregiver.user.groups.filter(name='护工').exists():
+        if caregiver and not roles.is_caregiver(caregiver):
             raise serializers.ValidationError("护工必须是护工用户组")
             
         return data
+
+
+class ServicePlanSerializer(serializers.ModelSerializer):
+    client = serializers.PrimaryKeyRelatedField(
+        queryset=UserProfile.objects.all(),
+        required=True
+    )
+    caregiver = serializers.PrimaryKeyRelatedField(
+        queryset=UserProfile.objects.all(),
+        required=False,
+        allow_null=True
+    )
+
+    class Meta:
+        model = ServicePlan
+        fields = '__all__'
+        extra_kwargs = {
+            'created_at': {'read_only': True},
+            'updated_at': {'read_only': True}
+        }
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        for field in EXPANDABLE_FIELDS:
+            profile = getattr(instance, field)
+            if profile is not None:
+                representation[field] = ParticipantSerializer(profile).data
+        return representation
+
+    def validate(self, data):
+        caregiver = data.get('caregiver')
+        if caregiver and not roles.is_caregiver(caregiver):
+            raise serializers.ValidationError("护工必须是护工用户组")
+        return data
+
+
+class ServiceBulkItemSerializer(serializers.ModelSerializer):
+    """批量创建服务的单条数据，被服务人、护工是否存在和护工角色由批量接口统一查询"""
+    client = serializers.IntegerField()
+    caregiver = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = Service
+        fields = ['client', 'caregiver', 'service_type', 'status', 'service_time', 'duration', 'address', 'notes']
+
+    def validate_service_time(self, value):
+        if value < timezone.now():
+            raise serializers.ValidationError("服务时间不能早于当前时间")
+        return value
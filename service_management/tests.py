@@ -0,0 +1,696 @@
+import random
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from user_profile.models import Card, Guardianship
+from . import availability, dispatch, roles
+from .conflicts import find_overlaps
+from .models import CaregiverAvailability, CaregiverShift, Service, ServicePlan
+
+
+class ServiceListQueryCountTests(APITestCase):
+    """服务列表的查询次数不随服务数量增长"""
+
+    def setUp(self):
+        caregivers = Group.objects.create(name='护工')
+        self.user = User.objects.create_user('coordinator', 'coordinator@example.com', 'password', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.clients, self.caregivers = [], []
+        for i in range(10):
+            client = User.objects.create_user(f'client{i}', f'client{i}@example.com').profile
+            Card.objects.create(card_package=client.card_package, name='医保卡', card_type='MEMBER', number=f'62220{i}')
+            self.clients.append(client)
+            caregiver = User.objects.create_user(f'caregiver{i}', f'caregiver{i}@example.com')
+            caregiver.groups.add(caregivers)
+            self.caregivers.append(caregiver.profile)
+        Guardianship.objects.create(guardian=self.user.profile, ward=self.clients[0], relationship='子女')
+
+    def create_services(self, count):
+        now = timezone.now()
+        Service.objects.bulk_create([
+            Service(
+                client=self.clients[i % 10],
+                caregiver=self.caregivers[i % 10] if i % 3 else None,
+                service_type='CLEANING',
+                service_time=now + timedelta(hours=i),
+                address='幸福路 1 号',
+            )
+            for i in range(count)
+        ])
+
+    def list_query_count(self, params=None):
+        """翻完全部页，返回每页的查询次数和全部数据"""
+        params = dict(params or {}, page_size=500)
+        counts, data = set(), []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/service/services/list/', params)
+            self.assertEqual(response.status_code, 200)
+            counts.add(len(queries))
+            data.extend(response.data['data'])
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(len(counts), 1)
+        return counts.pop(), data
+
+    def test_query_count_is_constant(self):
+        self.create_services(10)
+        small, _ = self.list_query_count()
+        self.create_services(990)
+        large, data = self.list_query_count()
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 1000)
+
+        item = next(item for item in data if item['caregiver'])
+        self.assertEqual(set(item['client']), {'id', 'username', 'nickname', 'avatar', 'phone'})
+        self.assertNotIn('card_package', item['caregiver'])
+
+    def test_expand_full_profile(self):
+        self.create_services(10)
+        small, _ = self.list_query_count({'expand': 'client,caregiver'})
+        self.create_services(990)
+        large, data = self.list_query_count({'expand': 'client,caregiver'})
+        self.assertEqual(small, large)
+        client = next(item['client'] for item in data if item['client']['id'] == self.clients[0].pk)
+        self.assertEqual(len(client['card_package']['cards']), 1)
+        self.assertEqual(client['guardians'][0]['guardian']['username'], 'coordinator')
+
+        response = self.client.get('/api/service/services/list/', {'expand': 'cards'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ServiceListFilterTests(APITestCase):
+    """服务列表的筛选、翻页和按用户关系限定可见范围"""
+
+    def setUp(self):
+        Group.objects.create(name='护工')
+        self.guardian = User.objects.create_user('guardian')
+        self.ward = User.objects.create_user('ward').profile
+        self.stranger = User.objects.create_user('stranger').profile
+        self.caregiver = User.objects.create_user('caregiver').profile
+        Guardianship.objects.create(guardian=self.guardian.profile, ward=self.ward, relationship='子女')
+        now = timezone.now()
+        self.services = Service.objects.bulk_create([
+            Service(
+                client=self.ward if i % 2 else self.stranger,
+                caregiver=self.caregiver if i % 3 == 0 else None,
+                service_type='FOOD' if i % 4 == 0 else 'CLEANING',
+                status='COMPLETED' if i < 4 else 'PENDING',
+                service_time=now + timedelta(hours=i),
+                address='幸福路 1 号',
+            )
+            for i in range(12)
+        ])
+
+    def fetch_ids(self, user, params=None):
+        self.client.force_authenticate(user)
+        params, ids = dict(params or {}, page_size=5), []
+        while True:
+            response = self.client.get('/api/service/services/list/', params)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids.extend(item['id'] for item in response.data['data'])
+            if not response.data['next_cursor']:
+                return ids
+            params['cursor'] = response.data['next_cursor']
+
+    def expected(self, condition):
+        return [service.pk for service in self.services if condition(service)]
+
+    def test_scoping(self):
+        self.assertEqual(self.fetch_ids(self.guardian), self.expected(lambda s: s.client_id == self.ward.pk))
+        self.assertEqual(
+            self.fetch_ids(self.caregiver.user), self.expected(lambda s: s.caregiver_id == self.caregiver.pk)
+        )
+        self.assertEqual(
+            self.fetch_ids(self.stranger.user), self.expected(lambda s: s.client_id == self.stranger.pk)
+        )
+
+    def test_filters_and_ordering(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.fetch_ids(staff), self.expected(lambda s: True))
+        self.assertEqual(self.fetch_ids(staff, {'ordering': '-service_time'}), self.expected(lambda s: True)[::-1])
+        self.assertEqual(
+            self.fetch_ids(staff, {'status': 'PENDING', 'service_type': 'CLEANING'}),
+            self.expected(lambda s: s.status == 'PENDING' and s.service_type == 'CLEANING'),
+        )
+        self.assertEqual(
+            self.fetch_ids(staff, {'caregiver': self.caregiver.pk, 'client': self.ward.pk}),
+            self.expected(lambda s: s.caregiver_id == self.caregiver.pk and s.client_id == self.ward.pk),
+        )
+        middle = self.services[5].service_time
+        self.assertEqual(
+            self.fetch_ids(staff, {'service_time_after': middle.isoformat()}),
+            self.expected(lambda s: s.service_time >= middle),
+        )
+        self.client.force_authenticate(staff)
+        for params in ({'client': 'x'}, {'service_time_before': 'tomorrow'}, {'ordering': 'id'}, {'cursor': 'x'}):
+            response = self.client.get('/api/service/services/list/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_detail_of_invisible_service_is_not_found(self):
+        ward_service = next(service for service in self.services if service.client_id == self.ward.pk)
+        stranger_service = next(service for service in self.services if service.client_id == self.stranger.pk)
+        self.client.force_authenticate(self.guardian)
+        response = self.client.get(f'/api/service/services/{ward_service.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['id'], ward_service.pk)
+        for pk in (stranger_service.pk, 0):
+            response = self.client.get(f'/api/service/services/{pk}/')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data['code'], 404)
+
+    def test_date_only_upper_bound_includes_the_whole_day(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        day = timezone.localdate() + timedelta(days=30)
+        service = Service.objects.create(
+            client=self.ward, service_type='FOOD', address='幸福路 1 号',
+            service_time=timezone.make_aware(datetime.combine(day, time(15))),
+        )
+        window = {'service_time_after': day.isoformat(), 'service_time_before': day.isoformat()}
+        self.assertEqual(self.fetch_ids(staff, window), [service.pk])
+        window['service_time_before'] = (day - timedelta(days=1)).isoformat()
+        self.assertEqual(self.fetch_ids(staff, window), [])
+
+
+class FreeCaregiverTests(APITestCase):
+    """空闲护工查询：排班减去已有服务，服务变化后增量更新位图"""
+
+    def setUp(self):
+        caregivers = Group.objects.create(name='护工')
+        self.client.force_authenticate(User.objects.create_user('coordinator', is_staff=True))
+        self.resident = User.objects.create_user('resident').profile
+        self.caregivers = []
+        for i in range(3):
+            user = User.objects.create_user(f'caregiver{i}')
+            user.groups.add(caregivers)
+            self.caregivers.append(user.profile)
+        # 下周一
+        today = timezone.localdate()
+        self.day = today + timedelta(days=7 - today.weekday())
+        for caregiver in self.caregivers[:2]:
+            CaregiverShift.objects.create(caregiver=caregiver, weekday=0, start_time=time(8), end_time=time(12))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+
+    def free(self, start, end):
+        response = self.client.get('/api/service/services/caregivers/free/', {
+            'start': start.isoformat(), 'end': end.isoformat()
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['id'] for item in response.data['data']]
+
+    def test_bitmap_helpers(self):
+        self.assertEqual(availability.slot_range(0, 15), 1)
+        self.assertEqual(availability.slot_range(10, 20), 0b11)
+        self.assertEqual(availability.slot_range(23 * 60, 25 * 60), 0b1111 << 92)
+        am, pm = availability.split(availability.slot_range(11 * 60, 13 * 60))
+        self.assertEqual(availability.join(am, pm), availability.slot_range(11 * 60, 13 * 60))
+        self.assertEqual(am.bit_length(), availability.HALF_SLOTS)
+
+    def test_free_caregivers_follow_services(self):
+        first, second, _ = self.caregivers
+        self.assertEqual(self.free(self.at(9, 30), self.at(10)), [first.pk, second.pk])
+        self.assertEqual(self.free(self.at(11, 30), self.at(12, 30)), [])
+
+        service = Service.objects.create(
+            client=self.resident, caregiver=first, service_type='CLEANING', service_time=self.at(9), address='幸福路 1 号'
+        )
+        self.assertEqual(self.free(self.at(9, 30), self.at(10)), [second.pk])
+        self.assertEqual(self.free(self.at(10), self.at(11)), [first.pk, second.pk])
+
+        service.service_time = self.at(10)
+        service.save()
+        self.assertEqual(self.free(self.at(9, 30), self.at(10)), [first.pk, second.pk])
+        self.assertEqual(self.free(self.at(10), self.at(11)), [second.pk])
+
+        service.status = 'CANCELLED'
+        service.save()
+        self.assertEqual(self.free(self.at(10), self.at(11)), [first.pk, second.pk])
+
+        CaregiverShift.objects.filter(caregiver=second).delete()
+        self.assertFalse(CaregiverAvailability.objects.filter(caregiver=second).exists())
+        self.assertEqual(self.free(self.at(10), self.at(11)), [first.pk])
+
+    def test_unaligned_shift_boundaries_only_count_covered_slots(self):
+        self.assertEqual(availability.covered_slot_range(10, 20), 0)
+        self.assertEqual(availability.covered_slot_range(10, 50), 0b11 << 1)
+        self.assertEqual(availability.shift_mask([(time(9, 10), time(9, 50))]), 0b11 << 37)
+
+        third = self.caregivers[2]
+        CaregiverShift.objects.create(caregiver=third, weekday=0, start_time=time(9, 10), end_time=time(11, 50))
+        # 09:00–09:15 与 11:45–12:00 只被部分覆盖，不算空闲
+        self.assertEqual(self.free(self.at(9), self.at(9, 10)), [self.caregivers[0].pk, self.caregivers[1].pk])
+        self.assertNotIn(third.pk, self.free(self.at(11, 45), self.at(11, 50)))
+        self.assertIn(third.pk, self.free(self.at(9, 15), self.at(11, 45)))
+
+    def test_invalid_window(self):
+        url = '/api/service/services/caregivers/free/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': self.at(10), 'end': self.at(9)}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'x', 'end': self.at(9)}).status_code, 400)
+
+
+class CaregiverRoleCacheTests(TestCase):
+    """护工角色缓存随用户组成员变化失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='护工')
+        self.other_group = Group.objects.create(name='志愿者')
+        self.user = User.objects.create_user('caregiver')
+        self.profile = self.user.profile
+
+    def assertCaregiver(self, expected):
+        self.assertEqual(roles.is_caregiver(self.profile), expected)
+        # 第二次判断命中缓存
+        with self.assertNumQueries(0):
+            self.assertEqual(roles.is_caregiver(self.profile), expected)
+
+    def test_user_side_changes(self):
+        self.assertCaregiver(False)
+        self.user.groups.add(self.group)
+        self.assertCaregiver(True)
+        self.user.groups.remove(self.group)
+        self.assertCaregiver(False)
+        self.user.groups.add(self.group, self.other_group)
+        self.assertCaregiver(True)
+        self.user.groups.clear()
+        self.assertCaregiver(False)
+        self.user.groups.set([self.group])
+        self.assertCaregiver(True)
+
+    def test_group_side_changes(self):
+        self.assertCaregiver(False)
+        self.group.user_set.add(self.user)
+        self.assertCaregiver(True)
+        self.group.user_set.remove(self.user)
+        self.assertCaregiver(False)
+        self.group.user_set.add(self.user)
+        self.assertCaregiver(True)
+        self.group.user_set.clear()
+        self.assertCaregiver(False)
+
+    def test_group_rename_and_delete(self):
+        self.user.groups.add(self.group)
+        self.assertCaregiver(True)
+        self.group.name = '前护工'
+        self.group.save()
+        self.assertCaregiver(False)
+
+        self.other_group.name = '护工'
+        self.other_group.save()
+        self.user.groups.add(self.other_group)
+        self.assertCaregiver(True)
+        self.other_group.delete()
+        self.assertCaregiver(False)
+
+
+class DispatchPlanTests(SimpleTestCase):
+    """派单规划：时间冲突、工作量均衡和同类服务偏好（不访问数据库）"""
+
+    def test_conflicts_with_existing_commitments(self):
+        # 护工 1 偏好送餐，但 [0, 100) 已有服务，只能分给护工 2；紧接着的服务不算冲突
+        assignments, unassigned = dispatch.plan(
+            [(10, 50, 80, 'FOOD'), (11, 100, 130, 'FOOD')],
+            [1, 2],
+            commitments={1: [(0, 100)]},
+            history={1: {'FOOD': 10}},
+            weight=5,
+        )
+        self.assertEqual(assignments, {10: 2, 11: 1})
+        self.assertEqual(unassigned, [])
+
+    def test_balances_workload_with_id_tie_break(self):
+        services = [(i, i * 100, i * 100 + 50, 'CLEANING') for i in range(1, 5)]
+        assignments, _ = dispatch.plan(services, [3, 1, 2], weight=0)
+        self.assertEqual(assignments, {1: 1, 2: 2, 3: 3, 4: 1})
+
+        # 已有服务计入工作量
+        assignments, _ = dispatch.plan(services, [3, 1, 2], commitments={1: [(0, 10), (20, 30)]}, weight=0)
+        self.assertEqual(assignments, {1: 2, 2: 3, 3: 2, 4: 3})
+
+    def test_prefers_caregivers_with_service_type_experience(self):
+        history = {1: {'FOOD': 4}, 2: {'CLEANING': 3, 'FOOD': 1}}
+        assignments, _ = dispatch.plan(
+            [(1, 0, 50, 'CLEANING'), (2, 100, 150, 'FOOD')], [1, 2], history=history, weight=2
+        )
+        self.assertEqual(assignments, {1: 2, 2: 1})
+
+        # 偏好加分不足以抵消工作量差距
+        commitments = {2: [(1000, 1010), (2000, 2010), (3000, 3010)]}
+        assignments, _ = dispatch.plan(
+            [(1, 0, 50, 'CLEANING')], [1, 2], commitments=commitments, history=history, weight=2
+        )
+        self.assertEqual(assignments, {1: 1})
+
+    def test_unassigned_when_nobody_is_free(self):
+        services = [(1, 0, 60, 'FOOD'), (2, 30, 90, 'FOOD'), (3, 60, 120, 'FOOD')]
+        assignments, unassigned = dispatch.plan(services, [7])
+        self.assertEqual(assignments, {1: 7, 3: 7})
+        self.assertEqual(unassigned, [2])
+
+        self.assertEqual(dispatch.plan(services, []), ({}, [1, 2, 3]))
+
+
+class ServiceConflictTests(APITestCase):
+    """同一护工的服务时间不能重叠"""
+
+    def setUp(self):
+        caregivers = Group.objects.create(name='护工')
+        self.user = User.objects.create_user('coordinator', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.resident = User.objects.create_user('resident').profile
+        caregiver = User.objects.create_user('caregiver')
+        caregiver.groups.add(caregivers)
+        self.caregiver = caregiver.profile
+        self.start = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+
+    def book(self, minutes, duration=60, **kwargs):
+        return Service.objects.create(
+            client=self.resident, caregiver=self.caregiver, service_type='CLEANING',
+            service_time=self.start + timedelta(minutes=minutes), duration=duration, address='幸福路 1 号', **kwargs
+        )
+
+    def test_overlapping_bookings_are_rejected(self):
+        service = self.book(0, duration=90)
+        self.book(90)
+        self.book(-60)
+        with self.assertRaises(ValidationError):
+            self.book(30)
+        with self.assertRaises(ValidationError):
+            self.book(-30, duration=24 * 60)
+        # 已取消的服务不占用护工时间
+        self.book(30, status='CANCELLED')
+
+        # 修改时排除自身
+        service.duration = 60
+        service.save()
+        service.duration = 120
+        with self.assertRaises(ValidationError):
+            service.save()
+
+        response = self.client.post('/api/service/services/', {
+            'client': self.resident.pk,
+            'caregiver': self.caregiver.pk,
+            'service_type': 'CLEANING',
+            'service_time': (self.start + timedelta(minutes=100)).isoformat(),
+            'duration': 30,
+            'address': '幸福路 1 号',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Service.objects.filter(status='PENDING').count(), 3)
+
+    def test_sweep_matches_pairwise_comparison(self):
+        rng = random.Random(7)
+        rows = []
+        for pk in range(300):
+            start = rng.randrange(0, 24 * 60 * 3)
+            rows.append((pk, rng.randrange(5), start, start + rng.randrange(15, 180)))
+        rows.sort(key=lambda row: (row[1], row[2], row[0]))
+        found = {(first[0], second[0]) for _, first, second in find_overlaps(rows)}
+        expected = {
+            (a[0], b[0])
+            for i, a in enumerate(rows) for b in rows[i + 1:]
+            if a[1] == b[1] and a[2] < b[3] and b[2] < a[3]
+        }
+        self.assertEqual(found, expected)
+
+
+class ServicePlanTests(APITestCase):
+    """周期服务计划按需展开，只有修改过的服务写入数据库"""
+
+    def setUp(self):
+        caregivers = Group.objects.create(name='护工')
+        self.client.force_authenticate(User.objects.create_user('coordinator', is_staff=True))
+        self.resident = User.objects.create_user('resident').profile
+        caregiver = User.objects.create_user('caregiver')
+        caregiver.groups.add(caregivers)
+        self.caregiver = caregiver.profile
+        # 下周一 8:00
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.start = self.at(self.monday, 8)
+
+    def at(self, day, hour):
+        return timezone.make_aware(datetime.combine(day, time(hour)))
+
+    def plan(self, **kwargs):
+        fields = dict(client=self.resident, service_type='FOOD', address='幸福路 1 号', start_time=self.start)
+        fields.update(kwargs)
+        return ServicePlan.objects.create(**fields)
+
+    def test_occurrences(self):
+        daily = self.plan(interval=2, end_date=self.monday + timedelta(days=8))
+        self.assertEqual(
+            list(daily.occurrences()),
+            [self.at(self.monday + timedelta(days=i), 8) for i in (0, 2, 4, 6, 8)],
+        )
+        # 从窗口所在的周期开始展开
+        self.assertEqual(
+            list(daily.occurrences(self.at(self.monday + timedelta(days=3), 9), self.at(self.monday + timedelta(days=7), 0))),
+            [self.at(self.monday + timedelta(days=4), 8), self.at(self.monday + timedelta(days=6), 8)],
+        )
+
+        weekly = self.plan(frequency='WEEKLY', interval=2, weekdays='4,0')
+        self.assertEqual(weekly.weekdays, '0,4')
+        window = list(weekly.occurrences(self.at(self.monday + timedelta(days=1), 0), self.at(self.monday + timedelta(days=29), 0)))
+        self.assertEqual(window, [self.at(self.monday + timedelta(days=i), 8) for i in (4, 14, 18, 28)])
+
+        with self.assertRaises(ValidationError):
+            self.plan(frequency='WEEKLY', weekdays='7')
+
+    def fetch(self, params):
+        items, cursor = [], None
+        while True:
+            query = dict(params, include_plans='true', page_size=3)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/service/services/list/', query)
+            self.assertEqual(response.status_code, 200, response.data)
+            items.extend(response.data['data'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return items
+
+    def test_list_merges_materialized_and_virtual(self):
+        plan = self.plan()
+        single = Service.objects.create(
+            client=self.resident, service_type='CLEANING', service_time=self.at(self.monday + timedelta(days=1), 8),
+            address='幸福路 1 号'
+        )
+        response = self.client.post('/api/service/plans/occurrences/', {
+            'plan': plan.pk,
+            'occurrence_time': self.at(self.monday + timedelta(days=2), 8).isoformat(),
+            'caregiver': self.caregiver.pk,
+            'notes': '饭后服药',
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        materialized = response.data['data']['id']
+        self.assertEqual(Service.objects.filter(plan=plan).count(), 1)
+
+        window = {
+            'service_time_after': self.at(self.monday, 0).isoformat(),
+            'service_time_before': self.at(self.monday + timedelta(days=4), 23).isoformat(),
+        }
+        items = self.fetch(window)
+        self.assertEqual(
+            [(item['id'], item['service_time'][:10]) for item in items],
+            [
+                (None, str(self.monday)),
+                (single.pk, str(self.monday + timedelta(days=1))),
+                (None, str(self.monday + timedelta(days=1))),
+                (materialized, str(self.monday + timedelta(days=2))),
+                (None, str(self.monday + timedelta(days=3))),
+                (None, str(self.monday + timedelta(days=4))),
+            ],
+        )
+        self.assertEqual(items[3]['caregiver']['id'], self.caregiver.pk)
+        self.assertEqual({item['plan'] for item in items if item['id'] != single.pk}, {plan.pk})
+
+        # 再次修改同一次服务不会重复写入
+        response = self.client.post('/api/service/plans/occurrences/', {
+            'plan': plan.pk,
+            'occurrence_time': self.at(self.monday + timedelta(days=2), 8).isoformat(),
+            'status': 'COMPLETED',
+        })
+        self.assertEqual(response.data['data']['id'], materialized)
+        self.assertEqual(len(self.fetch(dict(window, status='COMPLETED'))), 1)
+
+        response = self.client.post('/api/service/plans/occurrences/', {
+            'plan': plan.pk, 'occurrence_time': self.at(self.monday, 9).isoformat()
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_keeps_each_occurrence_on_its_own_plan(self):
+        other = User.objects.create_user('neighbour').profile
+        food = self.plan()
+        cleaning = self.plan(
+            client=other, service_type='CLEANING', address='幸福路 2 号', start_time=self.at(self.monday, 9)
+        )
+        written = cleaning.build_occurrence(self.at(self.monday + timedelta(days=1), 9))
+        written.save()
+        window = {
+            'service_time_after': self.at(self.monday, 0).isoformat(),
+            'service_time_before': self.at(self.monday + timedelta(days=1), 23).isoformat(),
+        }
+        items = self.fetch(window)
+        self.assertEqual(
+            [
+                (item['id'], item['plan'], item['service_type'], item['address'], item['service_time'][11:16])
+                for item in items
+            ],
+            [
+                (None, food.pk, 'FOOD', '幸福路 1 号', '08:00'),
+                (None, cleaning.pk, 'CLEANING', '幸福路 2 号', '09:00'),
+                (None, food.pk, 'FOOD', '幸福路 1 号', '08:00'),
+                (written.pk, cleaning.pk, 'CLEANING', '幸福路 2 号', '09:00'),
+            ],
+        )
+        self.assertEqual([item['client']['id'] for item in items], [self.resident.pk, other.pk] * 2)
+
+    def test_concurrent_first_edit_updates_written_occurrence(self):
+        plan = self.plan()
+        moment = self.at(self.monday + timedelta(days=1), 8)
+        # 另一个请求已写入这次服务，但本次请求的查询发生在其提交之前
+        written = plan.build_occurrence(moment)
+        written.save()
+        first = QuerySet.first
+        missed = []
+
+        def stale_first(queryset):
+            if queryset.model is Service and not missed:
+                missed.append(queryset)
+                return None
+            return first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', autospec=True, side_effect=stale_first):
+            response = self.client.post('/api/service/plans/occurrences/', {
+                'plan': plan.pk, 'occurrence_time': moment.isoformat(), 'notes': '饭后服药',
+            })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(missed), 1)
+        self.assertEqual(response.data['data']['id'], written.pk)
+        self.assertEqual(Service.objects.get(plan=plan, occurrence_time=moment).notes, '饭后服药')
+
+class ServiceBulkTests(APITestCase):
+    """批量创建服务和批量修改状态：查询次数固定，按条返回结果"""
+
+    def setUp(self):
+        caregivers = Group.objects.create(name='护工')
+        self.client.force_authenticate(User.objects.create_user('coordinator', is_staff=True))
+        self.residents = [User.objects.create_user(f'resident{i}').profile for i in range(3)]
+        self.caregivers = []
+        for i in range(3):
+            user = User.objects.create_user(f'caregiver{i}')
+            user.groups.add(caregivers)
+            self.caregivers.append(user.profile)
+        self.start = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+
+    def item(self, hours, caregiver=None, **kwargs):
+        data = {
+            'client': self.residents[0].pk,
+            'service_type': 'CLEANING',
+            'service_time': (self.start + timedelta(hours=hours)).isoformat(),
+            'address': '幸福路 1 号',
+        }
+        if caregiver is not None:
+            data['caregiver'] = caregiver.pk
+        data.update(kwargs)
+        return data
+
+    def create(self, items, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/service/services/bulk/', dict(kwargs, items=items), format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data'], len(queries)
+
+    def test_bulk_create(self):
+        Service.objects.create(
+            client=self.residents[1], caregiver=self.caregivers[0], service_type='CLEANING',
+            service_time=self.start, address='幸福路 1 号'
+        )
+        items = [self.item(hours, self.caregivers[1 + hours % 2]) for hours in range(2, 42)]
+        items += [
+            self.item(0, self.caregivers[0]),
+            self.item(100, self.caregivers[2], duration=90),
+            self.item(101, self.caregivers[2]),
+            self.item(102, self.residents[1]),
+            self.item(103, client=99999),
+            self.item(-48),
+        ]
+        data, queries = self.create(items)
+        self.assertEqual(data['created'], 41)
+        failed = [result['index'] for result in data['results'] if not result['success']]
+        self.assertEqual(failed, [40, 42, 43, 44, 45])
+        self.assertIn('service_time', data['results'][42]['errors'])
+        self.assertEqual(Service.objects.count(), 42)
+
+        # SQLite 每条 INSERT 的参数个数有限，比较批量大小相近的两次请求
+        _, more_queries = self.create([self.item(200 + hours, self.caregivers[hours % 3]) for hours in range(60)])
+        self.assertEqual(queries, more_queries)
+
+        data, _ = self.create([self.item(300, self.caregivers[0]), self.item(300, self.caregivers[0])], all_or_nothing=True)
+        self.assertEqual(data['created'], 0)
+        self.assertFalse(any(result['success'] for result in data['results']))
+        self.assertEqual(Service.objects.count(), 102)
+
+    def test_bulk_create_checks_caregiver_role(self):
+        items = [
+            self.item(0, self.caregivers[0]),
+            self.item(1, self.residents[1]),
+            dict(self.item(2), caregiver=99999),
+        ]
+        data, _ = self.create(items)
+        self.assertEqual([result['success'] for result in data['results']], [True, False, False])
+        self.assertEqual(data['results'][1]['errors'], {'caregiver': ['护工必须是护工用户组']})
+        self.assertEqual(data['results'][2]['errors'], {'caregiver': ['护工不存在']})
+
+        # 批量创建在同一条查询中判断护工角色，用户组变化立即生效
+        self.caregivers[0].user.groups.clear()
+        self.residents[1].user.groups.add(Group.objects.get(name='护工'))
+        data, _ = self.create([self.item(5, self.caregivers[0]), self.item(6, self.residents[1])])
+        self.assertEqual([result['success'] for result in data['results']], [False, True])
+        self.assertEqual(data['results'][0]['errors'], {'caregiver': ['护工必须是护工用户组']})
+
+    def transition(self, ids, target, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/service/services/bulk/status/', dict(kwargs, ids=ids, status=target), format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data'], len(queries)
+
+    def test_bulk_status_transitions(self):
+        self.create([self.item(hours, self.caregivers[hours % 3]) for hours in range(30)])
+        ids = list(Service.objects.order_by('id').values_list('id', flat=True))
+
+        data, queries = self.transition(ids[:10], 'IN_PROGRESS')
+        self.assertEqual(data['updated'], 10)
+        data, more_queries = self.transition(ids[10:30], 'CANCELLED')
+        self.assertEqual(data['updated'], 20)
+        self.assertEqual(queries, more_queries)
+
+        data, _ = self.transition(ids[:12] + [99999], 'COMPLETED')
+        self.assertEqual(data['updated'], 10)
+        self.assertEqual([result['success'] for result in data['results']], [True] * 10 + [False] * 3)
+
+        data, _ = self.transition(ids[:2], 'PENDING', all_or_nothing=True)
+        self.assertEqual(data['updated'], 0)
+        self.assertEqual(
+            Service.objects.values('status').annotate(n=Count('id')).order_by('status').count(), 2
+        )
+        response = self.client.post('/api/service/services/bulk/status/', {'ids': ids, 'status': 'DONE'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -1,5 +1,9 @@
 from django.urls import path
-from .views import ServiceListView, ServiceCreateView, ServiceDetailView, ServiceUpdateView, ServiceDeleteView
+from .views import (
+    ServiceListView, ServiceCreateView, ServiceDetailView, ServiceUpdateView, ServiceDeleteView, ServiceDispatchView,
+    FreeCaregiverListView, ServicePlanCreateView, ServicePlanListView, ServicePlanUpdateView, ServicePlanDeleteView,
+    ServicePlanOccurrenceView, ServiceBulkCreateView, ServiceBulkStatusView
+)
 
 urlpatterns = [
     path('services/', ServiceCreateView.as_view(), name='service-create'),
@@ -7,4 +11,13 @@ urlpatterns = [
     path('services/<int:id>/', ServiceDetailView.as_view(), name='service-detail'),
     path('services/update/', ServiceUpdateView.as_view(), name='service-update'),
     path('services/delete/', ServiceDeleteView.as_view(), name='service-delete'),
+    path('services/bulk/', ServiceBulkCreateView.as_view(), name='service-bulk-create'),
+    path('services/bulk/status/', ServiceBulkStatusView.as_view(), name='service-bulk-status'),
+    path('services/dispatch/', ServiceDispatchView.as_view(), name='service-dispatch'),
+    path('plans/', ServicePlanCreateView.as_view(), name='service-plan-create'),
+    path('plans/list/', ServicePlanListView.as_view(), name='service-plan-list'),
+    path('plans/update/', ServicePlanUpdateView.as_view(), name='service-plan-update'),
+    path('plans/delete/', ServicePlanDeleteView.as_view(), name='service-plan-delete'),
+    path('plans/occurrences/', ServicePlanOccurrenceView.as_view(), name='service-plan-occurrence'),
+    path('services/caregivers/free/', FreeCaregiverListView.as_view(), name='service-free-caregivers'),
 ]
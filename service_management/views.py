@@ -1,37 +1,176 @@
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Service
-from .serializers import ServiceSerializer
+from . import bulk
+from .availability import free_caregivers
+from .dispatch import dispatch_pending
+from .models import Service, ServicePlan
+from .recurrence import is_occurrence, merged_page
+from .serializers import EXPANDABLE_FIELDS, ParticipantSerializer, ServicePlanSerializer, ServiceSerializer
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from user_profile.models import Guardianship, UserProfile
+from yanglao.pagination import CursorPaginator, InvalidCursor
+
+def parse_expand(request):
+    """解析 expand 参数（逗号分隔），返回需要展开为完整用户资料的字段"""
+    expand = {field for field in request.query_params.get('expand', '').split(',') if field}
+    invalid = expand.difference(EXPANDABLE_FIELDS)
+    if invalid:
+        raise ValidationError(f"无效的 expand 参数。有效值为: {', '.join(EXPANDABLE_FIELDS)}")
+    return expand
+
+def parse_moment(name, value, default_time):
+    """解析 ISO 格式的日期或时间参数，只给日期时取当天的开始或结束"""
+    # parse_datetime 也接受纯日期（按零点），因此先按日期解析
+    day = parse_date(value)
+    moment = datetime.combine(day, default_time) if day else parse_datetime(value)
+    if moment is None:
+        raise ValidationError(f"{name} 参数格式错误")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def parse_id(name, value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{name} 参数必须是整数")
+
+def parse_bool(value):
+    return str(value).lower() in ('1', 'true')
+
+def visible_services(queryset, user):
+    """
+    限定为当前用户可见的服务：自己是被服务人或护工，或被服务人是自己的被监护人
+    用户资料和被监护人以子查询形式并入同一条 SQL；管理员可见全部服务
+    """
+    if user.is_staff:
+        return queryset
+    profile = UserProfile.objects.filter(user_id=user.pk).values('pk')
+    wards = Guardianship.objects.filter(guardian__user_id=user.pk).values('ward_id')
+    return queryset.filter(Q(client_id__in=profile) | Q(caregiver_id__in=profile) | Q(client_id__in=wards))
 
 class ServiceListView(generics.ListAPIView):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 默认按服务时间升序翻页，ordering=-service_time 时倒序
+    cursor_paginator = CursorPaginator(ordering=('service_time', 'id'), page_size=50, max_page_size=500)
+    reverse_cursor_paginator = CursorPaginator(ordering=('-service_time', '-id'), page_size=50, max_page_size=500)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = parse_expand(self.request)
+        return context
 
     def get_queryset(self):
-        queryset = Service.objects.all()
-        status_param = self.request.query_params.get('status', None)
+        """
+        支持的筛选参数：status、service_type、client、caregiver（用户资料 ID）、
+        service_time_after、service_time_before（ISO 格式的日期或时间）
+        include_plans=true 时一并返回周期服务计划中尚未写入的服务（id 为空），只支持按服务时间升序
+        """
+        params = self.request.query_params
+        queryset = visible_services(Service.objects.all(), self.request.user)
+        queryset = ServiceSerializer.setup_eager_loading(queryset, parse_expand(self.request))
+        status_param = params.get('status', None)
         
         if status_param:
             valid_statuses = [status[0] for status in Service.STATUS_CHOICES]
             if status_param not in valid_statuses:
                 raise ValidationError(f"无效的状态值。有效值为: {', '.join(valid_statuses)}")
             queryset = queryset.filter(status=status_param)
-        
+
+        service_type = params.get('service_type')
+        if service_type:
+            valid_types = [choice[0] for choice in Service.SERVICE_TYPES]
+            if service_type not in valid_types:
+                raise ValidationError(f"无效的服务类型。有效值为: {', '.join(valid_types)}")
+            queryset = queryset.filter(service_type=service_type)
+
+        for name in ('client', 'caregiver'):
+            if params.get(name):
+                queryset = queryset.filter(**{f'{name}_id': parse_id(name, params[name])})
+
+        after, before = self.get_time_window()
+        if after:
+            queryset = queryset.filter(service_time__gte=after)
+        if before:
+            queryset = queryset.filter(service_time__lte=before)
         return queryset
 
+    def get_time_window(self):
+        params = self.request.query_params
+        after = before = None
+        if params.get('service_time_after'):
+            after = parse_moment('service_time_after', params['service_time_after'], time.min)
+        if params.get('service_time_before'):
+            before = parse_moment('service_time_before', params['service_time_before'], time.max)
+        return after, before
+
+    def get_plans(self):
+        """与筛选条件对应的周期服务计划，计划实例的状态都是待处理"""
+        params = self.request.query_params
+        if params.get('status') and params['status'] != 'PENDING':
+            return []
+        plans = visible_services(ServicePlan.objects.all(), self.request.user)
+        plans = ServiceSerializer.setup_eager_loading(plans, parse_expand(self.request))
+        if params.get('service_type'):
+            plans = plans.filter(service_type=params['service_type'])
+        for name in ('client', 'caregiver'):
+            if params.get(name):
+                plans = plans.filter(**{f'{name}_id': parse_id(name, params[name])})
+        after, before = self.get_time_window()
+        if after:
+            plans = plans.filter(Q(end_date__isnull=True) | Q(end_date__gte=timezone.localtime(after).date()))
+        if before:
+            plans = plans.filter(start_time__lte=before)
+        return list(plans)
+
+    def get_paginator(self):
+        ordering = self.request.query_params.get('ordering', 'service_time')
+        if ordering == 'service_time':
+            return self.cursor_paginator
+        if ordering == '-service_time':
+            return self.reverse_cursor_paginator
+        raise ValidationError("ordering 参数只能是 service_time 或 -service_time")
+
     def list(self, request, *args, **kwargs):
         try:
             queryset = self.filter_queryset(self.get_queryset())
-            serializer = self.get_serializer(queryset, many=True)
+            paginator = self.get_paginator()
+            if parse_bool(request.query_params.get('include_plans', '')):
+                if paginator is not self.cursor_paginator:
+                    raise ValidationError("include_plans 只支持按服务时间升序排列")
+                after, before = self.get_time_window()
+                services, next_cursor = merged_page(
+                    queryset,
+                    self.get_plans(),
+                    paginator.get_page_size(request),
+                    cursor=request.query_params.get(paginator.cursor_query_param),
+                    start=after,
+                    end=before + timedelta(microseconds=1) if before else None,
+                )
+            else:
+                services, next_cursor = paginator.paginate(queryset, request)
+            serializer = self.get_serializer(services, many=True)
             return Response({
                 "code": 200,
                 "message": "获取服务列表成功",
-                "data": serializer.data
+                "data": serializer.data,
+                "next_cursor": next_cursor
             })
+        except InvalidCursor as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
         except ValidationError as e:
             return Response({
                 "code": 400,
@@ -153,6 +292,15 @@ class ServiceDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = parse_expand(self.request)
+        return context
+
+    def get_queryset(self):
+        queryset = visible_services(Service.objects.all(), self.request.user)
+        return ServiceSerializer.setup_eager_loading(queryset, parse_expand(self.request))
+
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
@@ -162,7 +310,14 @@ class ServiceDetailView(generics.RetrieveAPIView):
                 "message": "获取服务详情成功",
                 "data": serializer.data
             })
-        except Service.DoesNotExist:
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except (Service.DoesNotExist, Http404):
+            # 不可见的服务与不存在的服务一样返回 404
             return Response({
                 "code": 404,
                 "message": "未找到该服务",
@@ -175,3 +330,367 @@ class ServiceDetailView(generics.RetrieveAPIView):
                 "data": None
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ServiceDispatchView(APIView):
+    """为时间范围内未指派护工的待处理服务自动派单（仅管理员）"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        try:
+            try:
+                horizon_hours = int(request.data.get('horizon_hours', 24))
+            except (TypeError, ValueError):
+                horizon_hours = 0
+            if not 0 < horizon_hours <= 24 * 31:
+                return Response({
+                    "code": 400,
+                    "message": "horizon_hours 必须是 1 到 744 之间的整数",
+                    "data": None
+                }, status=status.HTTP_400_BAD_REQUEST)
+            dry_run = parse_bool(request.data.get('dry_run', ''))
+            assignments, unassigned = dispatch_pending(horizon_hours=horizon_hours, dry_run=dry_run)
+            return Response({
+                "code": 200,
+                "message": "派单规划完成" if dry_run else "派单完成",
+                "data": {
+                    "assignments": [
+                        {"service": service_id, "caregiver": caregiver}
+                        for service_id, caregiver in assignments.items()
+                    ],
+                    "unassigned": unassigned
+                }
+            })
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"派单失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class FreeCaregiverListView(APIView):
+    """查询在 [start, end) 整段时间内空闲的护工（仅管理员）"""
+    permission_classes = [permissions.IsAdminUser]
+    # 单次查询的最长时间范围
+    max_window = timedelta(days=7)
+
+    def get(self, request):
+        try:
+            params = request.query_params
+            if not params.get('start') or not params.get('end'):
+                raise ValidationError("start 和 end 参数不能为空")
+            start = parse_moment('start', params['start'], time.min)
+            end = parse_moment('end', params['end'], time.min)
+            if end <= start:
+                raise ValidationError("end 必须晚于 start")
+            if end - start > self.max_window:
+                raise ValidationError("查询的时间范围不能超过 7 天")
+            caregivers = UserProfile.objects.filter(pk__in=free_caregivers(start, end)).select_related('user')
+            return Response({
+                "code": 200,
+                "message": "获取空闲护工成功",
+                "data": ParticipantSerializer(caregivers.order_by('id'), many=True).data
+            })
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"获取空闲护工失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServicePlanCreateView(generics.CreateAPIView):
+    queryset = ServicePlan.objects.all()
+    serializer_class = ServicePlanSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        try:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response({
+                "code": 200,
+                "message": "周期服务计划创建成功",
+                "data": serializer.data
+            })
+        except serializers.ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{e.detail}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"服务器内部错误：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServicePlanListView(generics.ListAPIView):
+    serializer_class = ServicePlanSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    cursor_paginator = CursorPaginator(ordering=('-created_at', '-id'), page_size=20, max_page_size=100)
+
+    def get_queryset(self):
+        queryset = ServicePlan.objects.select_related('client__user', 'caregiver__user')
+        return visible_services(queryset, self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            plans, next_cursor = self.cursor_paginator.paginate(self.get_queryset(), request)
+            return Response({
+                "code": 200,
+                "message": "获取周期服务计划成功",
+                "data": self.get_serializer(plans, many=True).data,
+                "next_cursor": next_cursor
+            })
+        except InvalidCursor as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"获取周期服务计划失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServicePlanUpdateView(APIView):
+    """修改周期服务计划，只影响尚未写入的服务，已写入的服务保持不变"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            id = request.data.get('id')
+            if not id:
+                return Response({
+                    "code": 400,
+                    "message": "缺少计划ID",
+                    "data": None
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            instance = visible_services(ServicePlan.objects.all(), request.user).get(id=id)
+            serializer = ServicePlanSerializer(instance, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response({
+                "code": 200,
+                "message": "周期服务计划更新成功",
+                "data": serializer.data
+            })
+        except ServicePlan.DoesNotExist:
+            return Response({
+                "code": 404,
+                "message": "未找到该周期服务计划",
+                "data": None
+            }, status=status.HTTP_404_NOT_FOUND)
+        except serializers.ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{e.detail}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"服务器内部错误：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServicePlanDeleteView(APIView):
+    """删除周期服务计划，已写入的服务保留"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            id = request.data.get('id')
+            if not id:
+                return Response({
+                    "code": 400,
+                    "message": "缺少计划ID",
+                    "data": None
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            visible_services(ServicePlan.objects.all(), request.user).get(id=id).delete()
+            return Response({
+                "code": 200,
+                "message": "周期服务计划删除成功",
+                "data": None
+            })
+        except ServicePlan.DoesNotExist:
+            return Response({
+                "code": 404,
+                "message": "未找到该周期服务计划",
+                "data": None
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"服务器内部错误：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServicePlanOccurrenceView(APIView):
+    """
+    指派、修改或完成周期服务计划中的一次服务
+    请求参数：plan（计划 ID）、occurrence_time（计划的服务时间），其余字段同服务更新接口；
+    这次服务第一次修改时写入服务表，之后再修改同一条记录
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def save_occurrence(self, plan, moment, data):
+        """写入或更新计划的一次服务，锁定计划行使同一计划的并发修改依次执行"""
+        with transaction.atomic():
+            list(ServicePlan.objects.select_for_update().filter(pk=plan.pk).values_list('pk'))
+            instance = Service.objects.filter(plan=plan, occurrence_time=moment).first()
+            if instance is None:
+                instance = plan.build_occurrence(moment)
+            serializer = ServiceSerializer(instance, data=data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return serializer
+
+    def post(self, request):
+        try:
+            plan = visible_services(ServicePlan.objects.all(), request.user).select_related(
+                'client', 'caregiver'
+            ).get(id=parse_id('plan', request.data.get('plan')))
+            if not request.data.get('occurrence_time'):
+                raise ValidationError("occurrence_time 参数不能为空")
+            moment = parse_moment('occurrence_time', request.data['occurrence_time'], time.min)
+            if not is_occurrence(plan, moment):
+                raise ValidationError("occurrence_time 不是该计划的服务时间")
+
+            try:
+                serializer = self.save_occurrence(plan, moment, request.data)
+            except (IntegrityError, ValidationError):
+                # 并发的第一次修改已写入这次服务（唯一约束冲突），重新读取后在该记录上更新
+                if not Service.objects.filter(plan=plan, occurrence_time=moment).exists():
+                    raise
+                serializer = self.save_occurrence(plan, moment, request.data)
+            return Response({
+                "code": 200,
+                "message": "服务更新成功",
+                "data": serializer.data
+            })
+        except ServicePlan.DoesNotExist:
+            return Response({
+                "code": 404,
+                "message": "未找到该周期服务计划",
+                "data": None
+            }, status=status.HTTP_404_NOT_FOUND)
+        except serializers.ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{e.detail}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": f"数据验证失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"服务器内部错误：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServiceBulkCreateView(APIView):
+    """
+    批量创建服务（仅管理员）
+    请求参数：items（服务数据列表，字段同单条创建）、all_or_nothing（任一条目无效时整批不写入）
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        try:
+            items = request.data.get('items')
+            if not isinstance(items, list) or not items:
+                raise ValidationError("items 必须是非空列表")
+            if len(items) > bulk.MAX_ITEMS:
+                raise ValidationError(f"每次最多创建 {bulk.MAX_ITEMS} 个服务")
+            if not all(isinstance(item, dict) for item in items):
+                raise ValidationError("items 中的每一项必须是对象")
+            results, created = bulk.create_services(items, parse_bool(request.data.get('all_or_nothing')))
+            return Response({
+                "code": 200,
+                "message": f"成功创建 {created} 个服务，{len(items) - created} 个失败",
+                "data": {
+                    "created": created,
+                    "results": results
+                }
+            })
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"批量创建服务失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ServiceBulkStatusView(APIView):
+    """
+    批量修改服务状态（仅管理员）
+    请求参数：ids（服务 ID 列表）、status（目标状态）、all_or_nothing（任一条目无效时整批不写入）
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        try:
+            ids = request.data.get('ids')
+            if not isinstance(ids, list) or not ids:
+                raise ValidationError("ids 必须是非空列表")
+            if len(ids) > bulk.MAX_ITEMS:
+                raise ValidationError(f"每次最多修改 {bulk.MAX_ITEMS} 个服务")
+            ids = [parse_id('ids', value) for value in ids]
+            target = request.data.get('status')
+            if target not in Service.STATUS_TRANSITIONS:
+                valid_statuses = [status[0] for status in Service.STATUS_CHOICES]
+                raise ValidationError(f"无效的状态值。有效值为: {', '.join(valid_statuses)}")
+            results, updated = bulk.transition_services(ids, target, parse_bool(request.data.get('all_or_nothing')))
+            return Response({
+                "code": 200,
+                "message": f"成功修改 {updated} 个服务的状态",
+                "data": {
+                    "updated": updated,
+                    "results": results
+                }
+            })
+        except ValidationError as e:
+            return Response({
+                "code": 400,
+                "message": str(e),
+                "data": None
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "code": 500,
+                "message": f"批量修改服务状态失败：{str(e)}",
+                "data": None
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
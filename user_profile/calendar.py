@@ -0,0 +1,208 @@
+"""
+日历订阅
+为每个用户生成 iCalendar 订阅源，包含已确认报名的活动和健康日程提醒，订阅地址以随机令牌标识，无需登录。
+日历客户端通常每 15 分钟轮询一次：每次请求只执行两条聚合查询得到数据状态（条数、ID 之和、最近更新时间），
+据此计算 ETag 和 Last-Modified，未变化时返回 304；内容按 ETag 缓存，数据变化后才重新生成。
+"""
+
+import hashlib
+import secrets
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+# 订阅源包含的时间范围（相对今天）
+PAST_DAYS = 30
+FUTURE_DAYS = 365
+# 健康日程提醒在日历中显示的时长
+SCHEDULE_DURATION = timedelta(minutes=15)
+FEED_CACHE_SECONDS = 24 * 3600
+PRODID = "-//yanglao//calendar feed//ZH"
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def ensure_token(profile):
+    """返回用户的订阅令牌，没有时生成"""
+    from .models import UserProfile
+
+    if not profile.calendar_token:
+        profile.calendar_token = new_token()
+        UserProfile.objects.filter(pk=profile.pk).update(calendar_token=profile.calendar_token)
+    return profile.calendar_token
+
+
+def reset_token(profile):
+    """重新生成订阅令牌，旧的订阅地址随之失效"""
+    from .models import UserProfile
+
+    profile.calendar_token = new_token()
+    UserProfile.objects.filter(pk=profile.pk).update(calendar_token=profile.calendar_token)
+    return profile.calendar_token
+
+
+def feed_window(today=None):
+    """订阅源的时间范围，按本地日期计算，每天变化一次"""
+    today = today or timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today - timedelta(days=PAST_DAYS), time.min))
+    end = timezone.make_aware(datetime.combine(today + timedelta(days=FUTURE_DAYS), time.max))
+    return start, end
+
+
+def registrations_in(user_id, start, end):
+    from activity.models import ActivityRegistration
+
+    return ActivityRegistration.objects.filter(
+        user_id=user_id, activity__end_time__gte=start, activity__start_time__lte=end
+    )
+
+
+def schedules_in(user_id, start, end):
+    from .models import HealthSchedule
+
+    return HealthSchedule.objects.filter(
+        user_profile__user_id=user_id, reminder_time__gte=start, reminder_time__lte=end
+    )
+
+
+def feed_state(user_id, today=None):
+    """
+    计算订阅源的数据状态，返回 (etag, last_modified, window)
+    条数和 ID 之和用于发现删除与新增，最近的更新时间用于发现修改，已确认条数用于发现候补递补。
+    删除记录不会留下更新时间，因此首次观察到状态变化的时间也计入 Last-Modified。
+    """
+    from activity.models import ActivityRegistration
+
+    window = feed_window(today)
+    activities = registrations_in(user_id, *window).aggregate(
+        count=Count("id"),
+        confirmed=Count("id", filter=Q(status=ActivityRegistration.STATUS_CONFIRMED)),
+        ids=Sum("activity_id"),
+        registered=Max("registered_at"),
+        updated=Max("activity__updated_at"),
+    )
+    schedules = schedules_in(user_id, *window).aggregate(
+        count=Count("id"), ids=Sum("id"), updated=Max("updated_at")
+    )
+    state = (window[0].date(), sorted(activities.items()), sorted(schedules.items()))
+    etag = '"%s"' % hashlib.md5(repr(state).encode("utf-8")).hexdigest()
+    moments = [activities["registered"], activities["updated"], schedules["updated"]]
+    last_modified = max((moment for moment in moments if moment), default=window[0])
+
+    state_key = f"calendar:state:{user_id}"
+    seen = cache.get(state_key)
+    if seen is None or seen[0] != etag:
+        seen = (etag, timezone.now() if seen is not None else last_modified)
+        cache.set(state_key, seen, timeout=FEED_CACHE_SECONDS)
+    return etag, max(last_modified, seen[1]), window
+
+
+def escape_text(value):
+    """按 RFC 5545 转义文本值"""
+    return (
+        str(value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+
+
+def fold(line):
+    """按 RFC 5545 把超过 75 字节的内容行折行（不拆分多字节字符）"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        # 续行以一个空格开头，占用一个字节
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_feed(user_id, window, name="养老服务日历"):
+    """生成 iCalendar 文本"""
+    from activity.models import ActivityRegistration
+
+    stamp = format_utc(timezone.now())
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+        "X-WR-TIMEZONE:Asia/Shanghai",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT15M",
+        "X-PUBLISHED-TTL:PT15M",
+    ]
+
+    registrations = (
+        registrations_in(user_id, *window)
+        .filter(status=ActivityRegistration.STATUS_CONFIRMED)
+        .select_related("activity")
+        .order_by("activity__start_time", "activity_id")
+    )
+    for registration in registrations:
+        activity = registration.activity
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:activity-{activity.pk}@yanglao",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{format_utc(activity.start_time)}",
+            f"DTEND:{format_utc(activity.end_time)}",
+            f"LAST-MODIFIED:{format_utc(activity.updated_at)}",
+            f"SUMMARY:{escape_text(activity.title)}",
+            f"DESCRIPTION:{escape_text(strip_tags(activity.content))}",
+            "CATEGORIES:活动",
+            "END:VEVENT",
+        ]
+
+    for schedule in schedules_in(user_id, *window).order_by("reminder_time", "id"):
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:health-schedule-{schedule.pk}@yanglao",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{format_utc(schedule.reminder_time)}",
+            f"DTEND:{format_utc(schedule.reminder_time + SCHEDULE_DURATION)}",
+            f"LAST-MODIFIED:{format_utc(schedule.updated_at)}",
+            f"SUMMARY:{escape_text(schedule.title)}",
+            f"DESCRIPTION:{escape_text(schedule.content)}",
+            "CATEGORIES:健康日程",
+            "BEGIN:VALARM",
+            "ACTION:DISPLAY",
+            f"DESCRIPTION:{escape_text(schedule.title)}",
+            "TRIGGER:PT0M",
+            "END:VALARM",
+            "END:VEVENT",
+        ]
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(fold(line) for line in lines) + "\r\n"
+
+
+def cached_feed(user_id, etag, window):
+    """按 ETag 缓存生成的订阅源，数据状态不变时直接复用"""
+    key = "calendar:feed:%s:%s" % (user_id, hashlib.md5(etag.encode("ascii")).hexdigest())
+    body = cache.get(key)
+    if body is None:
+        body = render_feed(user_id, window)
+        cache.set(key, body, timeout=FEED_CACHE_SECONDS)
+    return body
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='calendar_token',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='日历订阅令牌'),
+        ),
+        migrations.AddIndex(
+            model_name='healthschedule',
+            index=models.Index(fields=['user_profile', 'reminder_time'], name='health_schedule_user_time_idx'),
+        ),
+    ]
@@ -34,6 +34,9 @@ class UserProfile(models.Model):
     )
     temperature = models.CharField(max_length=20, verbose_name="体温", default="待填写")
     weight = models.CharField(max_length=20, verbose_name="体重", default="待填写")
+    calendar_token = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="日历订阅令牌"
+    )
 
     @property
     def group(self):
@@ -215,6 +218,10 @@ class HealthSchedule(models.Model):
         verbose_name = "健康日程"
         verbose_name_plural = "健康日程"
         ordering = ['-reminder_time']
+        indexes = [
+            # 日历订阅按用户和提醒时间范围查询
+            models.Index(fields=["user_profile", "reminder_time"], name="health_schedule_user_time_idx"),
+        ]
 
 
 @receiver(post_save, sender=UserProfile)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Guardianship, Profile, UserProfile, CardPackage, Card, HealthSchedule
 from django.contrib.auth.models import User
+from yanglao.images import srcset
 
 """
 序列化器模块用于处理用户、用户资料、监护关系和卡片包的序列化与反序列化。
@@ -190,12 +191,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     card_package = CardPackageSerializer(read_only=True)
     avatar = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
     guardians = GuardianshipListSerializer(source='guardianships_as_ward', many=True, read_only=True)
     wards = WardListSerializer(source='guardianships_as_guardian', many=True, read_only=True)
 
     class Meta:
         model = UserProfile
-        fields = ['id', 'user', 'nickname', 'avatar', 'health_id', 'phone', 
+        fields = ['id', 'user', 'nickname', 'avatar', 'avatar_srcset', 'health_id', 'phone', 
                  'blood_pressure', 'blood_sugar', 'blood_oxygen', 
                  'temperature', 'weight', 'card_package', 'guardians', 'wards']
         read_only_fields = ['id', 'user', 'card_package', 'guardians', 'wards']
@@ -209,6 +211,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
             return avatar_url
         return obj.avatar
 
+    def get_avatar_srcset(self, obj):
+        """头像各尺寸、各格式的地址"""
+        return srcset(obj.avatar_file)
+
 
 class ProfileSerializer(serializers.ModelSerializer):
     """
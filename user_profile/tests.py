@@ -1,3 +1,80 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from activity.models import Activity
+from . import calendar
+from .models import HealthSchedule
+
+
+class CalendarFeedTests(TestCase):
+    """日历订阅源：令牌识别用户，数据未变化时返回 304"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("resident", "resident@example.com", "password")
+        self.profile = self.user.profile
+        self.token = calendar.ensure_token(self.profile)
+        now = timezone.now()
+        self.schedule = HealthSchedule.objects.create(
+            user_profile=self.profile, title="测量血压", reminder_time=now + timedelta(days=1), content="早饭前"
+        )
+        self.activity = Activity.objects.create(
+            title="太极拳",
+            cover="activity_covers/cover.jpg",
+            start_time=now + timedelta(days=2),
+            end_time=now + timedelta(days=2, hours=1),
+            content="<p>公园集合</p>",
+        )
+
+    def fetch(self, **headers):
+        return self.client.get(f"/api/user/calendar/{self.token}.ics", headers=headers)
+
+    def test_invalid_token_is_not_found(self):
+        self.assertEqual(self.client.get("/api/user/calendar/unknown.ics").status_code, 404)
+        old_token = self.token
+        calendar.reset_token(self.profile)
+        self.assertEqual(self.client.get(f"/api/user/calendar/{old_token}.ics").status_code, 404)
+
+    def test_unchanged_feed_returns_not_modified(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body = response.content.decode("utf-8")
+        self.assertIn("SUMMARY:测量血压", body)
+        self.assertNotIn("SUMMARY:太极拳", body)
+
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.fetch(if_none_match=etag).status_code, 304)
+        self.assertEqual(self.fetch(if_modified_since=last_modified).status_code, 304)
+        self.assertEqual(self.fetch(if_none_match='"stale"').status_code, 200)
+
+    def test_etag_changes_after_registration(self):
+        etag = self.fetch()["ETag"]
+        self.activity.register(self.user)
+
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("SUMMARY:太极拳", response.content.decode("utf-8"))
+
+        etag = response["ETag"]
+        self.activity.cancel_registration(self.user)
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("SUMMARY:太极拳", response.content.decode("utf-8"))
+
+    def test_etag_changes_after_schedule_update(self):
+        etag = self.fetch()["ETag"]
+        self.schedule.title = "测量血糖"
+        self.schedule.save()
 
-# Create your tests here.
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        body = response.content.decode("utf-8")
+        self.assertIn("SUMMARY:测量血糖", body)
+        self.assertNotIn("SUMMARY:测量血压", body)
@@ -22,4 +22,6 @@ urlpatterns = [
     path('guardianship/ward/<int:ward_id>/', views.GuardianshipView.as_view(), name='ward-guardianship'),
     path('profiles/', views.ProfileView.as_view(), name='profile-list'),
     path('profiles/<int:pk>/', views.ProfileDetailView.as_view(), name='profile-detail'),
+    path('calendar/', views.CalendarFeedView.as_view(), name='calendar-feed-url'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar-feed'),
 ]
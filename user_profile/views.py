@@ -20,8 +20,12 @@ import uuid
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView, TokenObtainPairView as BaseTokenObtainPairView
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotAllowed
 from django.conf import settings
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from . import calendar
 
 class ProfileView(APIView):
     """
@@ -936,3 +940,74 @@ class TokenObtainPairView(BaseTokenObtainPairView):
                 'code': 500,
                 'message': f'登录失败: {str(e)}'
             })
+
+
+class CalendarFeedView(APIView):
+    """
+    日历订阅地址视图
+    GET 获取当前用户的订阅地址，POST 重新生成令牌（旧地址失效）
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_data(self, request, token):
+        url = request.build_absolute_uri(reverse('calendar-feed', kwargs={'token': token}))
+        return {'token': token, 'url': url, 'webcal_url': 'webcal://' + url.split('://', 1)[1]}
+
+    def get(self, request):
+        """
+        获取日历订阅地址
+        """
+        try:
+            token = calendar.ensure_token(request.user.profile)
+            return Response({
+                'code': 200,
+                'message': '获取日历订阅地址成功',
+                'data': self.get_data(request, token)
+            })
+        except Exception as e:
+            return Response({
+                'code': 500,
+                'message': f'获取日历订阅地址失败: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def post(self, request):
+        """
+        重新生成日历订阅地址
+        """
+        try:
+            token = calendar.reset_token(request.user.profile)
+            return Response({
+                'code': 200,
+                'message': '日历订阅地址已重置',
+                'data': self.get_data(request, token)
+            })
+        except Exception as e:
+            return Response({
+                'code': 500,
+                'message': f'重置日历订阅地址失败: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def calendar_feed(request, token):
+    """
+    iCalendar 订阅源，以令牌识别用户，无需登录
+    根据数据状态计算 ETag 和 Last-Modified，客户端携带的验证信息未过期时返回 304
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    profile = UserProfile.objects.filter(calendar_token=token).only('id', 'user_id').first()
+    if profile is None:
+        raise Http404
+    etag, last_modified, window = calendar.feed_state(profile.user_id)
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if not_modified is not None:
+        return not_modified
+    response = HttpResponse(
+        calendar.cached_feed(profile.user_id, etag, window), content_type='text/calendar; charset=utf-8'
+    )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
@@ -0,0 +1,141 @@
+"""
+图片衍生图
+为文章封面、活动封面和用户头像生成缩略图、中图和大图，每种尺寸输出 WebP 和 JPEG 两种格式。
+衍生图以原图内容哈希和尺寸命名缓存在 MEDIA_ROOT/derivatives 下，由 generate_image_derivatives
+命令（定时执行）在进程池中批量生成，Web 进程不渲染图片；尚未生成时接口重定向到原图。
+序列化器通过 srcset() 输出各尺寸各格式的地址。
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.urls import reverse
+
+# 各尺寸的最长边（像素）
+VARIANTS = {"thumbnail": 160, "medium": 480, "large": 1080}
+# 输出格式：Pillow 格式名、Content-Type
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+DERIVATIVE_DIR = "derivatives"
+# 可生成衍生图的图片字段：(应用, 模型, 字段)，对应的上传目录即允许请求的原图前缀
+SOURCE_FIELDS = (
+    ("article", "Article", "cover"),
+    ("activity", "Activity", "cover"),
+    ("user_profile", "UserProfile", "avatar_file"),
+)
+SOURCE_PREFIXES = ("article/covers/", "activity_covers/", "avatars/")
+
+
+def is_source_name(name):
+    """只允许上传目录下的原图，拒绝衍生图目录、相对路径和其他媒体文件"""
+    return posixpath.normpath(name) == name and name.startswith(SOURCE_PREFIXES)
+
+
+def render_derivative(source_path, target_path, max_side, image_format):
+    """
+    生成一张衍生图（在进程池中执行，只依赖 Pillow）
+    按最长边等比缩小（不放大），JPEG 不支持透明通道时以白色背景合成。
+    像素数超过 Pillow 上限的图片会抛出 DecompressionBombError，由调用方处理
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image_format == "JPEG":
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = f"{target_path}.{os.getpid()}.tmp"
+        image.save(temp_path, image_format, quality=80, optimize=True)
+        os.replace(temp_path, target_path)
+    return target_path
+
+
+def content_hash(name):
+    """原图内容哈希，按文件名、大小和修改时间缓存，避免每次请求都读取原图"""
+    path = default_storage.path(name)
+    stat = os.stat(path)
+    key = "image:hash:" + hashlib.md5(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+    digest = cache.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(1 << 16), b""):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+        cache.set(key, digest, timeout=None)
+    return digest
+
+
+def derivative_path(digest, size, fmt):
+    return os.path.join(settings.MEDIA_ROOT, DERIVATIVE_DIR, digest[:2], f"{digest}-{size}.{fmt}")
+
+
+def missing_derivatives(name):
+    """
+    列出原图尚未生成的衍生图
+    返回 render_derivative 的参数元组列表，原图不存在或不允许时返回空列表
+    """
+    if not is_source_name(name):
+        return []
+    try:
+        digest = content_hash(name)
+        source = default_storage.path(name)
+    except (OSError, SuspiciousFileOperation):
+        return []
+    missing = []
+    for size, max_side in VARIANTS.items():
+        for fmt, (image_format, _) in FORMATS.items():
+            target = derivative_path(digest, size, fmt)
+            if not os.path.exists(target):
+                missing.append((source, target, max_side, image_format))
+    return missing
+
+
+def srcset(field_file):
+    """
+    生成图片各尺寸、各格式的地址
+    返回形如 {"thumbnail": {"webp": url, "jpeg": url}, ...} 的字典，没有图片时返回 None
+    """
+    if not field_file:
+        return None
+    return {
+        size: {
+            fmt: reverse("image-derivative", kwargs={"size": size, "fmt": fmt, "name": field_file.name})
+            for fmt in FORMATS
+        }
+        for size in VARIANTS
+    }
+
+
+def derivative_view(request, size, fmt, name):
+    """返回衍生图，尚未生成时临时重定向到原图（不缓存），由定时命令补齐"""
+    if size not in VARIANTS or fmt not in FORMATS or not is_source_name(name):
+        raise Http404
+    try:
+        if not default_storage.exists(name):
+            raise Http404
+        path = derivative_path(content_hash(name), size, fmt)
+        if not os.path.exists(path):
+            response = HttpResponseRedirect(default_storage.url(name))
+            response["Cache-Control"] = "no-cache"
+            return response
+        response = FileResponse(open(path, "rb"), content_type=FORMATS[fmt][1])
+    except (OSError, SuspiciousFileOperation):
+        raise Http404
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
@@ -0,0 +1,104 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析"""
+
+
+class CursorPaginator:
+    """
+    游标（keyset）分页
+    按 ordering 中的字段（最后一个字段须唯一，通常为 id）做范围查询翻页，
+    游标是上一页最后一行排序字段值的不透明编码，任意深度的翻页代价与首页相同。
+    排序字段可以是关联字段路径（如 activity__start_time），此时查询应 select_related 对应关系。
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, ordering=("-created_at", "-id"), page_size=20, max_page_size=100):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    @staticmethod
+    def _split(field):
+        return (field[1:], True) if field.startswith("-") else (field, False)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def _default(value):
+        # 时间保留完整微秒精度，否则同一时刻的记录会在翻页时被跳过
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def _value(obj, path):
+        for name in path.split("__"):
+            obj = getattr(obj, name)
+        return obj
+
+    @staticmethod
+    def _field(model, path):
+        names = path.split("__")
+        for name in names[:-1]:
+            model = model._meta.get_field(name).related_model
+        return model._meta.get_field(names[-1])
+
+    def encode_cursor(self, obj):
+        values = [self._value(obj, self._split(field)[0]) for field in self.ordering]
+        raw = json.dumps(values, default=self._default).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self._field(model, self._split(field)[0]).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise InvalidCursor("无效的分页游标")
+
+    def seek(self, queryset, values):
+        """构造 (a, b, ...) 严格位于游标之后的条件"""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name, descending = self._split(field)
+            lookup = "lt" if descending else "gt"
+            branch = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_field, prev_value in zip(self.ordering[:i], values[:i]):
+                branch &= Q(**{self._split(prev_field)[0]: prev_value})
+            condition |= branch
+        return queryset.filter(condition)
+
+    def paginate(self, queryset, request):
+        """
+        返回 (当前页对象列表, 下一页游标)，没有下一页时游标为 None
+        游标无效时抛出 InvalidCursor
+        """
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.seek(queryset, self.decode_cursor(queryset.model, cursor))
+
+        size = self.get_page_size(request)
+        items = list(queryset[: size + 1])
+        next_cursor = None
+        if len(items) > size:
+            items = items[:size]
+            next_cursor = self.encode_cursor(items[-1])
+        return items, next_cursor
@@ -94,6 +94,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # 事务开始时即获取写锁，并发写入排队等待而不是在读锁升级时报 database is locked
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -129,6 +134,39 @@ APPEND_SLASH=False
 MEDIA_URL = '/upload/'
 MEDIA_ROOT = BASE_DIR / 'upload'
 
+# 文章阅读量写缓冲的刷新间隔（秒）
+ARTICLE_VIEW_FLUSH_INTERVAL = 5
+# 是否在进程启动时开启阅读量后台刷新线程（运行测试时始终关闭）
+ARTICLE_VIEW_FLUSHER_ENABLED = True
+# 识别匿名读者时信任的反向代理层数，为 0 时忽略 X-Forwarded-For，只使用 REMOTE_ADDR
+ARTICLE_TRUSTED_PROXY_COUNT = 0
+
+# 热门文章排行：热度半衰期（小时）、阅读与点赞的权重、每个分类物化的文章数
+ARTICLE_HOT_HALF_LIFE_HOURS = 72
+ARTICLE_HOT_VIEW_WEIGHT = 1.0
+ARTICLE_HOT_LIKE_WEIGHT = 5.0
+ARTICLE_HOT_TOP_N = 20
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yanglao',
+    }
+}
+
+# 文章公开接口的响应缓存：新鲜期与过期后仍可返回旧数据的时长（秒）
+ARTICLE_CACHE_FRESH_SECONDS = 60
+ARTICLE_CACHE_STALE_SECONDS = 300
+
+# 生成图片衍生图的进程数
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# 护工角色（用户组成员）缓存时长（秒）
+SERVICE_CAREGIVER_CACHE_SECONDS = 300
+
+# 自动派单：同类服务经验的偏好权重
+SERVICE_DISPATCH_AFFINITY_WEIGHT = 2.0
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -6,6 +6,7 @@ from rest_framework_simplejwt.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
+from .images import derivative_view
 
 
 
@@ -19,4 +20,5 @@ urlpatterns = [
     path('api/user/', include('user_profile.urls')),
     path('api/article/', include('article.urls')),
     path('api/activity/', include('activity.urls')),
+    path('api/images/<str:size>/<str:fmt>/<path:name>', derivative_view, name='image-derivative'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)